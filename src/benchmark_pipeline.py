@@ -0,0 +1,130 @@
+"""
+End-to-end benchmark of main_run_chatcfd.main with per-stage wall time
+
+By default every LLM call goes to a local llm_stub_server answering from recorded fixtures and
+the scripted rules in inputs/llm_stub_rules.json, so the run needs no network access:
+
+    python src/benchmark_pipeline.py --latency 0.5 --output temp/benchmark.json
+
+Use --live to benchmark against the DeepSeek API configured in inputs/chatcfd_config.json.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+
+import config, set_config, qa_modules, main_run_chatcfd, llm_stub_server
+
+DEFAULT_PDF = f"{config.Base_PATH}/pdf/sun_2023_naca0012.pdf"
+DEFAULT_MESH = f"{config.Base_PATH}/grids/naca0012.msh"
+DEFAULT_RULES = f"{config.Base_PATH}/inputs/llm_stub_rules.json"
+DEFAULT_DESCRIPTION = ("Steady-state RANS simulation of NACA0012 airfoil at Mach=0.15, Re=6e6 with 10-degree angle of attack "
+                       "using structured C-grid (897x257 cells) and kOmegaSST turbulence model, compared against "
+                       "experimental pressure/lift coefficients.")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the ChatCFD pipeline on one paper and mesh and report per-stage wall time")
+    parser.add_argument("--pdf", default=DEFAULT_PDF)
+    parser.add_argument("--mesh", default=DEFAULT_MESH)
+    parser.add_argument("--solver", default="simpleFoam")
+    parser.add_argument("--turbulence-model", default="kOmegaSST")
+    parser.add_argument("--description", default=DEFAULT_DESCRIPTION, help="case description passed to the pipeline")
+    parser.add_argument("--case-name", default="benchmark_NACA0012_AOA10_kOmegaSST")
+    parser.add_argument("--rounds", type=int, default=3, help="max_running_test_round of the run-and-correct loop")
+    parser.add_argument("--repair-mode", choices=["triage", "multi_call"], help="override repair_mode for A/B comparisons")
+    parser.add_argument("--llm-cache-mode", default="off", help="llm_cache_mode during the run, 'off' measures every call")
+    parser.add_argument("--output", help="write the report to this json file")
+    parser.add_argument("--live", action="store_true", help="use the configured DeepSeek API instead of the stub server")
+    stub = parser.add_argument_group("stub server")
+    stub.add_argument("--fixtures", nargs="*", default=None,
+                      help="LLM cache directories or all_qa_logs.json(l) files (default: the LLM cache directory)")
+    stub.add_argument("--rules", default=DEFAULT_RULES)
+    stub.add_argument("--latency", type=float, default=0.0, help="seconds before the first byte of a response")
+    stub.add_argument("--latency-jitter", type=float, default=0.0)
+    stub.add_argument("--chunk-interval", type=float, default=0.0, help="seconds between streamed chunks")
+    stub.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    return parser.parse_args(argv)
+
+def start_stub_server(args):
+    fixtures = args.fixtures
+    if fixtures is None:
+        fixtures = [config.LLM_CACHE_PATH] if os.path.isdir(config.LLM_CACHE_PATH) else []
+    rules = llm_stub_server.load_rules(args.rules) if args.rules else []
+    server = llm_stub_server.start_server(
+        fixtures=fixtures,
+        rules=rules,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        chunk_interval=args.chunk_interval,
+        error_rate=args.error_rate
+    )
+    for prefix in ("DEEPSEEK_V3", "DEEPSEEK_R1"):
+        os.environ[f"{prefix}_BASE_URL"] = server.base_url
+        os.environ[f"{prefix}_KEY"] = "stub"
+    print(f"LLM stub server listening on {server.base_url}")
+    return server
+
+def print_report(report):
+    print(f"\n{'stage':<36}{'runs':>6}{'total [s]':>12}{'mean [s]':>12}")
+    for name, stage in report["stages"].items():
+        print(f"{name:<36}{stage['runs']:>6}{stage['total_s']:>12.3f}{stage['mean_s']:>12.3f}")
+    print(f"{'total':<36}{'':>6}{report['total_s']:>12.3f}")
+    if report["error"]:
+        print(f"Pipeline stopped with {report['error']}")
+
+def run_benchmark(args):
+    set_config.read_in_config()
+    config.llm_cache_mode = args.llm_cache_mode
+    config.max_running_test_round = args.rounds
+    if args.repair_mode:
+        config.repair_mode = args.repair_mode
+    config.pdf_path = os.path.abspath(args.pdf)
+    config.case_grid = os.path.abspath(args.mesh)
+
+    server = None if args.live else start_stub_server(args)
+
+    main_run_chatcfd.test_solver = args.solver
+    main_run_chatcfd.test_turbulence_model = args.turbulence_model
+    main_run_chatcfd.test_case_name = args.case_name
+    main_run_chatcfd.test_case_description = args.description
+
+    error = None
+    start = time.perf_counter()
+    try:
+        with main_run_chatcfd.timed_stage("load_OF_data_json"):
+            main_run_chatcfd.load_OF_data_json()
+        main_run_chatcfd.main(args.case_name)
+    except (Exception, SystemExit) as e:
+        traceback.print_exc()
+        error = f"{type(e).__name__}: {e}"
+    total = time.perf_counter() - start
+
+    report = {
+        "pdf": config.pdf_path,
+        "mesh": config.case_grid,
+        "llm_backend": "live" if server is None else f"stub ({server.base_url})",
+        "repair_mode": config.repair_mode,
+        "total_s": total,
+        "error": error,
+        "stages": main_run_chatcfd.stage_summary(),
+        "llm_statistics": qa_modules.GlobalLogManager._generate_statistics()
+    }
+    if server is not None:
+        report["stub_server"] = dict(server.responder.stats)
+        server.shutdown()
+    return report
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_benchmark(args)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Report written to {args.output}")
+    return 1 if report["error"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Recall and latency of the vector_index backends against the exact flat_l2 index on a synthetic corpus
+
+The corpus imitates sentence embeddings: unit vectors scattered around topic centres, and the
+queries are perturbed corpus vectors. For example:
+
+    python src/benchmark_vector_index.py --size 200000 --backends hnsw ivfpq --output temp/ann.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import faiss
+import numpy as np
+
+import vector_index
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark vector_index backends against flat_l2")
+    parser.add_argument("--size", type=int, default=100000, help="number of corpus vectors")
+    parser.add_argument("--dim", type=int, default=768, help="embedding dimension (all-mpnet-base-v2: 768)")
+    parser.add_argument("--topics", type=int, default=1000, help="number of cluster centres in the corpus")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--backends", nargs="*", default=["flat_ip", "hnsw", "ivfpq"], choices=vector_index.INDEX_BACKENDS)
+    parser.add_argument("--params", default="{}", help='json of backend -> parameter overrides, e.g. {"hnsw": {"ef_search": 128}}')
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-dir", help="also save every built index here and report its load time")
+    parser.add_argument("--output", help="write the report to this json file")
+    return parser.parse_args(argv)
+
+def synthetic_corpus(size, dim, topics, queries, seed):
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((topics, dim)).astype('float32')
+    corpus = centres[rng.integers(0, topics, size)] + 0.6 * rng.standard_normal((size, dim)).astype('float32')
+    faiss.normalize_L2(corpus)
+    query_vectors = corpus[rng.integers(0, size, queries)] + 0.3 * rng.standard_normal((queries, dim)).astype('float32')
+    faiss.normalize_L2(query_vectors)
+    return corpus, query_vectors
+
+def index_size_mb(index):
+    return faiss.serialize_index(index.index).nbytes / (1024 * 1024)
+
+def measure(index, query_vectors, top_k):
+    """Per-query search latencies in ms (one query per call, as in CFDCaseExtractor) and the result ids"""
+    latencies = []
+    results = []
+    for query in query_vectors:
+        start = time.perf_counter()
+        _, indices = index.search(query[None, :], top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(indices[0])
+    return np.array(latencies), np.array(results)
+
+def recall(results, truth):
+    hits = sum(len(set(found[found >= 0]) & set(expected)) for found, expected in zip(results, truth))
+    return hits / truth.size
+
+def run_backend(backend, params, corpus, query_vectors, truth, top_k, save_dir):
+    start = time.perf_counter()
+    index = vector_index.VectorIndex(backend, params).build(corpus)
+    build_s = time.perf_counter() - start
+    latencies, results = measure(index, query_vectors, top_k)
+    row = {
+        "backend": index.backend,
+        "params": index.params,
+        "build_s": build_s,
+        "size_mb": index_size_mb(index),
+        "recall_at_k": recall(results, truth) if truth is not None else 1.0,
+        "latency_mean_ms": float(latencies.mean()),
+        "latency_p50_ms": float(np.percentile(latencies, 50)),
+        "latency_p95_ms": float(np.percentile(latencies, 95))
+    }
+    if save_dir:
+        path = os.path.join(save_dir, f"{backend}.faiss")
+        index.save(path)
+        start = time.perf_counter()
+        vector_index.VectorIndex.load(path)
+        row["load_s"] = time.perf_counter() - start
+    return row, results
+
+def print_report(report):
+    print(f"\n{report['size']} vectors of dim {report['dim']}, {report['queries']} queries, top-{report['top_k']}")
+    print(f"{'backend':<10}{'build [s]':>11}{'size [MB]':>11}{'recall':>9}{'mean [ms]':>11}{'p95 [ms]':>10}")
+    for row in report["backends"]:
+        print(f"{row['backend']:<10}{row['build_s']:>11.2f}{row['size_mb']:>11.1f}{row['recall_at_k']:>9.3f}"
+              f"{row['latency_mean_ms']:>11.3f}{row['latency_p95_ms']:>10.3f}")
+
+def main(argv=None):
+    args = parse_args(argv)
+    overrides = json.loads(args.params)
+    corpus, query_vectors = synthetic_corpus(args.size, args.dim, args.topics, args.queries, args.seed)
+
+    report = {"size": args.size, "dim": args.dim, "queries": args.queries, "top_k": args.top_k, "backends": []}
+    baseline, truth = run_backend("flat_l2", {}, corpus, query_vectors, None, args.top_k, args.save_dir)
+    report["backends"].append(baseline)
+    for backend in args.backends:
+        if backend == "flat_l2":
+            continue
+        row, _ = run_backend(backend, overrides.get(backend), corpus, query_vectors, truth, args.top_k, args.save_dir)
+        report["backends"].append(row)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Report written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
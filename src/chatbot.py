@@ -1,15 +1,12 @@
 import streamlit as st
-from openai import OpenAI
-import PyPDF2
 import io
 import json
 from PIL import Image
 import base64
 import re
-import tiktoken
 from datetime import datetime
 
-import config, case_file_requirements, preprocess_OF_tutorial, set_config, main_run_chatcfd, qa_modules
+import config, case_file_requirements, preprocess_OF_tutorial, set_config, main_run_chatcfd, qa_modules, llm_clients, embedder_registry, document_ingest
 import pathlib
 import os
 os.environ['HF_ENDPOINT'] = 'https://hf-mirror.com'
@@ -20,7 +17,7 @@ general_prompt = ''
 
 class ChatBot:
     def __init__(self):
-        self.client = OpenAI(
+        self.client = llm_clients.get_openai_client(
             api_key=os.environ.get("DEEPSEEK_R1_KEY"),
             base_url=os.environ.get("DEEPSEEK_R1_BASE_URL")
         )
@@ -38,13 +35,10 @@ class ChatBot:
             "qa_history": []
         }
 
-    def process_pdf(self, pdf_file):
+    def process_pdf(self, pdf_path):
+        """Text of the uploaded PDF, ingested once and shared with the case run"""
         try:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text()
-            return text
+            return document_ingest.ingest(pdf_path).raw_text
         except Exception as e:
             return f"PDF processing error: {str(e)}"
 
@@ -72,12 +66,7 @@ class ChatBot:
 
     def count_tokens(self, text: str, model: str = "gpt-4o") -> int:
         """Use tiktoken to count the number of tokens"""
-        try:
-            encoding = tiktoken.encoding_for_model(model)
-            return len(encoding.encode(text))
-        except KeyError:
-            encoding = tiktoken.get_encoding("cl100k_base")
-            return len(encoding.encode(text))
+        return qa_modules.estimate_tokens(text, model)
 
 def initialize_session_state():
     if "messages" not in st.session_state:
@@ -160,6 +149,15 @@ def main():
                     mime="application/json"
                 )
 
+    # Sidebar: embedding models shared by every case run of this process
+    with st.sidebar:
+        with st.expander("Embedding models"):
+            embedder_stats = embedder_registry.registry_stats()
+            if embedder_stats:
+                st.json(embedder_stats)
+            else:
+                st.caption("No embedding model loaded yet")
+
     # Sidebar: File Upload
     with st.sidebar:
         st.header("Upload the document")
@@ -182,12 +180,12 @@ def main():
                         with open(file_path, "wb") as f:
                             f.write(uploaded_file.getbuffer())
 
-                        config.pdf_path =  f"{config.TEMP_PATH}/{uploaded_file.name}"
+                        config.pdf_path = str(file_path)
 
                     except Exception as e:
                         st.error(f"Failed at processed the pdf file: {str(e)}") 
 
-                    text_content = st.session_state.chatbot.process_pdf(uploaded_file)
+                    text_content = st.session_state.chatbot.process_pdf(config.pdf_path)
                     config.paper_content = text_content
                     st.session_state.file_content = f"The  contents：\n{text_content}"
                     st.toast("PDF uploaded！", icon="💾")
@@ -66,6 +66,71 @@ OUTPUT_PATH = None
 case_grid = None
 pdf_path = None
 
+# On-disk LLM response cache, see llm_cache.py
+LLM_CACHE_PATH = f'{Base_PATH}/cache/llm_responses'
+llm_cache_mode = "off"  # "off", "readwrite" or "replay" (fail fast on a cache miss)
+llm_cache_max_size_mb = 512
+llm_cache_max_age_days = 30
+
+# On-disk chunks and FAISS index of every processed PDF, see pdf_index_cache.py
+PDF_INDEX_CACHE_PATH = f'{Base_PATH}/cache/pdf_index'
+pdf_index_cache_enabled = True
+pdf_index_backend = "flat_l2"  # "flat_l2", "flat_ip", "hnsw" or "ivfpq", see vector_index.py
+pdf_index_params = {}  # overrides vector_index.DEFAULT_INDEX_PARAMS of the backend
+pdf_retrieval_mode = "hybrid"  # "vector" or "hybrid" (vector + BM25 + numeric parameters), see lexical_index.py
+pdf_retrieval_candidates = 20  # ranked hits per retriever the context is packed from
+pdf_context_token_budget = 1200  # tokens of paper chunks in one query_case_setup prompt
+hybrid_rrf_k = 60
+bm25_k1 = 1.5
+bm25_b = 0.75
+pdf_extract_workers = 0  # processes extracting PDF pages, 0 uses every core
+pdf_extract_min_pages_per_worker = 4  # papers shorter than two of these are extracted in-process
+
+# Shared keep-alive HTTP connection pool of the OpenAI clients, see llm_clients.py
+http_pool_max_connections = 20
+http_pool_max_keepalive = 10
+http_keepalive_expiry = 120.0  # seconds an idle connection is kept open
+http_connect_timeout = 10.0
+http_read_timeout = 600.0  # R1 streams can pause for a long time between chunks
+
+# Concurrency limits of the async LLM layer, see llm_async.py
+llm_max_concurrency = 8
+llm_default_model_concurrency = 4
+llm_model_concurrency = {}  # model name -> limit, overrides llm_default_model_concurrency
+
+# Deadline, retry and hedging policy of every LLM call, see llm_policy.py
+llm_call_deadline = 900.0  # seconds over all attempts of one call
+llm_model_call_deadline = {}  # model name -> deadline, overrides llm_call_deadline
+llm_max_retries = 4  # retries on 429/5xx and connection errors
+llm_backoff_base = 1.0
+llm_backoff_max = 30.0
+llm_hedge_enabled = False  # fire a duplicate request when a call runs past the latency percentile below
+llm_hedge_percentile = 95
+llm_hedge_min_samples = 10  # latencies a call site needs before it is hedged
+llm_hedge_min_delay = 2.0
+llm_latency_window = 200  # latencies kept per call site
+
+# Error correction of a failed run: "triage" asks one structured call per round,
+# "multi_call" the original sequence of classification and analysis calls
+repair_mode = "triage"
+triage_max_attempts = 2  # triage calls per round before falling back to multi_call
+
+# Streamed classification calls with a constrained answer set, see qa_modules.QA_Classify_deepseek_V3
+classify_temperature = 0.0
+classify_max_tokens = 32  # enough for a case file path
+
+# Token budgets of the error-repair prompts, see prompt_budget.py
+repair_prompt_token_budget = 24000  # tokens of case file content embedded in one prompt
+running_error_token_budget = 3000  # tokens of a runtime error embedded in one prompt
+prompt_elide_numeric_lines = 10  # longer runs of purely numeric lines are elided
+prompt_elide_list_values = 10  # nonuniform Lists with more entries are elided
+prompt_min_file_tokens = 200  # a file is truncated to the remaining budget only if at least this much is left
+
+# Append-only QA log of a case (all_qa_logs.jsonl), see qa_log_writer.py
+qa_log_flush_every = 4  # entries buffered before they are written out
+qa_log_flush_interval = 2.0  # seconds
+qa_log_fsync_interval = 10.0  # seconds
+
 ensure_directory_exists(Database_OFv24_PATH)
 ensure_directory_exists(OUTPUT_CHATCFD_PATH)
 ensure_directory_exists(TEMP_PATH)
@@ -91,6 +156,18 @@ pdf_short_case_description = None
 
 OF_data_path = f"{Database_OFv24_PATH}/processed_merged_OF_cases.json"
 
+# Tutorial case database, one processed case per line, see preprocess_OF_tutorial.update_tutorial_index
+OF_cases_jsonl_path = f"{Database_OFv24_PATH}/processed_OF_cases.jsonl"
+OF_cases_json_export = False  # also export OF_data_path after every update
+# SQLite store of the tutorial cases with lazily read file contents, see of_case_store.py
+OF_case_store_path = f"{Database_OFv24_PATH}/of_cases.sqlite"
+# Embeddings of the tutorial cases for of_case_similarity.find_similar_cases, one file per store and embedder
+OF_case_vector_path = f"{Database_OFv24_PATH}/case_vectors"
+
+# Fingerprints of the indexed tutorial case files, see preprocess_OF_tutorial.update_tutorial_index
+OF_tutorial_manifest_path = f"{Database_OFv24_PATH}/of_tutorial_manifest.json"
+of_tutorial_scan_workers = 0  # processes scanning tutorial solver directories, 0 uses every core
+
 OF_case_data_dict = {}
 
 max_running_test_round = 30
@@ -0,0 +1,247 @@
+import os
+import re
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pdfplumber
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+import config
+import pdf_index_cache
+import prompt_budget
+
+# Page extraction and chunking settings, part of the document cache key
+PAGE_MARGIN = 50  # points cropped on every side to skip header, footer and margins
+EXTRACT_SETTINGS = {"layout": True, "x_tolerance": 3, "y_tolerance": 2}
+CHUNK_SIZE = 600
+CHUNK_OVERLAP = 100
+CHUNK_SEPARATORS = [
+    r"\n\s*[A-Z][A-Z\s]+\s*:\s*\n",  # Match headings like "METHODOLOGY:"
+    r"\n\s*\d+\.\s*[A-Z]",          # Match section numbers like "3. RESULTS"
+    "\n\n"
+]
+MIN_CHUNK_CHARS = 50
+# Bump when the extraction, clean_text or the document fields change, so cached documents are rebuilt
+DOCUMENT_FORMAT_VERSION = 2
+
+_PAGE_MARKER_RE = re.compile(r'^Page (\d+):$', re.MULTILINE)
+# Spawned, not forked: the caller already runs the llm_async loop thread and pooled HTTP clients,
+# and a forked child could inherit one of their locks held
+_POOL_CONTEXT = multiprocessing.get_context("spawn")
+
+def clean_text(text, page_number):
+    """Multi-stage text cleaning"""
+    # Stage 1: Merge broken words
+    text = re.sub(r'(?<=\w)-\n(?=\w)', '', text)  # Connect words split by line breaks
+
+    # Stage 2: Handle numbers and units
+    text = re.sub(r'\n(?=\d+\s*[A-Za-z]{1,3}\b)', ' ', text)  # Fix unit line breaks
+
+    # Stage 3: Remove isolated page numbers
+    text = re.sub(r'^\s*\d+\s*$', '', text, flags=re.MULTILINE)
+
+    # Stage 4: Compress whitespace
+    text = re.sub(r'\n{3,}', '\n\n', text)  # Compress multiple line breaks to two
+    text = re.sub(r'[ \t]{2,}', ' ', text)   # Compress multiple spaces to one
+
+    # Stage 5: Filter small text segments (possibly chart annotations)
+    lines = [line.strip() for line in text.split('\n') if len(line.strip()) > 3]
+
+    # Add page metadata
+    return f"Page {page_number}:\n" + "\n".join(lines) if lines else ""
+
+def extract_page(page, page_number):
+    """
+    Raw text, tables and cropped layout text (cleaned by clean_text) of one pdfplumber page
+
+    All three are read from the same page object, so its characters are parsed only once.
+    """
+    raw_text = page.extract_text() or ""
+    tables = page.extract_tables() or []
+
+    # Define valid text area (in points)
+    bbox = (
+        PAGE_MARGIN,  # left margin
+        PAGE_MARGIN,  # top margin (skip header)
+        page.width - PAGE_MARGIN,  # right margin
+        page.height - PAGE_MARGIN  # bottom margin (skip footer)
+    )
+
+    # Create filter function (key fix)
+    crop_filter = lambda obj: (
+        obj["x0"] >= bbox[0] and
+        obj["top"] >= bbox[1] and
+        obj["x1"] <= bbox[2] and
+        obj["bottom"] <= bbox[3]
+    )
+
+    # Apply area filtering
+    cropped_page = page.filter(crop_filter)
+
+    # Optimize text extraction parameters
+    text = cropped_page.extract_text(
+        **EXTRACT_SETTINGS,
+        keep_blank_chars=False,
+        extra_attrs=["size", "fontname"]
+    )
+
+    return {
+        "raw_text": raw_text,
+        "clean_text": clean_text(text, page_number=page_number),
+        "tables": tables
+    }
+
+def _extract_page_range(file_path, first_page, last_page):
+    """Process pool worker: every worker opens the PDF itself, only extracted strings are sent back"""
+    with pdfplumber.open(file_path) as pdf:
+        return [extract_page(pdf.pages[i], i + 1) for i in range(first_page, last_page)]
+
+def _extract_workers(num_pages):
+    workers = config.pdf_extract_workers or os.cpu_count() or 1
+    return max(1, min(workers, num_pages // config.pdf_extract_min_pages_per_worker))
+
+def extract_pages(file_path):
+    """
+    extract_page of every page in page order
+
+    Pages are split into contiguous ranges over a process pool of config.pdf_extract_workers
+    processes, short papers are extracted in this process.
+    """
+    with pdfplumber.open(file_path) as pdf:
+        num_pages = len(pdf.pages)
+        workers = _extract_workers(num_pages)
+        if workers == 1:
+            return [extract_page(page, i + 1) for i, page in enumerate(pdf.pages)]
+
+    bounds = [num_pages * k // workers for k in range(workers + 1)]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_POOL_CONTEXT) as executor:
+        futures = [executor.submit(_extract_page_range, file_path, bounds[k], bounds[k + 1]) for k in range(workers)]
+        # Collected in submission order, so the page order is preserved
+        return [page for future in futures for page in future.result()]
+
+def split_chunks(pages):
+    """Chunks of the cleaned page texts and their metadata ({"chunk_id", "page", "chars", "tokens"})"""
+    # Intelligent chunking strategy
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        separators=CHUNK_SEPARATORS
+    )
+    full_text = "\n".join(text for text in pages if text)
+    chunks = splitter.split_text(full_text)
+
+    # Filter empty chunks and short text
+    chunks = [chunk for chunk in chunks if len(chunk.strip()) > MIN_CHUNK_CHARS]
+    return chunks, chunk_metadata(full_text, chunks)
+
+def chunk_metadata(full_text, chunks):
+    """
+    Page and size of every chunk, the page taken from the last "Page N:" marker before the chunk
+
+    Token counts are computed here once, so retrieval can pack contexts without re-encoding chunks.
+    """
+    markers = [(m.start(), int(m.group(1))) for m in _PAGE_MARKER_RE.finditer(full_text)]
+    metadata = []
+    search_from = 0
+    for chunk_id, chunk in enumerate(chunks):
+        position = full_text.find(chunk, search_from)
+        page = None
+        if position != -1:
+            search_from = position + 1
+            page = next((number for offset, number in reversed(markers) if offset <= position), None)
+        metadata.append({"chunk_id": chunk_id, "page": page, "chars": len(chunk), "tokens": prompt_budget.count_tokens(chunk)})
+    return metadata
+
+def ingest_settings():
+    """Settings that change the content of an ingested document"""
+    return {
+        "format_version": DOCUMENT_FORMAT_VERSION,
+        "page_margin": PAGE_MARGIN,
+        "extract": EXTRACT_SETTINGS,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "separators": CHUNK_SEPARATORS,
+        "min_chunk_chars": MIN_CHUNK_CHARS,
+        "tokenizer": prompt_budget.TOKENIZER_MODEL
+    }
+
+class IngestedDocument:
+    """
+    Everything ChatCFD reads from one PDF, extracted in a single pass
+
+    raw_text and tables feed the case description prompts (config.paper_content / paper_table),
+    the cleaned per-page text and its chunks feed the semantic search of CFDCaseExtractor.
+    """
+    def __init__(self, key, pdf_sha256, source_path, raw_text, pages, tables, chunks, chunk_metadata):
+        self.key = key
+        self.pdf_sha256 = pdf_sha256
+        self.source_path = source_path
+        self.raw_text = raw_text
+        self.pages = pages  # cleaned text per page, "" for blank pages
+        self.tables = tables
+        self.chunks = chunks
+        self.chunk_metadata = chunk_metadata
+
+    def to_dict(self):
+        return {
+            "key": self.key,
+            "pdf_sha256": self.pdf_sha256,
+            "source_path": self.source_path,
+            "raw_text": self.raw_text,
+            "pages": self.pages,
+            "tables": self.tables,
+            "chunks": self.chunks,
+            "chunk_metadata": self.chunk_metadata
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["key"], data["pdf_sha256"], data["source_path"], data["raw_text"],
+            data["pages"], data["tables"], data["chunks"], data["chunk_metadata"]
+        )
+
+def build_document(file_path, key, pdf_sha256):
+    pages = extract_pages(file_path)
+    # Same layout as the former process_pdf_pdfplumber: non-empty page texts, one per line
+    raw_text = "".join(page["raw_text"] + "\n" for page in pages if page["raw_text"])
+    clean_pages = [page["clean_text"] for page in pages]
+    tables = [table for page in pages for table in page["tables"]]
+    chunks, metadata = split_chunks(clean_pages)
+    return IngestedDocument(key, pdf_sha256, os.path.abspath(file_path), raw_text, clean_pages, tables, chunks, metadata)
+
+# document key -> IngestedDocument of this process
+_documents = {}
+_documents_lock = threading.Lock()
+
+def ingest(file_path):
+    """
+    Return the IngestedDocument of the PDF, built at most once per content and settings
+
+    Documents are kept in memory for the life of the process and on disk in the PDF index cache
+    (unless config.pdf_index_cache_enabled is False), keyed by the sha256 of the PDF bytes.
+    """
+    start = time.perf_counter()
+    cache = pdf_index_cache.get_cache()
+    pdf_sha256 = cache.file_digest(file_path)
+    key = cache.make_key(pdf_sha256, ingest_settings())
+
+    with _documents_lock:
+        document = _documents.get(key)
+    if document is not None:
+        return document
+
+    data = cache.load_document(key) if config.pdf_index_cache_enabled else None
+    if data is not None:
+        document = IngestedDocument.from_dict(data)
+        print(f"Document cache hit for {os.path.basename(file_path)}: {len(document.pages)} pages, {len(document.chunks)} chunks loaded in {time.perf_counter() - start:.3f} s")
+    else:
+        document = build_document(file_path, key, pdf_sha256)
+        if config.pdf_index_cache_enabled:
+            cache.save_document(key, document.to_dict())
+        print(f"Document {os.path.basename(file_path)} ingested in {time.perf_counter() - start:.3f} s: {len(document.pages)} pages, {len(document.tables)} tables, {len(document.chunks)} chunks")
+
+    with _documents_lock:
+        return _documents.setdefault(key, document)
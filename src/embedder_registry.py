@@ -0,0 +1,83 @@
+import time
+import threading
+
+DEFAULT_EMBEDDER_MODEL = 'sentence-transformers/all-mpnet-base-v2'
+
+class EmbedderStats:
+    """Load time and reuse count of one embedding model"""
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.load_time_s = None
+        self.loaded_at = None
+        self.device = None
+        self.reuses = 0
+        self.load_errors = 0
+
+    def as_dict(self):
+        return {
+            "loaded": self.loaded_at is not None,
+            "load_time_s": self.load_time_s,
+            "loaded_at": self.loaded_at,
+            "device": self.device,
+            "reuses": self.reuses,
+            "load_errors": self.load_errors
+        }
+
+# model name -> SentenceTransformer, loaded on first use and kept for the life of the process
+_embedders = {}
+_stats = {}
+_registry_lock = threading.Lock()
+# One lock per model, so a slow load does not block lookups of other models
+_model_locks = {}
+
+def _model_lock(model_name):
+    with _registry_lock:
+        if model_name not in _model_locks:
+            _model_locks[model_name] = threading.Lock()
+            _stats[model_name] = EmbedderStats(model_name)
+        return _model_locks[model_name]
+
+def get_embedder(model_name=DEFAULT_EMBEDDER_MODEL):
+    """Return the process-wide SentenceTransformer for model_name, loading it on the first call"""
+    embedder = _embedders.get(model_name)
+    if embedder is not None:
+        with _registry_lock:
+            _stats[model_name].reuses += 1
+        return embedder
+
+    with _model_lock(model_name):
+        embedder = _embedders.get(model_name)
+        if embedder is not None:
+            with _registry_lock:
+                _stats[model_name].reuses += 1
+            return embedder
+
+        # Imported here so that reading the stats does not pull in torch
+        from sentence_transformers import SentenceTransformer
+        start = time.perf_counter()
+        try:
+            embedder = SentenceTransformer(model_name)
+        except Exception:
+            with _registry_lock:
+                _stats[model_name].load_errors += 1
+            raise
+        load_time = time.perf_counter() - start
+        print(f"Embedding model {model_name} loaded in {load_time:.2f} s")
+
+        with _registry_lock:
+            stats = _stats[model_name]
+            stats.load_time_s = load_time
+            stats.loaded_at = time.time()
+            stats.device = str(getattr(embedder, "device", None))
+            _embedders[model_name] = embedder
+        return embedder
+
+def registry_stats():
+    """Load time and reuse count per model name"""
+    with _registry_lock:
+        return {model_name: stats.as_dict() for model_name, stats in _stats.items()}
+
+def release_all():
+    """Drop every loaded model, the next get_embedder call loads it again"""
+    with _registry_lock:
+        _embedders.clear()
@@ -2,9 +2,14 @@ import config
 import shutil
 import os
 import file_writer
+import llm_async
+import prompt_budget
+import preprocess_OF_tutorial
+import of_case_index
 
-from qa_modules import QA_NoContext_deepseek_V3,QA_NoContext_deepseek_R1
+from qa_modules import QA_NoContext_deepseek_V3,QA_NoContext_deepseek_R1,QA_Classify_deepseek_V3
 import json
+import jsonschema
 import re
 import random
 from pathlib import Path
@@ -33,11 +38,14 @@ def create_OF_case_json(source_dir):
     
     Args:
     source_dir - Path to the case root directory (folder containing 0/, constant/, system/)
-    output_json - Path to the output JSON file
     
     Returns:
-    None, results will be written to the specified JSON file
+    The JSON document as a string
     """
+    return dict_to_json_string(create_OF_case_dict(source_dir))
+
+def create_OF_case_dict(source_dir):
+    """Read the files of the OpenFOAM case directory (0/, constant/, system/) into a dict keyed by relative path"""
     file_data = {}
     
     # Three target directories to process
@@ -68,7 +76,7 @@ def create_OF_case_json(source_dir):
                     print(f"Unable to read file {entry_path}: {str(e)}")
                     continue
 
-    return dict_to_json_string(file_data)
+    return file_data
 
 
 def list_case_file(case_path):
@@ -86,9 +94,17 @@ def list_case_file(case_path):
                 file_list.append(rel_path)
     return file_list
 
+# A case file path, nested ones such as constant/triSurface/<file> included, never ending in the
+# full stop of a sentence ("... missing constant/g." gives constant/g)
+CASE_FILE_PATH_PATTERN = r"(?:0|system|constant)/[\w.\-/]*[\w\-]"
+# A case file path or 'no', the answer of identify_error_to_add_new_file
+MISSING_FILE_ANSWER_PATTERN = CASE_FILE_PATH_PATTERN + r"|(?i:no)\b"
+
 def identify_error_to_add_new_file(running_error):
 
-    analyze_error_to_add_new_file = f'''{config.general_prompts}. OpenFOAM File Requirement Analyzer
+    running_error = prompt_budget.fit_running_error("identify_error_to_add_new_file", running_error)
+
+    analyze_error_to_add_new_file = f'''OpenFOAM File Requirement Analyzer
         Analyze the runtime error {running_error} to:
 
         1. Check if it contains the exact phrase "cannot find file"
@@ -113,13 +129,14 @@ constant/g
 no
 '''
 
-    qa = QA_NoContext_deepseek_V3()
+    qa = QA_Classify_deepseek_V3()
 
-    answer = qa.ask(analyze_error_to_add_new_file)
+    answer = qa.ask(analyze_error_to_add_new_file, pattern=MISSING_FILE_ANSWER_PATTERN)
 
-    pure_response = file_writer.extract_pure_response(answer)
+    if answer is None:
+        return 'no'
 
-    return pure_response
+    return answer
 
 def read_files_to_dict(base_dir):
     file_dict = {}
@@ -153,7 +170,7 @@ def add_new_file(file_name):
 
     file_path = f'{config.OUTPUT_PATH}/{file_name}'
 
-    other_case_file_content = read_files_to_dict(config.OUTPUT_PATH)
+    other_case_file_content, _ = prompt_budget.fit_case_files("add_new_file", read_files_to_dict(config.OUTPUT_PATH), file_name)
 
     add_new_file_prompt = f'''
     A new case file {file_name} must be add to the OpenFOAM case dir. The file contents of other case files are: {other_case_file_content}. Please respond the file contents for the new file which can make this case run correctly with other case files. Ensure the dimension is correct if the dimension shows in the file content.
@@ -178,6 +195,8 @@ def add_new_file(file_name):
 
 def identify_file_name_from_error(running_error):
 
+    running_error = prompt_budget.fit_running_error("identify_file_name_from_error", running_error)
+
     case_files = list_case_file(config.OUTPUT_PATH)
 
     analyze_running_error_prompt = f'''
@@ -199,54 +218,42 @@ def identify_file_name_from_error(running_error):
 
     return answer
 
+def case_boundary_types():
+    """Boundary types of the 0/ field files of the case being run"""
+    zero_dir = os.path.join(config.OUTPUT_PATH, '0') if config.OUTPUT_PATH else None
+    if zero_dir is None or not os.path.isdir(zero_dir):
+        return []
+    field_files = {}
+    for entry in os.listdir(zero_dir):
+        entry_path = os.path.join(zero_dir, entry)
+        if os.path.isfile(entry_path):
+            with open(entry_path, 'r', encoding='utf-8', errors='ignore') as f:
+                field_files[f'0/{entry}'] = f.read()
+    return preprocess_OF_tutorial.boundary_types(field_files)
+
 # Parameter target_file is the file name identified from running_error that needs to be modified
 # Find by solver
 def find_reference_files_by_solver(target_file):
-    case_solver = config.case_solver
-    turbulence_model = config.case_turbulece_model
-    # Return content
-    target_file_reference = {}
-
-    solver_type = None
-
-    file_number = 0
-
-    for key, value in config.OF_case_data_dict.items():
-        if case_solver in key:
-            config_files = value['configuration_files']
-            if target_file in config_files.keys():
-                # print(config_files.keys())
-                new_file_key = f'sample_file_{file_number}'
-                file_number += 1
-                target_file_reference[new_file_key] = config_files[target_file]
-
-    # If the above result is 0, then look at a higher level, first find the solver type, such as compressible
-    if file_number == 0:
-        for key, value in config.OF_case_data_dict.items():
-            if case_solver in key:
-                path_split = key.split('/')
-                solver_type = path_split[0]
-                break
-
-    # Find target_file under solver type
-    if solver_type is not None:
-        for key, value in config.OF_case_data_dict.items():
-                path_split = key.split('/')
-                if solver_type == path_split[0]:
-                    config_files = value['configuration_files']
-                    if target_file in config_files.keys():
-                        # print(config_files.keys())
-                        new_file_key = f'sample_file_{file_number}'
-                        file_number += 1
-                        target_file_reference[key] = config_files[target_file]
-
-    several_target_file_reference = select_random_items(target_file_reference, 3)
+    # Up to 3 samples of the same solver, else the best matching cases of its feature directory
+    # (compressible, incompressible, ...) by turbulence model and boundary types. The tutorial
+    # cases most similar to the paper (config.best_reference_cases) come first in both
+    several_target_file_reference = of_case_index.get_index().reference_files(
+        config.case_solver,
+        target_file,
+        turbulence_model=config.case_turbulece_model,
+        boundary_types=case_boundary_types(),
+        preferred=config.best_reference_cases
+    )
 
     return dict_to_json_string(several_target_file_reference)
 
 def analyze_running_error_with_all_case_file_content(running_error):
 
-    all_case_file_content = create_OF_case_json(config.OUTPUT_PATH)
+    # Files are ranked against the full error, only the embedded copy is truncated
+    all_case_file_content, (running_error,) = prompt_budget.fit_case_files(
+        "analyze_running_error_with_all_case_file_content", create_OF_case_dict(config.OUTPUT_PATH), str(running_error), [running_error]
+    )
+    all_case_file_content = dict_to_json_string(all_case_file_content)
 
     file_content = None
 
@@ -277,8 +284,104 @@ def analyze_running_error_with_all_case_file_content(running_error):
 
     return [wrong_file,advices_for_revision]
 
+TRIAGE_ERROR_CLASSES = ["dimension_mismatch", "missing_file", "file_revision"]
+
+def triage_schema(case_files):
+    """JSON schema of the triage answer, file_to_revise must be one of the existing case files"""
+    return {
+        "type": "object",
+        "properties": {
+            "error_class": {"enum": TRIAGE_ERROR_CLASSES},
+            "missing_file": {"type": ["string", "null"], "pattern": f"^{CASE_FILE_PATH_PATTERN}$"},
+            "file_to_revise": {"enum": case_files + [None]},
+            "repeated": {"type": "boolean"},
+            "advice": {"type": "string"}
+        },
+        "required": ["error_class", "missing_file", "file_to_revise", "repeated", "advice"],
+        "additionalProperties": False,
+        "allOf": [
+            {
+                "if": {"properties": {"error_class": {"const": "missing_file"}}},
+                "then": {"properties": {"missing_file": {"type": "string"}}}
+            },
+            {
+                "if": {"properties": {"error_class": {"const": "file_revision"}}},
+                "then": {"properties": {"file_to_revise": {"type": "string"}, "advice": {"minLength": 1}}}
+            }
+        ]
+    }
+
+def parse_triage_answer(answer, schema):
+    """Decode and validate a triage answer, raises json.JSONDecodeError or jsonschema.ValidationError"""
+    answer = answer.strip()
+    fenced = re.match(r"^```(?:json)?\s*(.*?)\s*```$", answer, re.DOTALL)
+    if fenced:
+        answer = fenced.group(1)
+    triage = json.loads(answer)
+    jsonschema.validate(triage, schema)
+    return triage
+
+def triage_running_error(running_error, error_history):
+    """
+    Classify the runtime error, choose the fix and write the revision advice in a single call
+
+    Replaces the detect_dimension_error, identify_error_to_add_new_file,
+    analyze_running_error_with_all_case_file_content, analyze_error_repetition and
+    analyze_running_error_with_reference_files sequence. Returns the validated triage dict, or
+    None if no valid answer was given within config.triage_max_attempts calls.
+    """
+    previous_errors = error_history[-3:-1] if len(error_history) >= 3 else []
+    all_case_file_content, (running_error, *previous_errors) = prompt_budget.fit_case_files(
+        "triage_running_error", create_OF_case_dict(config.OUTPUT_PATH), str(running_error), [running_error] + previous_errors
+    )
+    all_case_file_content = dict_to_json_string(all_case_file_content)
+
+    case_files = list_case_file(config.OUTPUT_PATH)
+    schema = triage_schema(case_files)
+
+    if previous_errors:
+        previous_errors_prompt = f"The two previous runtime errors were: Error 1: [[[ {previous_errors[0]} ]]]. Error 2: [[[ {previous_errors[1]} ]]]."
+    else:
+        previous_errors_prompt = "There are no previous runtime errors."
+
+    triage_prompt = f'''
+    Triage the provided OpenFOAM runtime error [[[ {running_error} ]]]. The OpenFOAM case files are given as json-format string as [[[ {all_case_file_content} ]]]. {previous_errors_prompt} The revision must not alter the case to voilate these initial and boundary conditions in the paper [[[ {config.case_ic_bc_from_paper} ]]].
+
+    Your response must be a json format string with exactly the following keys:
+    - 'error_class': 'dimension_mismatch' if the error explicitly reports a dimensional inequality (e.g., [0 2 -2 0 0 0 0] != [0 1 -1 0 0 0 0], dimension mismatch); otherwise 'missing_file' if the error reports that a case file cannot be found; otherwise 'file_revision'.
+    - 'missing_file': for 'missing_file', the path of the missing file formatted as 0/..., system/... or constant/...; otherwise null.
+    - 'file_to_revise': for 'file_revision', the file which will be revised to fix the error. It must be one of the case files {case_files}; otherwise null.
+    - 'repeated': true if the same error has shown in this error and both previous errors, otherwise false.
+    - 'advice': for 'file_revision', a step-by-step fix of 'file_to_revise' that addresses the error's technical cause (e.g., CFL violation, invalid discretization scheme, missing required keyword); otherwise an empty string.
+
+    In your JSON response: Absolutely AVOID any elements including but not limited to:
+    - Markdown code block markers (``` or ```)
+    - Extra comments or explanations
+    - Unnecessary empty lines or indentation
+    '''
+
+    qa = QA_NoContext_deepseek_R1()
+
+    question = triage_prompt
+    for attempt in range(config.triage_max_attempts):
+        answer = qa.ask(question)
+        try:
+            triage = parse_triage_answer(answer, schema)
+        except (json.JSONDecodeError, jsonschema.ValidationError) as e:
+            error_message = e.message if isinstance(e, jsonschema.ValidationError) else str(e)
+            print(f"Invalid triage answer (attempt {attempt + 1}/{config.triage_max_attempts}): {error_message}")
+            question = f"{triage_prompt}\n    Your previous response was rejected because: {error_message}. Respond again with a valid json string."
+            continue
+        if not previous_errors:
+            triage["repeated"] = False
+        return triage
+
+    return None
+
 def analyze_running_error_2(running_error, file_name):
 
+    running_error = prompt_budget.fit_running_error("analyze_running_error_2", running_error)
+
     file_content = None
 
     file_path = f'{config.OUTPUT_PATH}/{file_name}'
@@ -310,21 +413,19 @@ def analyze_running_error_2(running_error, file_name):
 def analyze_error_repetition(error_history):
     answer = 'no'
     if(len(error_history)>=3):
-        error_minus_1 = error_history[-1]
-        error_minus_2 = error_history[-2]
-        error_minus_3 = error_history[-3]
+        error_minus_1, error_minus_2, error_minus_3 = prompt_budget.fit_running_errors(
+            "analyze_error_repetition", [error_history[-1], error_history[-2], error_history[-3]]
+        )
 
         analyze_running_error_repetition_prompt = f'''
         Analyze the following three error histories to identify whether the error have repetitively shown three time. Error 1: {error_minus_1}. Error 2: {error_minus_2}. Error 3: {error_minus_3}. If the error have repetitively shown three times, respond 'yes'; otherwise, respond 'no'. You must only respond 'yes' or 'no'.
         '''
 
-        qa = QA_NoContext_deepseek_R1()
+        qa = QA_Classify_deepseek_V3()
 
-        answer = qa.ask(analyze_running_error_repetition_prompt)
+        answer = qa.ask(analyze_running_error_repetition_prompt, choices=("yes", "no")) or 'no'
 
-    answer = answer.strip()
-
-    if answer.lower() == 'yes':
+    if answer == 'yes':
         return True
     else:
         return False
@@ -363,21 +464,21 @@ def rewrite_file(file_name, reference_files):
         file_write_successful = True
 
 def detect_dimension_error(running_error):
-    
-    detect_dimension_error = f'''{config.general_prompts}\nAnalyze the OpenFOAM runtime error {running_error} to determine if it explicitly indicates a dimensional inequality. Look for patterns such as:
+
+    running_error = prompt_budget.fit_running_error("detect_dimension_error", running_error)
+
+    detect_dimension_error = f'''Analyze the OpenFOAM runtime error {running_error} to determine if it explicitly indicates a dimensional inequality. Look for patterns such as:
 
     - Imbalanced dimension comparisons (e.g., [dim1] != [dim2], a != b where a and b - are dimensions).
     - Keywords like dimensions, incompatible dimensions, or dimension mismatch.
     - Explicit dimension lists (e.g., [0 0 0 -1 0 0 0] != [0 0 0 -2 0 0 0])
     If the error directly references dimensional inequality (as defined above), respond 'yes'. If not, or if the error is unrelated (e.g., syntax, segmentation faults, solver crashes), respond 'no'. Only reply with 'yes' or 'no'.'''
 
-    qa = QA_NoContext_deepseek_V3()
-
-    answer = qa.ask(detect_dimension_error)
+    qa = QA_Classify_deepseek_V3()
 
-    answer = file_writer.extract_pure_response(answer)
+    answer = qa.ask(detect_dimension_error, choices=("yes", "no"))
 
-    if answer.strip().lower() == 'yes':
+    if answer == 'yes':
         return True
     else:
         return False
@@ -390,6 +491,10 @@ def strongly_correct_all_dimension_with_reference_files():
 
     folder_path = Path(case_0_folder)
 
+    # The field files are corrected independently, so their prompts are issued concurrently
+    field_files = []
+    correct_dimension_prompts = []
+
     for file_path in folder_path.iterdir():
         file_content = None
         file_name = f'0/{file_path.name}'
@@ -401,7 +506,6 @@ def strongly_correct_all_dimension_with_reference_files():
 
         with open(file_path, "r", encoding="utf-8") as file:
             file_content = file.read()
-            a = 1
 
         correct_dimension_prompt =   f'''{config.general_prompts}
         Please check the dimension of the OpenFOAM field file {file_path.name} and correct it according to the dimensions of the reference file contents. The original file content is: {file_content}. The reference file contents are: {reference_files}. You must not revise any other contents of the original file except for the dimension.
@@ -412,10 +516,12 @@ def strongly_correct_all_dimension_with_reference_files():
         - Unnecessary empty lines or indentation
         '''
 
-        qa = QA_NoContext_deepseek_V3()
+        field_files.append(file_path)
+        correct_dimension_prompts.append(correct_dimension_prompt)
 
-        answer = qa.ask(correct_dimension_prompt)
+    answers = llm_async.gather(*(QA_NoContext_deepseek_V3().ask_async(prompt) for prompt in correct_dimension_prompts))
 
+    for file_path, answer in zip(field_files, answers):
         answer = file_writer.extract_pure_response(answer)
 
         try:
@@ -429,6 +535,8 @@ def strongly_correct_all_dimension_with_reference_files():
 
 def analyze_running_error_with_reference_files(running_error, file_name,early_revision_advice, reference_files):
 
+    running_error = prompt_budget.fit_running_error("analyze_running_error_with_reference_files", running_error)
+
     file_content = None
 
     file_path = f'{config.OUTPUT_PATH}/{file_name}'
@@ -500,6 +608,9 @@ def ensure_all_field_file_dimensions():
 
     folder_path = Path(case_0_folder)
 
+    field_files = []
+    correct_dimension_prompts = []
+
     for file_path in folder_path.iterdir():
         file_content = None
         if file_path.is_file():
@@ -507,7 +618,6 @@ def ensure_all_field_file_dimensions():
 
         with open(file_path, "r", encoding="utf-8") as file:
             file_content = file.read()
-            a = 1
 
         # reference_files = find_reference_files_by_solver(field_file)
 
@@ -520,10 +630,12 @@ def ensure_all_field_file_dimensions():
         - Unnecessary empty lines or indentation
         '''
 
-        qa = QA_NoContext_deepseek_V3()
+        field_files.append(file_path)
+        correct_dimension_prompts.append(correct_dimension_prompt)
 
-        answer = qa.ask(correct_dimension_prompt)
+    answers = llm_async.gather(*(QA_NoContext_deepseek_V3().ask_async(prompt) for prompt in correct_dimension_prompts))
 
+    for file_path, answer in zip(field_files, answers):
         answer = file_writer.extract_pure_response(answer)
 
         try:
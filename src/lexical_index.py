@@ -0,0 +1,205 @@
+import re
+import math
+import unicodedata
+from collections import Counter, defaultdict
+
+import numpy as np
+
+import config
+
+# Greek letters as they are spelled out in queries
+_GREEK = {
+    "α": "alpha", "β": "beta", "γ": "gamma", "δ": "delta", "ε": "epsilon", "θ": "theta", "κ": "kappa",
+    "λ": "lambda", "μ": "mu", "ν": "nu", "ρ": "rho", "σ": "sigma", "τ": "tau", "ω": "omega"
+}
+_SUPERSCRIPTS = str.maketrans("⁰¹²³⁴⁵⁶⁷⁸⁹⁻⁺", "0123456789-+")
+_SUPERSCRIPT_RUN_RE = re.compile("[⁰¹²³⁴⁵⁶⁷⁸⁹⁻⁺]+")
+_TIMES = r"\s*[×x·*]\s*"
+
+_STOPWORDS = set("""
+a an the of and or in on at to for with by from as is are was were be been this that these those it its
+you your must not do does any all which what how when where than then into such can will should only
+""".split())
+
+_UNIT_RE = r"°|deg(?:rees?)?|m/s|m\^?2/s|kg/m\^?3|Pa|kPa|K|m|mm|s|%"
+
+# A number: 6, 0.15, 6e6, 6.0E+06, 6×10^6, 6 x 10⁶, 6·10^6, 6,000,000, also with a unit written
+# directly after it (10m/s, 300K) or at the end of a sentence
+NUMBER_RE = re.compile(
+    rf"(?<![\w.])([-+]?(?:\d{{1,3}}(?:,\d{{3}})+|\d+)(?:\.\d+)?)(?:[eE]([-+]?\d+)|{_TIMES}10\s*\^?\s*\{{?([-+]?\d+)\}}?)?(\s*million)?"
+    rf"(?=(?:{_UNIT_RE})?(?!\w|\.\d))"
+)
+
+# Canonical parameter symbol -> regex of the ways papers and prompts write it, case-sensitive
+# for the bare symbols so that e.g. "k" does not match every "K"
+PARAMETER_SYMBOLS = {
+    "Re": r"Re(?:_?(?:c|inf|L|x))?|(?i:reynolds(?:\s+number)?)",
+    "Ma": r"Ma|M(?=\s*=)|(?i:mach(?:\s+number)?)",
+    "alpha": r"(?i:alpha|aoa|angle\s+of\s+attack)",
+    "y+": r"y\s*\^?\+",
+    "Pr": r"Pr|(?i:prandtl(?:\s+number)?)",
+    "Tu": r"Tu|(?i:turbulen(?:ce|t)\s+intensity)",
+    "T": r"T(?:_?(?:inf|0|w|ref))?|(?i:temperature)",
+    "p": r"p(?:_?(?:inf|0|ref))?|(?i:pressure)",
+    "U": r"U(?:_?(?:inf|0|ref))?|(?i:(?:free[-\s]?stream\s+)?velocity)",
+    "nu": r"nu|(?i:kinematic\s+viscosity)",
+    "mu": r"mu|(?i:dynamic\s+viscosity)",
+    "rho": r"rho|(?i:density)",
+    "k": r"k|(?i:turbulent\s+kinetic\s+energy)",
+    "omega": r"omega|(?i:specific\s+dissipation(?:\s+rate)?)",
+    "epsilon": r"epsilon|(?i:dissipation\s+rate)",
+    "CFL": r"(?i:cfl|courant(?:\s+number)?)",
+    "dt": r"dt|Δt|(?i:time\s+step)",
+    "c": r"c|(?i:chord(?:\s+length)?)"
+}
+
+def normalize(text):
+    """NFKC text with Greek letters spelled out and superscripts written as powers (10⁶ -> 10^6)"""
+    # Before NFKC, which would turn 10⁶ into 106
+    text = _SUPERSCRIPT_RUN_RE.sub(lambda match: "^" + match.group(0).translate(_SUPERSCRIPTS), text)
+    text = unicodedata.normalize("NFKC", text)
+    for letter, name in _GREEK.items():
+        text = text.replace(letter, f" {name} ")
+    return text.replace("∞", "_inf")
+
+def parse_number(match):
+    mantissa, exponent, power_of_ten, million = match.groups()
+    value = float(mantissa.replace(",", ""))
+    if exponent is not None:
+        value *= 10 ** int(exponent)
+    elif power_of_ten is not None:
+        value *= 10 ** int(power_of_ten)
+    if million:
+        value *= 1e6
+    return value
+
+def number_token(value):
+    return f"#{value:.4g}"
+
+def tokenize(text):
+    """Lower-case word tokens without stopwords, plus one canonical token per number (6e6 and 6×10^6 both give #6e+06)"""
+    text = normalize(text)
+    tokens = [number_token(parse_number(match)) for match in NUMBER_RE.finditer(text)]
+    text = NUMBER_RE.sub(" ", text)
+    for word in re.findall(r"[a-z][a-z0-9_]*\+?", text.lower()):
+        if word not in _STOPWORDS:
+            tokens.append(word)
+    return tokens
+
+class BM25Index:
+    """
+    Okapi BM25 over the chunks of a document
+
+    The BM25 weight of every (term, chunk) pair is computed at build time, so a query only sums
+    the precomputed posting arrays of its terms.
+    """
+    def __init__(self, chunks, k1=None, b=None):
+        k1 = config.bm25_k1 if k1 is None else k1
+        b = config.bm25_b if b is None else b
+        self.size = len(chunks)
+        tokenized = [Counter(tokenize(chunk)) for chunk in chunks]
+        lengths = np.array([sum(counts.values()) for counts in tokenized], dtype='float32')
+        average_length = float(lengths.mean()) if self.size else 0.0
+
+        postings = defaultdict(list)
+        for chunk_id, counts in enumerate(tokenized):
+            for term, tf in counts.items():
+                postings[term].append((chunk_id, tf))
+
+        self.postings = {}
+        for term, entries in postings.items():
+            idf = math.log(1 + (self.size - len(entries) + 0.5) / (len(entries) + 0.5))
+            chunk_ids = np.array([chunk_id for chunk_id, _ in entries], dtype='int64')
+            tf = np.array([tf for _, tf in entries], dtype='float32')
+            norm = k1 * (1 - b + b * lengths[chunk_ids] / average_length)
+            self.postings[term] = (chunk_ids, idf * tf * (k1 + 1) / (tf + norm))
+
+    def scores(self, query):
+        scores = np.zeros(self.size, dtype='float32')
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+        return scores
+
+    def search(self, query, top_k):
+        """Chunk ids with a positive score, best first"""
+        scores = self.scores(query)
+        top_k = min(top_k, self.size)
+        if top_k == 0:
+            return []
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [int(i) for i in ranked if scores[i] > 0]
+
+class NumericParameterIndex:
+    """
+    (symbol, value, unit, chunk id) of every parameter assignment found in the chunks
+
+    Matches forms such as "Re = 6×10^6", "Ma 0.15", "α = 10°" or "Reynolds number of 6 million".
+    A query is answered with the chunks giving a value to the symbols it mentions, chunks that
+    also state a value named in the query first.
+    """
+    def __init__(self, chunks):
+        self.entries = []  # (symbol, value, unit, chunk_id)
+        self.by_symbol = defaultdict(list)
+        for chunk_id, chunk in enumerate(chunks):
+            for symbol, value, unit in extract_parameters(chunk):
+                self.entries.append((symbol, value, unit, chunk_id))
+                self.by_symbol[symbol].append((value, unit, chunk_id))
+
+    def search(self, query, top_k):
+        symbols = mentioned_symbols(query)
+        if not symbols:
+            return []
+        query_values = {number_token(parse_number(match)) for match in NUMBER_RE.finditer(normalize(query))}
+        scores = Counter()
+        for symbol in symbols:
+            for value, _, chunk_id in self.by_symbol.get(symbol, []):
+                scores[chunk_id] += 1
+                if number_token(value) in query_values:
+                    scores[chunk_id] += 2
+        return [chunk_id for chunk_id, _ in sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:top_k]]
+
+_SYMBOL_PATTERNS = {symbol: re.compile(rf"(?<![\w])(?:{pattern})(?![a-zA-Z])") for symbol, pattern in PARAMETER_SYMBOLS.items()}
+_ASSIGNMENT_RE = {
+    symbol: re.compile(
+        rf"(?<![\w])(?:{pattern})\s*(?:\([^)]{{0,20}}\)\s*)?(?:=|≈|~|:|<|>|≤|≥|(?i:of|is|was|equal\s+to|at))?\s*"
+        rf"(?P<number>{NUMBER_RE.pattern})\s*(?P<unit>{_UNIT_RE})?(?![\w])"
+    )
+    for symbol, pattern in PARAMETER_SYMBOLS.items()
+}
+
+def extract_parameters(text):
+    """(symbol, value, unit) of every "symbol [=] number [unit]" in text"""
+    text = normalize(text)
+    found = []
+    for symbol, assignment_re in _ASSIGNMENT_RE.items():
+        for match in assignment_re.finditer(text):
+            number = NUMBER_RE.match(match.group("number").strip())
+            if number is None:
+                continue
+            found.append((symbol, parse_number(number), match.group("unit") or ""))
+    return found
+
+def mentioned_symbols(query):
+    query = normalize(query)
+    return [symbol for symbol, pattern in _SYMBOL_PATTERNS.items() if pattern.search(query)]
+
+def reciprocal_rank_fusion(rankings, k=None):
+    """Ids of several best-first rankings ordered by sum(1 / (k + rank))"""
+    k = config.hybrid_rrf_k if k is None else k
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] += 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda item: -scores[item])
+
+class LexicalIndex:
+    """BM25 and numeric-parameter indexes of one document, built next to its vector index"""
+    def __init__(self, chunks):
+        self.bm25 = BM25Index(chunks)
+        self.numeric = NumericParameterIndex(chunks)
+
+    def rankings(self, question, top_k):
+        return [self.bm25.search(question, top_k), self.numeric.search(question, top_k)]
@@ -0,0 +1,87 @@
+import asyncio
+import threading
+import weakref
+from contextlib import asynccontextmanager
+
+import config
+
+class LoopLocal:
+    """Lazily create one object per running event loop (asyncio primitives and clients are loop-bound)"""
+    def __init__(self, factory):
+        self._factory = factory
+        self._objects = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            obj = self._objects.get(loop)
+            if obj is None:
+                obj = self._factory()
+                self._objects[loop] = obj
+            return obj
+
+class ConcurrencyLimiter:
+    """A global semaphore plus one semaphore per model name"""
+    def __init__(self):
+        self.global_semaphore = asyncio.Semaphore(config.llm_max_concurrency)
+        self.model_semaphores = {}
+
+    def _model_semaphore(self, model_name):
+        semaphore = self.model_semaphores.get(model_name)
+        if semaphore is None:
+            limit = config.llm_model_concurrency.get(model_name, config.llm_default_model_concurrency)
+            semaphore = asyncio.Semaphore(limit)
+            self.model_semaphores[model_name] = semaphore
+        return semaphore
+
+    @asynccontextmanager
+    async def slot(self, model_name):
+        async with self._model_semaphore(model_name):
+            async with self.global_semaphore:
+                yield
+
+_limiters = LoopLocal(ConcurrencyLimiter)
+
+def limit(model_name):
+    """Async context manager holding a concurrency slot for one request to model_name"""
+    return _limiters.get().slot(model_name)
+
+class _BackgroundLoop:
+    """A daemon thread running the event loop that serves the synchronous wrappers"""
+    def __init__(self):
+        self.loop = None
+        self._lock = threading.Lock()
+
+    def get_loop(self):
+        with self._lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=self.loop.run_forever, name="chatcfd-llm-loop", daemon=True)
+                thread.start()
+            return self.loop
+
+_background = _BackgroundLoop()
+
+def run_sync(coro):
+    """
+    Run a coroutine to completion from synchronous code
+
+    All synchronous callers share one background loop, so the loop-bound async HTTP
+    connection pools and concurrency limits are reused across calls.
+    """
+    loop = _background.get_loop()
+    try:
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+    if running_loop is loop:
+        coro.close()
+        raise RuntimeError("run_sync() cannot be called from the LLM loop, await the *_async method instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+def gather(*coros):
+    """Run independent coroutines concurrently and return their results in order"""
+    async def _gather():
+        return await asyncio.gather(*coros)
+    return run_sync(_gather())
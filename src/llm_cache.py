@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+import config
+
+CACHE_MODES = ("off", "readwrite", "replay")
+
+class LLMCacheMiss(Exception):
+    """Raised in replay mode when a prompt has no recorded response"""
+
+class LLMResponseCache:
+    """
+    Content-addressed on-disk store of LLM responses
+
+    Every response is saved as <cache_dir>/<key[:2]>/<key>.json, where the key is the
+    sha256 of (model name, temperature, messages) plus any request parameters that change
+    the response, such as the answer set of a classification call. The file mtime is refreshed on every
+    hit, so size eviction removes the least recently used entries first.
+    """
+    def __init__(self, cache_dir, max_size_mb, max_age_days):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self._lock = threading.Lock()
+        self._total_size = None  # Scanned lazily on the first write
+
+    @staticmethod
+    def make_key(model_name, temperature, messages, params=None):
+        request = {"model": model_name, "temperature": temperature, "messages": messages}
+        if params:
+            request["params"] = params
+        payload = json.dumps(request, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _is_expired(self, mtime, now):
+        return self.max_age_seconds > 0 and now - mtime > self.max_age_seconds
+
+    def get(self, key):
+        """Return the cached response dict, or None on a miss or an expired entry"""
+        entry_path = self._entry_path(key)
+        try:
+            now = time.time()
+            if self._is_expired(os.stat(entry_path).st_mtime, now):
+                self._remove(entry_path)
+                return None
+            with open(entry_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(entry_path, (now, now))
+            return entry["response"]
+        except (OSError, json.JSONDecodeError, KeyError):
+            return None
+
+    def put(self, key, model_name, temperature, response):
+        entry_path = self._entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        entry = {
+            "key": key,
+            "model": model_name,
+            "temperature": temperature,
+            "created": time.time(),
+            "response": response
+        }
+        # Write to a temporary file first so a crash never leaves a truncated entry
+        tmp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, entry_path)
+
+        with self._lock:
+            if self._total_size is None:
+                self._total_size = self._scan_size()
+            else:
+                self._total_size += os.path.getsize(entry_path)
+            if self.max_size_bytes > 0 and self._total_size > self.max_size_bytes:
+                self._evict()
+
+    def _remove(self, entry_path):
+        try:
+            os.remove(entry_path)
+        except OSError:
+            pass
+
+    def _list_entries(self):
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for dirpath, dirnames, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                if not filename.endswith(".json"):
+                    continue
+                entry_path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(entry_path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry_path))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._list_entries())
+
+    def _evict(self):
+        """Drop expired entries, then the least recently used ones until 90% of the size limit"""
+        now = time.time()
+        entries = sorted(self._list_entries())
+        total_size = sum(size for _, size, _ in entries)
+        target_size = self.max_size_bytes * 0.9
+        for mtime, size, entry_path in entries:
+            if total_size <= target_size and not self._is_expired(mtime, now):
+                continue
+            self._remove(entry_path)
+            total_size -= size
+        self._total_size = total_size
+
+    def clear(self):
+        with self._lock:
+            for _, _, entry_path in self._list_entries():
+                self._remove(entry_path)
+            self._total_size = 0
+
+_cache_instance = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Process-wide cache built from the current config on first use"""
+    global _cache_instance
+    with _cache_lock:
+        if _cache_instance is None or _cache_instance.cache_dir != config.LLM_CACHE_PATH:
+            _cache_instance = LLMResponseCache(
+                config.LLM_CACHE_PATH,
+                config.llm_cache_max_size_mb,
+                config.llm_cache_max_age_days
+            )
+        return _cache_instance
+
+def cache_mode():
+    mode = config.llm_cache_mode
+    if mode not in CACHE_MODES:
+        print(f"Unknown llm_cache_mode '{mode}', falling back to 'off'")
+        return "off"
+    return mode
@@ -0,0 +1,133 @@
+import threading
+import weakref
+
+import httpx
+from openai import OpenAI, AsyncOpenAI
+
+import config
+import llm_async
+
+class ConnectionStats:
+    """
+    Count requests and whether they ran on a new or a kept-alive connection
+
+    httpcore exposes the socket wrapper of every response as the "network_stream"
+    extension, so a stream seen before means the pooled connection was reused.
+    """
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self._seen_streams = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def on_response(self, response):
+        stream = response.extensions.get("network_stream")
+        with self._lock:
+            self.requests += 1
+            if stream is None:
+                return
+            if stream in self._seen_streams:
+                self.reused_connections += 1
+            else:
+                self.new_connections += 1
+                self._seen_streams.add(stream)
+
+    async def on_response_async(self, response):
+        self.on_response(response)
+
+    def as_dict(self):
+        with self._lock:
+            tracked = self.new_connections + self.reused_connections
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused_connections": self.reused_connections,
+                "reuse_rate": self.reused_connections / tracked if tracked else 0.0
+            }
+
+def _pool_limits():
+    return httpx.Limits(
+        max_connections=config.http_pool_max_connections,
+        max_keepalive_connections=config.http_pool_max_keepalive,
+        keepalive_expiry=config.http_keepalive_expiry
+    )
+
+def _pool_timeout():
+    return httpx.Timeout(
+        config.http_read_timeout,
+        connect=config.http_connect_timeout
+    )
+
+# (base_url, api_key) -> (OpenAI client, ConnectionStats)
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_openai_client(api_key, base_url):
+    """Return the process-wide OpenAI client with a keep-alive connection pool for (base_url, api_key)"""
+    key = (base_url, api_key)
+    with _clients_lock:
+        entry = _clients.get(key)
+        if entry is None:
+            stats = ConnectionStats()
+            http_client = httpx.Client(
+                limits=_pool_limits(),
+                timeout=_pool_timeout(),
+                event_hooks={"response": [stats.on_response]}
+            )
+            client = OpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+            entry = (client, stats)
+            _clients[key] = entry
+        return entry[0]
+
+# Async clients are bound to the event loop they were created in:
+# loop -> {(base_url, api_key): (AsyncOpenAI client, ConnectionStats)}
+_async_clients = llm_async.LoopLocal(dict)
+
+def get_async_openai_client(api_key, base_url):
+    """Return the AsyncOpenAI client with a keep-alive connection pool for (base_url, api_key) in the running loop"""
+    key = (base_url, api_key)
+    loop_clients = _async_clients.get()
+    entry = loop_clients.get(key)
+    if entry is None:
+        stats = ConnectionStats()
+        http_client = httpx.AsyncClient(
+            limits=_pool_limits(),
+            timeout=_pool_timeout(),
+            event_hooks={"response": [stats.on_response_async]}
+        )
+        # Retries are handled by llm_policy.call_with_policy
+        client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+        entry = (client, stats)
+        loop_clients[key] = entry
+        with _clients_lock:
+            _async_stats.append((key, stats))
+    return entry[0]
+
+# Counters of every async client ever created, kept after their loop is gone
+_async_stats = []
+
+def client_registry_stats():
+    """Connection reuse counters per (base url, key suffix)"""
+    with _clients_lock:
+        entries = [(key, entry[1]) for key, entry in _clients.items()]
+        entries += [(key, stats) for key, stats in _async_stats]
+    stats = {}
+    for (base_url, api_key), connection_stats in entries:
+        key_suffix = (api_key or "")[-4:]
+        label = f"{base_url} (key ...{key_suffix})"
+        counters = connection_stats.as_dict()
+        if label in stats:
+            for name in ("requests", "new_connections", "reused_connections"):
+                counters[name] += stats[label][name]
+            tracked = counters["new_connections"] + counters["reused_connections"]
+            counters["reuse_rate"] = counters["reused_connections"] / tracked if tracked else 0.0
+        stats[label] = counters
+    return stats
+
+def close_all_clients():
+    with _clients_lock:
+        entries = list(_clients.values())
+        _clients.clear()
+    for client, _ in entries:
+        client.close()
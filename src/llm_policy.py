@@ -0,0 +1,191 @@
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+
+import openai
+
+import config
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+class LLMDeadlineExceeded(TimeoutError):
+    """Raised when an LLM call, including its retries and hedges, outlives its deadline"""
+
+class LatencyTracker:
+    """Sliding window of successful request latencies and policy counters per call site"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._counters = {}
+
+    def _site_counters(self, site):
+        counters = self._counters.get(site)
+        if counters is None:
+            counters = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "deadline_exceeded": 0, "failures": 0}
+            self._counters[site] = counters
+        return counters
+
+    def record(self, site, seconds):
+        with self._lock:
+            samples = self._samples.get(site)
+            if samples is None:
+                samples = deque(maxlen=config.llm_latency_window)
+                self._samples[site] = samples
+            samples.append(seconds)
+
+    def count(self, site, counter):
+        with self._lock:
+            self._site_counters(site)[counter] += 1
+
+    def percentile(self, site, q, min_samples=1):
+        """Nearest-rank percentile of the recorded latencies, None until min_samples are recorded"""
+        with self._lock:
+            samples = sorted(self._samples.get(site, ()))
+        if len(samples) < max(min_samples, 1):
+            return None
+        rank = max(int(round(q / 100 * len(samples) + 0.5)) - 1, 0)
+        return samples[min(rank, len(samples) - 1)]
+
+    def summary(self):
+        with self._lock:
+            sites = set(self._samples) | set(self._counters)
+            samples_by_site = {site: sorted(self._samples.get(site, ())) for site in sites}
+            counters_by_site = {site: dict(self._site_counters(site)) for site in sites}
+        summary = {}
+        for site in sorted(sites):
+            samples = samples_by_site[site]
+            site_summary = dict(counters_by_site[site], samples=len(samples))
+            if samples:
+                for q in (50, 90, 95, 99):
+                    rank = max(int(round(q / 100 * len(samples) + 0.5)) - 1, 0)
+                    site_summary[f"p{q}_s"] = round(samples[min(rank, len(samples) - 1)], 3)
+                site_summary["max_s"] = round(samples[-1], 3)
+            summary[site] = site_summary
+        return summary
+
+latency_tracker = LatencyTracker()
+
+class CallPolicy:
+    """Deadline, retry/backoff and hedging settings of one LLM call"""
+    def __init__(self, deadline, max_retries, backoff_base, backoff_max,
+                 hedge_enabled, hedge_percentile, hedge_min_samples, hedge_min_delay):
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+
+    @classmethod
+    def for_model(cls, model_name):
+        return cls(
+            deadline=config.llm_model_call_deadline.get(model_name, config.llm_call_deadline),
+            max_retries=config.llm_max_retries,
+            backoff_base=config.llm_backoff_base,
+            backoff_max=config.llm_backoff_max,
+            hedge_enabled=config.llm_hedge_enabled,
+            hedge_percentile=config.llm_hedge_percentile,
+            hedge_min_samples=config.llm_hedge_min_samples,
+            hedge_min_delay=config.llm_hedge_min_delay
+        )
+
+def is_retryable(error):
+    if isinstance(error, openai.APIConnectionError):  # Includes APITimeoutError
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+def _retry_delay(error, attempt, policy):
+    """Exponential backoff with full jitter, or the server's Retry-After if it asks for longer"""
+    delay = random.uniform(0, min(policy.backoff_max, policy.backoff_base * 2 ** attempt))
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            delay = max(delay, min(float(response.headers.get("retry-after", 0)), policy.backoff_max))
+        except ValueError:
+            pass
+    return delay
+
+async def _timed_attempt(site, make_call):
+    start = time.monotonic()
+    result = await make_call()
+    latency_tracker.record(site, time.monotonic() - start)
+    return result
+
+async def _hedged_attempt(site, make_call, policy):
+    """
+    Run one attempt; if it is still running after the site's latency percentile, fire a
+    duplicate request and return whichever succeeds first
+    """
+    threshold = None
+    if policy.hedge_enabled:
+        threshold = latency_tracker.percentile(site, policy.hedge_percentile, policy.hedge_min_samples)
+    if threshold is None:
+        return await _timed_attempt(site, make_call)
+
+    primary = asyncio.ensure_future(_timed_attempt(site, make_call))
+    pending = {primary}
+    last_error = None
+    try:
+        # Inside the try, so a deadline firing here also cancels the primary request
+        done, _ = await asyncio.wait(pending, timeout=max(threshold, policy.hedge_min_delay))
+        if done:
+            return primary.result()
+
+        latency_tracker.count(site, "hedges")
+        hedge = asyncio.ensure_future(_timed_attempt(site, make_call))
+        pending = {primary, hedge}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.cancelled():
+                    last_error = asyncio.CancelledError()
+                    continue
+                if task.exception() is None:
+                    if task is hedge:
+                        latency_tracker.count(site, "hedge_wins")
+                    return task.result()
+                last_error = task.exception()
+        raise last_error
+    finally:
+        for task in pending:
+            if not task.done():
+                task.cancel()
+
+async def call_with_policy(site, make_call, policy):
+    """
+    Await make_call() under the policy: a deadline over all attempts, exponential backoff
+    on 429/5xx and connection errors, and optional hedging against slow responses
+
+    make_call must create a fresh request each time it is called.
+    """
+    latency_tracker.count(site, "calls")
+
+    async def attempts():
+        attempt = 0
+        while True:
+            try:
+                return await _hedged_attempt(site, make_call, policy)
+            except Exception as e:
+                if not is_retryable(e) or attempt >= policy.max_retries:
+                    latency_tracker.count(site, "failures")
+                    raise
+                delay = _retry_delay(e, attempt, policy)
+                print(f"LLM call {site} failed ({type(e).__name__}), retry {attempt + 1}/{policy.max_retries} in {delay:.1f}s")
+                latency_tracker.count(site, "retries")
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    if not policy.deadline:
+        return await attempts()
+    try:
+        async with asyncio.timeout(policy.deadline):
+            return await attempts()
+    except TimeoutError as e:
+        latency_tracker.count(site, "deadline_exceeded")
+        raise LLMDeadlineExceeded(f"LLM call {site} exceeded its {policy.deadline}s deadline") from e
@@ -0,0 +1,326 @@
+"""
+Local OpenAI-compatible stand-in for the DeepSeek API
+
+Point DEEPSEEK_*_BASE_URL in inputs/chatcfd_config.json to http://127.0.0.1:<port>/v1 to run
+ChatCFD without network access, e.g. for benchmarks:
+
+    python src/llm_stub_server.py --port 8765 --fixtures cache/llm_responses --rules inputs/llm_stub_rules.json
+
+Responses are looked up in this order:
+1. recorded fixtures: an LLM response cache directory (exact model, temperature and messages)
+   or a QA log all_qa_logs.json / all_qa_logs.jsonl (exact last user prompt)
+2. scripted rules: a json list of {"pattern": regex, "model": regex, "response": str,
+   "reasoning": str, "latency": seconds}, the first rule whose pattern matches the last user
+   prompt (and whose model matches, if given) wins
+3. the default response
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import llm_cache
+import qa_log_writer
+
+def _message_text(content):
+    """Text of a message content, which may also be a list of content parts"""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+def _last_user_prompt(messages):
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            return _message_text(message.get("content"))
+    return ""
+
+def _approx_tokens(text):
+    # The stub must not need a tokenizer, ~4 characters per token is close enough for benchmarks
+    return max(1, len(text) // 4) if text else 0
+
+class StubResponder:
+    """Resolve a chat completion request to (content, reasoning_content, latency, source)"""
+    def __init__(self, fixtures=(), rules=(), default_response="no", strict=False):
+        self.default_response = default_response
+        self.strict = strict
+        self.cache_entries = {}  # cache key -> response dict
+        self.prompt_entries = {}  # last user prompt -> [(content, reasoning)], replayed in order
+        self._prompt_cursor = {}
+        self.rules = []
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "streaming": 0, "fixture_hits": 0, "rule_hits": 0, "default_responses": 0, "injected_errors": 0}
+        for path in fixtures:
+            self.load_fixtures(path)
+        for rule in rules:
+            self.add_rule(**rule)
+
+    def load_fixtures(self, path):
+        if os.path.isdir(path):
+            count = self._load_cache_dir(path)
+        elif path.endswith(".jsonl"):
+            count = self._load_qa_log(qa_log_writer.read_jsonl(path))
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                count = self._load_qa_log(json.load(f))
+        print(f"Loaded {count} fixtures from {path}")
+
+    def _load_cache_dir(self, cache_dir):
+        count = 0
+        for dirpath, _, filenames in os.walk(cache_dir):
+            for filename in filenames:
+                if not filename.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(dirpath, filename), 'r', encoding='utf-8') as f:
+                        entry = json.load(f)
+                    self.cache_entries[entry["key"]] = entry["response"]
+                    count += 1
+                except (OSError, json.JSONDecodeError, KeyError):
+                    continue
+        return count
+
+    def _load_qa_log(self, entries):
+        count = 0
+        for entry in entries:
+            if "user_prompt" not in entry or "assistant_response" not in entry:
+                continue
+            self.prompt_entries.setdefault(entry["user_prompt"], []).append(
+                (entry["assistant_response"], entry.get("reasoning_content") or ""))
+            count += 1
+        return count
+
+    def add_rule(self, pattern, response, model=None, reasoning="", latency=None):
+        self.rules.append({
+            "pattern": re.compile(pattern, re.DOTALL),
+            "model": re.compile(model) if model else None,
+            "response": response,
+            "reasoning": reasoning,
+            "latency": latency
+        })
+
+    def count(self, counter):
+        with self._lock:
+            self.stats[counter] += 1
+
+    def resolve(self, request):
+        model = request.get("model", "")
+        messages = request.get("messages", [])
+
+        key = llm_cache.LLMResponseCache.make_key(model, request.get("temperature"), messages)
+        cached = self.cache_entries.get(key)
+        if cached is not None:
+            self.count("fixture_hits")
+            content = cached.get("content", cached.get("answer", ""))
+            return content, cached.get("reasoning_content", ""), None, "fixture"
+
+        prompt = _last_user_prompt(messages)
+        with self._lock:
+            recorded = self.prompt_entries.get(prompt)
+            if recorded:
+                cursor = self._prompt_cursor.get(prompt, 0)
+                self._prompt_cursor[prompt] = cursor + 1
+                content, reasoning = recorded[cursor % len(recorded)]
+                self.stats["fixture_hits"] += 1
+                return content, reasoning, None, "fixture"
+
+        for rule in self.rules:
+            if rule["model"] is not None and not rule["model"].search(model):
+                continue
+            if rule["pattern"].search(prompt):
+                self.count("rule_hits")
+                return rule["response"], rule["reasoning"], rule["latency"], "rule"
+
+        self.count("default_responses")
+        if self.strict:
+            return None, None, None, "miss"
+        return self.default_response, "", None, "default"
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, responder, latency=0.0, latency_jitter=0.0, chunk_interval=0.0,
+                 chunk_chars=16, error_rate=0.0):
+        super().__init__(address, StubRequestHandler)
+        self.responder = responder
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.chunk_interval = chunk_interval
+        self.chunk_chars = chunk_chars
+        self.error_rate = error_rate
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status, message):
+        self._send_json(status, {"error": {"message": message, "type": "stub_error", "code": status}})
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            models = ["deepseek-chat", "deepseek-reasoner"]
+            self._send_json(200, {"object": "list", "data": [
+                {"id": model, "object": "model", "created": 0, "owned_by": "llm_stub_server"} for model in models]})
+        elif self.path.rstrip("/").endswith("/stats"):
+            with self.server.responder._lock:
+                self._send_json(200, dict(self.server.responder.stats))
+        else:
+            self._send_error(404, f"Unknown path {self.path}")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_error(400, "Request body is not valid JSON")
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_error(404, f"Unknown path {self.path}")
+            return
+
+        server = self.server
+        server.responder.count("requests")
+        if server.error_rate and random.random() < server.error_rate:
+            server.responder.count("injected_errors")
+            time.sleep(server.latency)
+            self._send_error(503, "Injected stub server error")
+            return
+
+        content, reasoning, latency, source = server.responder.resolve(request)
+        if source == "miss":
+            self._send_error(404, "No fixture or rule matches the prompt (strict mode)")
+            return
+        if latency is None:
+            latency = server.latency
+        time.sleep(max(0.0, latency + random.uniform(-server.latency_jitter, server.latency_jitter)))
+
+        prompt_tokens = _approx_tokens(json.dumps(request.get("messages", []), ensure_ascii=False))
+        reasoning_tokens = _approx_tokens(reasoning)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": _approx_tokens(content) + reasoning_tokens,
+            "total_tokens": prompt_tokens + _approx_tokens(content) + reasoning_tokens,
+            "prompt_cache_hit_tokens": 0,
+            "completion_tokens_details": {"reasoning_tokens": reasoning_tokens}
+        }
+        response_id = f"stub-{time.time_ns()}"
+        model = request.get("model", "")
+
+        if request.get("stream"):
+            server.responder.count("streaming")
+            include_usage = (request.get("stream_options") or {}).get("include_usage", False)
+            try:
+                self._stream(response_id, model, content, reasoning, usage if include_usage else None)
+            except (BrokenPipeError, ConnectionResetError):
+                # Classification calls close the stream as soon as their answer is known
+                self.close_connection = True
+            return
+
+        message = {"role": "assistant", "content": content}
+        if reasoning:
+            message["reasoning_content"] = reasoning
+        self._send_json(200, {
+            "id": response_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+            "usage": usage
+        })
+
+    def _stream(self, response_id, model, content, reasoning, usage):
+        """Server-sent events in the DeepSeek format, reasoning_content deltas before content deltas"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        base = {"id": response_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+
+        def send(data):
+            payload = f"data: {data}\n\n".encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(payload), payload))
+            self.wfile.flush()
+
+        def send_delta(delta, finish_reason=None):
+            send(json.dumps(dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": finish_reason}]), ensure_ascii=False))
+
+        size = max(1, self.server.chunk_chars)
+        send_delta({"role": "assistant", "content": ""})
+        for field, text in (("reasoning_content", reasoning), ("content", content)):
+            for start in range(0, len(text), size):
+                if self.server.chunk_interval:
+                    time.sleep(self.server.chunk_interval)
+                send_delta({field: text[start:start + size]})
+        send_delta({}, finish_reason="stop")
+        if usage is not None:
+            send(json.dumps(dict(base, choices=[], usage=usage)))
+        send("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+def load_rules(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def start_server(host="127.0.0.1", port=0, fixtures=(), rules=(), default_response="no", strict=False,
+                 latency=0.0, latency_jitter=0.0, chunk_interval=0.0, chunk_chars=16, error_rate=0.0):
+    """Start a stub server in a daemon thread and return it, its base_url goes into DEEPSEEK_*_BASE_URL"""
+    responder = StubResponder(fixtures, rules, default_response, strict)
+    server = StubServer((host, port), responder, latency, latency_jitter, chunk_interval, chunk_chars, error_rate)
+    threading.Thread(target=server.serve_forever, name="llm-stub-server", daemon=True).start()
+    return server
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in for the DeepSeek API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixtures", nargs="*", default=[],
+                        help="LLM cache directories or all_qa_logs.json(l) files with recorded responses")
+    parser.add_argument("--rules", help="json file with scripted response rules")
+    parser.add_argument("--default-response", default="no", help="answer when no fixture or rule matches")
+    parser.add_argument("--strict", action="store_true", help="answer 404 instead of the default response on a miss")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the first byte of a response")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="uniform +- jitter added to --latency")
+    parser.add_argument("--chunk-interval", type=float, default=0.0, help="seconds between streamed chunks")
+    parser.add_argument("--chunk-chars", type=int, default=16, help="characters per streamed chunk")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = StubServer(
+        (args.host, args.port),
+        StubResponder(args.fixtures, load_rules(args.rules) if args.rules else (), args.default_response, args.strict),
+        args.latency, args.latency_jitter, args.chunk_interval, args.chunk_chars, args.error_rate
+    )
+    print(f"LLM stub server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    sys.exit(main())
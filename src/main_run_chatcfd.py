@@ -1,6 +1,8 @@
-import config, preprocess_OF_tutorial, case_file_requirements, qa_modules, file_writer, run_of_case,file_corrector, set_config
-import PyPDF2, pdfplumber, pdf_chunk_ask_question
+import config, preprocess_OF_tutorial, of_case_store, of_case_index, of_case_similarity, case_file_requirements, qa_modules, file_writer, run_of_case,file_corrector, set_config
+import PyPDF2, pdfplumber, pdf_chunk_ask_question, document_ingest
 import json
+import time
+from contextlib import contextmanager
 
 test_solver = None
 
@@ -10,26 +12,34 @@ test_case_name = None
 
 test_case_description = None
 
-def process_pdf_pdfplumber(file_path):
-    text = ""
-    tables = []
-
-    with pdfplumber.open(file_path) as pdf:
-        for page in pdf.pages:
-            # Extract text
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-
-            # Extract tables
-            page_tables = page.extract_tables()
-            if page_tables:
-                for table in page_tables:
-                    tables.append(table)
+# (stage name, seconds) of every timed stage in this process, read by benchmark_pipeline.py
+stage_timings = []
+
+@contextmanager
+def timed_stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_timings.append((name, time.perf_counter() - start))
+
+def stage_summary():
+    """Total wall time, number of runs and mean per stage name, in first-run order"""
+    summary = {}
+    for name, seconds in stage_timings:
+        stage = summary.setdefault(name, {"total_s": 0.0, "runs": 0})
+        stage["total_s"] += seconds
+        stage["runs"] += 1
+    for stage in summary.values():
+        stage["mean_s"] = stage["total_s"] / stage["runs"]
+    return summary
 
+def process_pdf_pdfplumber(file_path):
+    """Text and tables of the PDF, taken from the shared single-pass ingestion"""
+    document = document_ingest.ingest(file_path)
     return {
-        "text": text,
-        "tables": tables
+        "text": document.raw_text,
+        "tables": document.tables
     }
 
 def process_pdf_PyPDF2(pdf_file):
@@ -151,21 +161,91 @@ def case_required_file(solver_, turbulence_model_):
 
 def load_OF_data_json():
     try:
-        with open(config.OF_data_path, 'r', encoding='utf-8') as file:
-            config.OF_case_data_dict = json.load(file)  # Directly convert to Python dict
-            print("Success reading in the OF_tut_case_json file！")
+        # Shared with config.global_OF_cases, file contents are read from the case store on demand
+        config.OF_case_data_dict = of_case_store.get_store().cases()
+        # Reference-file lookups of the error correction use the inverted indexes built here
+        of_case_index.get_index()
+        print("Success reading in the OF_tut_case_json file！")
     except json.JSONDecodeError:
         print("Input JSON format error, please check data integrity")
         exit()
 
+def multi_call_repair(running_error):
+    """Error correction with separate classification and analysis calls"""
+    # Cross-file dimension mismatch
+    if file_corrector.detect_dimension_error(running_error):
+        file_corrector.strongly_correct_all_dimension_with_reference_files()
+        return
+
+    # Check if new file needs to be added
+    answer_add_new_file = file_corrector.identify_error_to_add_new_file(running_error)
+
+    answer_add_new_file_strip = answer_add_new_file.strip()
+
+    if answer_add_new_file_strip.lower() == 'no': # Modify file branch
+        file_for_revision, early_revision_advice = file_corrector.analyze_running_error_with_all_case_file_content(running_error)
+        reference_files = file_corrector.find_reference_files_by_solver(file_for_revision)
+        # Check if the error has occurred three times, if so, rewrite the file
+        if file_corrector.analyze_error_repetition(config.error_history):
+            file_corrector.rewrite_file(file_for_revision,reference_files)
+        else:
+            advices_for_revision = file_corrector.analyze_running_error_with_reference_files(running_error, file_for_revision,early_revision_advice,reference_files)
+            file_corrector.single_file_corrector2(file_for_revision, advices_for_revision, reference_files)
+    else: # Add file branch
+        file_for_adding = answer_add_new_file_strip
+        file_corrector.add_new_file(file_for_adding)
+
+def triage_repair(running_error):
+    """Error correction driven by a single structured triage call, False if no valid triage was given"""
+    triage = file_corrector.triage_running_error(running_error, config.error_history)
+    if triage is None:
+        return False
+
+    print(f"triage: {triage['error_class']}, missing_file = {triage['missing_file']}, file_to_revise = {triage['file_to_revise']}, repeated = {triage['repeated']}")
+
+    if triage["error_class"] == "dimension_mismatch":
+        file_corrector.strongly_correct_all_dimension_with_reference_files()
+    elif triage["error_class"] == "missing_file":
+        file_corrector.add_new_file(triage["missing_file"])
+    else:
+        file_for_revision = triage["file_to_revise"]
+        reference_files = file_corrector.find_reference_files_by_solver(file_for_revision)
+        # The same error three times in a row, rewrite the file
+        if triage["repeated"]:
+            file_corrector.rewrite_file(file_for_revision,reference_files)
+        else:
+            file_corrector.single_file_corrector2(file_for_revision, triage["advice"], reference_files)
+    return True
+
+def repair_round(running_error):
+    """Revise the case to fix running_error, with the strategy selected by config.repair_mode"""
+    with timed_stage(f"error_correction ({config.repair_mode})"):
+        if config.repair_mode == "triage":
+            if not triage_repair(running_error):
+                print("No valid triage answer, falling back to the multi_call error correction")
+                multi_call_repair(running_error)
+        else:
+            multi_call_repair(running_error)
+
+        if not config.set_controlDict_time:
+            run_of_case.setup_cfl_control(config.OUTPUT_PATH)
+
+        if not config.mesh_convert_success:
+            run_of_case.convert_mesh(config.OUTPUT_PATH, config.case_grid)
+
 def main(file_name):
 
-    set_config.load_openfoam_environment()
+    with timed_stage("load_openfoam_environment"):
+        set_config.load_openfoam_environment()
     
-    config.paper_content, config.paper_table = process_pdf_pdfplumber(config.pdf_path)
+    with timed_stage("process_pdf"):
+        document = document_ingest.ingest(config.pdf_path)
+        config.paper_content = document.raw_text
+        config.paper_table = document.tables
     # config.paper_content = process_pdf(config.pdf_path)
 
-    case_file_requirements.extract_boundary_names(config.case_grid)
+    with timed_stage("extract_boundary_names"):
+        case_file_requirements.extract_boundary_names(config.case_grid)
 
     boundary_names = ", ".join(config.case_boundaries)
 
@@ -178,76 +258,66 @@ def main(file_name):
     config.case_log_write = True
 
     # list the files required by the solver and turbulence model
-    case_required_file(test_solver, test_turbulence_model)
+    with timed_stage("case_required_file"):
+        case_required_file(test_solver, test_turbulence_model)
 
 
-    pdf_chunk_response = pdf_chunk_ask()
+    with timed_stage("pdf_chunk_ask"):
+        pdf_chunk_response = pdf_chunk_ask()
 
     config.target_case_requirement_json = pdf_chunk_response
 
-    preprocess_OF_tutorial.read_in_processed_merged_OF_cases()
+    with timed_stage("read_in_processed_merged_OF_cases"):
+        preprocess_OF_tutorial.read_in_processed_merged_OF_cases()
+
+    with timed_stage("find_similar_cases"):
+        of_case_similarity.find_similar_cases(
+            test_case_description or config.pdf_short_case_description,
+            solver=test_solver,
+            turbulence_model=test_turbulence_model,
+            boundary_names=config.case_boundaries
+        )
 
     config.global_files = json.loads(config.target_case_requirement_json)
 
     # write the case files
-    for key, value in config.global_files.items():
-        output_file = f"{config.OUTPUT_PATH}/{key}"
+    with timed_stage("write_case_files"):
+        for key, value in config.global_files.items():
+            output_file = f"{config.OUTPUT_PATH}/{key}"
 
-        try:
-            file_writer.write_field_to_file(value,output_file)
-            print(f"write the file {key}")
+            try:
+                file_writer.write_field_to_file(value,output_file)
+                print(f"write the file {key}")
 
-        except Exception as e:
-            print(f"Errors occur during write_field_to_file: {e}")
-            continue
-        else: # Successfully executed the field file write operation
-            file_format_correct = True
+            except Exception as e:
+                print(f"Errors occur during write_field_to_file: {e}")
+                continue
+            else: # Successfully executed the field file write operation
+                file_format_correct = True
 
     # return
 
     # revise controlDict to run 2 steps
-    run_of_case.setup_cfl_control(config.OUTPUT_PATH)
+    with timed_stage("setup_cfl_control"):
+        run_of_case.setup_cfl_control(config.OUTPUT_PATH)
 
     # run file test and correct
-    run_of_case.convert_mesh(config.OUTPUT_PATH, config.case_grid)
+    with timed_stage("convert_mesh"):
+        run_of_case.convert_mesh(config.OUTPUT_PATH, config.case_grid)
 
     # run the OpenFOAM case and ICOT debug
     for test_time in range(0, config.max_running_test_round):
         try:
             print(f"****************start running the case {config.case_name} , test_round = {test_time}****************")
 
-            case_run_info = run_of_case.case_run(config.OUTPUT_PATH)
+            with timed_stage("case_run"):
+                case_run_info = run_of_case.case_run(config.OUTPUT_PATH)
             
             if case_run_info != "case run success.":
                 running_error = case_run_info
                 config.error_history.append(running_error)
 
-                if file_corrector.detect_dimension_error(running_error):
-                    file_corrector.strongly_correct_all_dimension_with_reference_files()
-                else:
-                    # Check if new file needs to be added
-                    answer_add_new_file = file_corrector.identify_error_to_add_new_file(running_error)
-
-                    answer_add_new_file_strip = answer_add_new_file.strip()
-
-                    if answer_add_new_file_strip.lower() == 'no': # Modify file branch
-                        file_for_revision, early_revision_advice = file_corrector.analyze_running_error_with_all_case_file_content(running_error)
-                        reference_files = file_corrector.find_reference_files_by_solver(file_for_revision)
-                        # Check if the error has occurred three times, if so, rewrite the file
-                        if file_corrector.analyze_error_repetition(config.error_history):
-                            file_corrector.rewrite_file(file_for_revision,reference_files)
-                        else:
-                            advices_for_revision = file_corrector.analyze_running_error_with_reference_files(running_error, file_for_revision,early_revision_advice,reference_files)
-                            file_corrector.single_file_corrector2(file_for_revision, advices_for_revision, reference_files)
-                    else: # Add file branch
-                        file_for_adding = answer_add_new_file_strip
-                        file_corrector.add_new_file(file_for_adding)
-
-                if not config.set_controlDict_time:
-                    run_of_case.setup_cfl_control(config.OUTPUT_PATH)
-
-                if not config.mesh_convert_success:
-                    run_of_case.convert_mesh(config.OUTPUT_PATH, config.case_grid)
+                repair_round(running_error)
 
             else:
                 break
@@ -256,36 +326,12 @@ def main(file_name):
             # Catch all exceptions and handle them
             running_error = str(e)
 
-            # Cross-file dimension mismatch
-            if file_corrector.detect_dimension_error(running_error):
-                file_corrector.strongly_correct_all_dimension_with_reference_files()
-            else: # No cross-file dimension mismatch
-                # Check if new file needs to be added
-                answer_add_new_file = file_corrector.identify_error_to_add_new_file(running_error)
-
-                answer_add_new_file_strip = answer_add_new_file.strip()
-
-                if answer_add_new_file_strip.lower() == 'no': # Modify file branch
-                    file_for_revision, early_revision_advice = file_corrector.analyze_running_error_with_all_case_file_content(running_error)
-                    reference_files = file_corrector.find_reference_files_by_solver(file_for_revision)
-                    # Check if the error has occurred three times, if so, rewrite the file
-                    if file_corrector.analyze_error_repetition(config.error_history):
-                        file_corrector.rewrite_file(file_for_revision,reference_files)
-                    else:
-                        advices_for_revision = file_corrector.analyze_running_error_with_reference_files(running_error, file_for_revision,early_revision_advice,reference_files)
-                        file_corrector.single_file_corrector2(file_for_revision, advices_for_revision, reference_files)
-                else: # Add file branch
-                    file_for_adding = answer_add_new_file_strip
-                    file_corrector.add_new_file(file_for_adding)
-
-                if not config.set_controlDict_time:
-                    run_of_case.setup_cfl_control(config.OUTPUT_PATH)
-
-                if not config.mesh_convert_success:
-                    run_of_case.convert_mesh(config.OUTPUT_PATH, config.case_grid)
+            repair_round(running_error)
             
             continue  # Explicitly continue to next iteration
 
+    # Compact the append-only QA log of this case into all_qa_logs.json
+    qa_modules.GlobalLogManager.export_case_log()
 
     a = 1
 
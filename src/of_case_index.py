@@ -0,0 +1,125 @@
+import random
+import threading
+
+import of_case_store
+
+class CaseIndex:
+    """
+    Exact-match inverted indexes over the tutorial cases of a case store, built once per store:
+    solver, feature directory, turbulence model and file path -> cases, (solver, file path) -> cases
+
+    A solver is matched against the path segments of a case (incompressible/simpleFoam/pitzDaily
+    is a simpleFoam case, rhoSimpleFoam cases are not) and against its controlDict application.
+    Only file paths, body hashes and lengths are indexed; contents stay in the store until selected.
+    """
+    def __init__(self, store):
+        self.store = store
+        self.metadata = store.case_metadata()
+        self.position = {case_path: position for position, case_path in enumerate(self.metadata)}
+        self.by_solver = {}
+        self.by_feature = {}
+        self.by_turbulence_model = {}
+        for case_path, case in self.metadata.items():
+            segments = case_path.split('/')
+            for solver in set(segments[:-1]) | {case["solver"]}:
+                if solver:
+                    self.by_solver.setdefault(solver, []).append(case_path)
+            self.by_feature.setdefault(segments[0], []).append(case_path)
+            self.by_turbulence_model.setdefault(case["turbulence_model"], []).append(case_path)
+
+        self.lengths = {}
+        self.blobs = {}
+        self.by_file = {}
+        files_by_case = {}
+        for case_path, file_path, blob, length in store.file_entries():
+            if case_path in self.metadata:
+                self.lengths[(case_path, file_path)] = length
+                self.blobs[(case_path, file_path)] = blob
+                self.by_file.setdefault(file_path, []).append(case_path)
+                files_by_case.setdefault(case_path, []).append(file_path)
+
+        # (solver, file path) -> case paths, in tutorial order
+        self.by_solver_file = {}
+        for solver, case_paths in self.by_solver.items():
+            for case_path in case_paths:
+                for file_path in files_by_case.get(case_path, []):
+                    self.by_solver_file.setdefault((solver, file_path), []).append(case_path)
+
+    def feature_of_solver(self, solver):
+        """Feature directory (compressible, incompressible, ...) of the first case of the solver, None for an unknown solver"""
+        case_paths = self.by_solver.get(solver)
+        return case_paths[0].split('/')[0] if case_paths else None
+
+    def cases_with_file(self, solver, file_path, max_chars=None):
+        """Cases of the solver that have file_path, no longer than max_chars"""
+        return [case_path for case_path in self.by_solver_file.get((solver, file_path), [])
+                if max_chars is None or self.lengths[(case_path, file_path)] <= max_chars]
+
+    def distinct_bodies(self, case_paths, file_path):
+        """The first of case_paths for every distinct body of file_path, so no two samples are identical"""
+        seen = set()
+        distinct = []
+        for case_path in case_paths:
+            blob = self.blobs[(case_path, file_path)]
+            if blob not in seen:
+                seen.add(blob)
+                distinct.append(case_path)
+        return distinct
+
+    def rank(self, case_paths, turbulence_model=None, boundary_types=()):
+        """Cases with the same turbulence model first, then by the number of shared boundary types, then in tutorial order"""
+        boundary_types = set(boundary_types)
+        same_model = set(self.by_turbulence_model.get(turbulence_model, ())) if turbulence_model is not None else set()
+        def key(case_path):
+            shared_types = len(boundary_types.intersection(self.metadata[case_path]["boundary_type"]))
+            return (case_path not in same_model, -shared_types, self.position[case_path])
+        return sorted(case_paths, key=key)
+
+    def reference_files(self, solver, file_path, turbulence_model=None, boundary_types=(), number=3, max_chars=10000, preferred=()):
+        """
+        Contents of file_path in up to number tutorial cases, for find_reference_files_by_solver
+
+        Cases of the same solver are sampled at random and keyed sample_file_<n>. Without any, the
+        cases of the solver's feature directory (or of every feature for an unknown solver) are
+        ranked with rank and keyed by case path. Cases of preferred (config.best_reference_cases)
+        having the file come first, limited to the same solver in the first branch and to the
+        feature directory in the second. Files longer than max_chars are never used, and
+        byte-identical bodies are sent only once.
+        """
+        preferred = [
+            case_path for case_path in preferred
+            if self.lengths.get((case_path, file_path), max_chars + 1) <= max_chars
+        ]
+        same_solver = self.cases_with_file(solver, file_path, max_chars)
+        if same_solver:
+            same_solver_set = set(same_solver)
+            first = [case_path for case_path in preferred if case_path in same_solver_set]
+            candidates = self.distinct_bodies(first + [case_path for case_path in same_solver if case_path not in first], file_path)
+            selected = [case_path for case_path in candidates if case_path in first][:number]
+            rest = [case_path for case_path in candidates if case_path not in first]
+            selected += random.sample(rest, min(number - len(selected), len(rest)))
+            return {f'sample_file_{i}': self.store.blob_content(self.blobs[(case_path, file_path)]) for i, case_path in enumerate(selected)}
+
+        feature = self.feature_of_solver(solver)
+        case_paths = self.by_feature.get(feature, []) if feature is not None else self.by_file.get(file_path, [])
+        # A similar case of another feature (e.g. multiphase for an incompressible solver) is no reference
+        case_path_set = set(case_paths)
+        first = [case_path for case_path in preferred if case_path in case_path_set]
+        candidates = [
+            case_path for case_path in case_paths
+            if self.lengths.get((case_path, file_path), max_chars + 1) <= max_chars and case_path not in first
+        ]
+        selected = self.distinct_bodies(first + self.rank(candidates, turbulence_model, boundary_types), file_path)[:number]
+        return {case_path: self.store.blob_content(self.blobs[(case_path, file_path)]) for case_path in selected}
+
+_index_instance = None
+_index_lock = threading.Lock()
+
+def get_index():
+    """CaseIndex of the current case store, rebuilt only when get_store returns a new store"""
+    global _index_instance
+    store = of_case_store.get_store()
+    with _index_lock:
+        if _index_instance is None or _index_instance.store is not store:
+            _index_instance = CaseIndex(store)
+        return _index_instance
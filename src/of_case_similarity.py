@@ -0,0 +1,152 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+
+import numpy as np
+
+import config
+import of_case_store
+import vector_index
+import embedder_registry
+import preprocess_OF_tutorial
+
+# Bump when case_summary changes, so the case vectors are embedded again
+CASE_SUMMARY_VERSION = 1
+# Dictionaries whose entries (down to the first sub-dictionary level) describe a case setup
+SUMMARY_FILES = (
+    "system/fvSchemes", "system/fvSolution", "constant/turbulenceProperties", "constant/momentumTransport",
+    "constant/transportProperties", "constant/thermophysicalProperties"
+)
+SUMMARY_CHARS_PER_FILE = 400
+
+_COMMENT_RE = re.compile(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+_FOAMFILE_RE = re.compile(r'FoamFile\s*\{[^{}]*\}')
+_PATCH_NAME_RE = re.compile(r'("[^"]*"|[\w.*()|:-]+)\s*\{')
+
+def summarize_dictionary(content, max_chars=SUMMARY_CHARS_PER_FILE):
+    """Keywords and values of an OpenFOAM dictionary down to its first sub-dictionary level, as one line"""
+    text = _FOAMFILE_RE.sub(' ', _COMMENT_RE.sub(' ', content))
+    kept = []
+    depth = 0
+    for char in text:
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+        elif depth <= 1:
+            kept.append(' ' if char == ';' else char)
+    return ' '.join(''.join(kept).split())[:max_chars]
+
+def patch_names(config_files):
+    """Patch names of the boundaryField of the first 0/ field file"""
+    for file_path in sorted(config_files):
+        if file_path.startswith("0/"):
+            match = preprocess_OF_tutorial.boundary_field_pattern.search(config_files[file_path])
+            if match:
+                return [name.strip('"') for name in _PATCH_NAME_RE.findall(match.group(1))]
+    return []
+
+def case_summary(case):
+    """Text embedded for a tutorial case: its derived metadata and a summary of its main dictionaries"""
+    flow = ["single phase" if case["singlePhase"] else "multiphase"]
+    if case["particle_flow"]:
+        flow.append("particle flow")
+    if case["reacting_flow"]:
+        flow.append("reacting flow")
+    config_files = case["configuration_files"]
+    lines = [
+        f"Solver {case['solver']}, {', '.join(flow)}.",
+        f"Turbulence {case['turbulence_type']} {case['turbulence_model'] or ''}.",
+        f"Boundary types: {', '.join(sorted(case['boundary_type']))}.",
+        f"Patches: {', '.join(patch_names(config_files))}.",
+        f"Fields: {', '.join(path.split('/', 1)[1] for path in case['required_field'])}."
+    ]
+    for file_path in SUMMARY_FILES:
+        if file_path in config_files:
+            lines.append(f"{file_path}: {summarize_dictionary(config_files[file_path])}")
+    return "\n".join(lines)
+
+def query_text(description, solver=None, turbulence_model=None, boundary_names=(), boundary_types=()):
+    """Text embedded for the case of the paper, in the layout of case_summary"""
+    lines = [description or ""]
+    if solver:
+        lines.append(f"Solver {solver}.")
+    if turbulence_model:
+        lines.append(f"Turbulence {turbulence_model}.")
+    if boundary_types:
+        lines.append(f"Boundary types: {', '.join(sorted(boundary_types))}.")
+    if boundary_names:
+        lines.append(f"Patches: {', '.join(boundary_names)}.")
+    return "\n".join(lines)
+
+class CaseVectors:
+    """
+    Embeddings of the case_summary of every tutorial case in a flat inner-product VectorIndex
+
+    Built once per case store and embedding model, and saved in config.OF_case_vector_path keyed
+    by the store's source signature, so later processes only load them. A search embeds the query
+    once and scans a few hundred vectors.
+    """
+    def __init__(self, store, model_name=embedder_registry.DEFAULT_EMBEDDER_MODEL):
+        self.store = store
+        self.model_name = model_name
+        path = os.path.join(config.OF_case_vector_path, f"{self.key()}.faiss")
+        if os.path.isfile(path) and os.path.isfile(path + ".cases.json"):
+            self.index = vector_index.VectorIndex.load(path)
+            with open(path + ".cases.json", 'r', encoding='utf-8') as f:
+                self.case_paths = json.load(f)
+        else:
+            self.build()
+            self.index.save(path)
+            preprocess_OF_tutorial.write_json(path + ".cases.json", self.case_paths)
+
+    def key(self):
+        settings = {"store": self.store.signature(), "embedder": self.model_name, "summary_version": CASE_SUMMARY_VERSION}
+        return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def build(self):
+        start = time.perf_counter()
+        cases = self.store.cases()
+        self.case_paths = list(cases)
+        summaries = [case_summary(cases[case_path]) for case_path in self.case_paths]
+        embeddings = embedder_registry.get_embedder(self.model_name).encode(summaries, convert_to_numpy=True, show_progress_bar=False)
+        self.index = vector_index.VectorIndex("flat_ip", {}).build(np.asarray(embeddings, dtype='float32'))
+        print(f"Embedded {len(self.case_paths)} tutorial cases in {time.perf_counter() - start:.3f} s")
+
+    def search(self, text, k):
+        """(case path, squared L2 distance) of the k cases closest to text, closest first"""
+        query = embedder_registry.get_embedder(self.model_name).encode([text], convert_to_numpy=True, show_progress_bar=False)
+        start = time.perf_counter()
+        distances, indices = self.index.search(np.asarray(query, dtype='float32'), min(k, len(self.case_paths)))
+        print(f"Similar tutorial case search in {(time.perf_counter() - start) * 1000:.3f} ms")
+        return [(self.case_paths[i], float(d)) for d, i in zip(distances[0], indices[0]) if i >= 0]
+
+_vectors_instance = None
+_vectors_lock = threading.Lock()
+
+def get_case_vectors():
+    """CaseVectors of the current case store, rebuilt only when get_store returns a new store"""
+    global _vectors_instance
+    store = of_case_store.get_store()
+    with _vectors_lock:
+        if _vectors_instance is None or _vectors_instance.store is not store:
+            _vectors_instance = CaseVectors(store)
+        return _vectors_instance
+
+def find_similar_cases(description, solver=None, turbulence_model=None, boundary_names=(), boundary_types=(), k=None):
+    """
+    Fill config.best_reference_cases with the k (config.reference_case_searching_round) tutorial
+    cases most similar to the paper's case description and mesh boundaries, most similar first
+    """
+    k = k or config.reference_case_searching_round
+    text = query_text(description, solver, turbulence_model, boundary_names, boundary_types)
+    try:
+        config.best_reference_cases = [case_path for case_path, _ in get_case_vectors().search(text, k)]
+    except Exception as e:
+        print(f"Similar tutorial case search failed: {e}")
+        config.best_reference_cases = []
+    print(f"Most similar tutorial cases: {config.best_reference_cases}")
+    return config.best_reference_cases
@@ -0,0 +1,319 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+from collections.abc import Mapping
+
+import config
+
+# Bump when the schema or the stored columns change, so the store is rebuilt from the JSONL database
+STORE_FORMAT_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE cases (
+    case_path TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    feature TEXT NOT NULL,
+    solver_dir TEXT,
+    solver TEXT,
+    turbulence_type TEXT,
+    turbulence_model TEXT,
+    single_phase INTEGER,
+    particle_flow INTEGER,
+    reacting_flow INTEGER,
+    required_field TEXT NOT NULL
+);
+CREATE TABLE blobs (sha256 TEXT PRIMARY KEY, content TEXT NOT NULL);
+CREATE TABLE files (
+    case_path TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    blob TEXT NOT NULL REFERENCES blobs (sha256),
+    PRIMARY KEY (case_path, file_path)
+) WITHOUT ROWID;
+CREATE TABLE boundary_types (
+    case_path TEXT NOT NULL,
+    boundary_type TEXT NOT NULL,
+    PRIMARY KEY (case_path, boundary_type)
+) WITHOUT ROWID;
+CREATE INDEX cases_solver ON cases (solver);
+CREATE INDEX cases_feature ON cases (feature);
+CREATE INDEX cases_turbulence_model ON cases (turbulence_model);
+CREATE INDEX files_file_path ON files (file_path);
+CREATE INDEX files_blob ON files (blob);
+CREATE INDEX boundary_types_boundary_type ON boundary_types (boundary_type);
+"""
+
+# Keys of a processed case (see preprocess_OF_tutorial.derive_case_metadata) and their cases column
+_CASE_COLUMNS = {
+    "case_path": "case_path",
+    "required_field": "required_field",
+    "solver": "solver",
+    "singlePhase": "single_phase",
+    "particle_flow": "particle_flow",
+    "reacting_flow": "reacting_flow",
+    "turbulence_type": "turbulence_type",
+    "turbulence_model": "turbulence_model"
+}
+CASE_KEYS = ("case_path", "configuration_files", "required_field", "solver", "singlePhase",
+             "particle_flow", "reacting_flow", "turbulence_type", "turbulence_model", "boundary_type")
+
+def source_path():
+    """The JSONL tutorial database, or processed_merged_OF_cases.json of an older index, None if neither exists"""
+    for path in (config.OF_cases_jsonl_path, config.OF_data_path):
+        if os.path.isfile(path):
+            return path
+    return None
+
+def source_signature(path):
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "format": STORE_FORMAT_VERSION}
+
+def source_cases(path):
+    """(case path, case) of the source database, the JSONL one read a line at a time"""
+    if path.endswith(".jsonl"):
+        with open(path, 'r', encoding='utf-8') as lines:
+            for line in lines:
+                case_data = json.loads(line)
+                yield case_data["case_path"], case_data
+    else:
+        with open(path, 'r', encoding='utf-8') as file:
+            yield from json.load(file).items()
+
+def content_hash(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def _as_bool(value):
+    return None if value is None else bool(value)
+
+class CaseFiles(Mapping):
+    """{file path: content} of one case, contents are read from the store on access"""
+    def __init__(self, store, case_path):
+        self.store = store
+        self.case_path = case_path
+        self._paths = None
+
+    def _file_paths(self):
+        if self._paths is None:
+            self._paths = self.store.file_paths(self.case_path)
+        return self._paths
+
+    def __getitem__(self, file_path):
+        content = self.store.file_content(self.case_path, file_path)
+        if content is None:
+            raise KeyError(file_path)
+        return content
+
+    def __contains__(self, file_path):
+        return file_path in self._file_paths()
+
+    def __iter__(self):
+        return iter(self._file_paths())
+
+    def __len__(self):
+        return len(self._file_paths())
+
+class CaseView(Mapping):
+    """One processed case with the keys of processed_merged_OF_cases.json, configuration_files as CaseFiles"""
+    def __init__(self, store, metadata):
+        self.store = store
+        self.metadata = metadata
+
+    def __getitem__(self, key):
+        if key == "configuration_files":
+            return CaseFiles(self.store, self.metadata["case_path"])
+        return self.metadata[key]
+
+    def __iter__(self):
+        return iter(CASE_KEYS)
+
+    def __len__(self):
+        return len(CASE_KEYS)
+
+class CaseMapping(Mapping):
+    """
+    Read-only {case path: CaseView} over the store, in tutorial order
+
+    Stands in for the dict formerly loaded from processed_merged_OF_cases.json: iterating it reads
+    the case metadata only, file contents are fetched when a configuration file is indexed.
+    """
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, case_path):
+        return CaseView(self.store, self.store.case_metadata()[case_path])
+
+    def __contains__(self, case_path):
+        return case_path in self.store.case_metadata()
+
+    def __iter__(self):
+        return iter(self.store.case_metadata())
+
+    def __len__(self):
+        return len(self.store.case_metadata())
+
+class OFCaseStore:
+    """
+    SQLite store of the processed OpenFOAM tutorial cases at config.OF_case_store_path
+
+    Tables: cases (one row of metadata per case), files (case path, file path, blob hash),
+    blobs (sha256 of a file body, body) and boundary_types (case path, boundary type). Identical
+    file bodies, such as the fvSchemes shared by many tutorials, are stored once. The store is built from the JSONL tutorial database
+    and rebuilt whenever that file changes (see get_store). Every thread reads through its own
+    read-only connection; only the case metadata, a few hundred small rows, is kept in memory.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._metadata = None
+        self._metadata_lock = threading.Lock()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.connection = connection
+        return connection
+
+    def _query(self, sql, params=()):
+        return self._connection().execute(sql, params).fetchall()
+
+    def signature(self):
+        """source_signature the store was built from, None if the store is missing or unreadable"""
+        if not os.path.isfile(self.path):
+            return None
+        try:
+            rows = self._query("SELECT value FROM meta WHERE key = 'source'")
+        except sqlite3.Error:
+            return None
+        return json.loads(rows[0][0]) if rows else None
+
+    @staticmethod
+    def build(path, cases, signature):
+        """Write a new store at path from an iterable of (case path, case), replacing the old one at once"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        connection = sqlite3.connect(tmp_path)
+        try:
+            connection.executescript(SCHEMA)
+            with connection:
+                for position, (case_path, case_data) in enumerate(cases):
+                    path_split = case_path.split('/')
+                    connection.execute(
+                        "INSERT INTO cases VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (case_path, position, path_split[0], path_split[1] if len(path_split) > 1 else None,
+                         case_data["solver"], case_data["turbulence_type"], case_data["turbulence_model"],
+                         case_data["singlePhase"], case_data["particle_flow"], case_data["reacting_flow"],
+                         json.dumps(case_data["required_field"]))
+                    )
+                    blobs = {file_path: (content_hash(content), content) for file_path, content in case_data["configuration_files"].items()}
+                    connection.executemany("INSERT OR IGNORE INTO blobs VALUES (?, ?)", blobs.values())
+                    connection.executemany(
+                        "INSERT INTO files VALUES (?, ?, ?)",
+                        ((case_path, file_path, blob[0]) for file_path, blob in blobs.items())
+                    )
+                    connection.executemany(
+                        "INSERT OR IGNORE INTO boundary_types VALUES (?, ?)",
+                        ((case_path, boundary_type) for boundary_type in case_data["boundary_type"])
+                    )
+                connection.execute("INSERT INTO meta VALUES ('source', ?)", (json.dumps(signature),))
+            stats = OFCaseStore.dedupe_stats_of(connection)
+            connection.execute("INSERT INTO meta VALUES ('dedupe', ?)", (json.dumps(stats),))
+            connection.commit()
+        finally:
+            connection.close()
+        os.replace(tmp_path, path)
+        print(f"Tutorial case store: {stats['files']} files stored as {stats['blobs']} unique bodies, "
+              f"{stats['stored_chars'] / 1e6:.1f} of {stats['file_chars'] / 1e6:.1f} M characters")
+
+    @staticmethod
+    def dedupe_stats_of(connection):
+        files, file_chars = connection.execute(
+            "SELECT count(*), coalesce(sum(length(content)), 0) FROM files JOIN blobs ON blobs.sha256 = files.blob"
+        ).fetchone()
+        blobs, stored_chars = connection.execute("SELECT count(*), coalesce(sum(length(content)), 0) FROM blobs").fetchone()
+        return {"files": files, "blobs": blobs, "file_chars": file_chars, "stored_chars": stored_chars}
+
+    def dedupe_stats(self):
+        """Files, unique bodies and their sizes in characters, as recorded when the store was built"""
+        rows = self._query("SELECT value FROM meta WHERE key = 'dedupe'")
+        return json.loads(rows[0][0]) if rows else None
+
+    def case_metadata(self):
+        """{case path: case dict without configuration_files} in tutorial order, read once"""
+        with self._metadata_lock:
+            if self._metadata is None:
+                boundary_types = {}
+                for case_path, boundary_type in self._query("SELECT case_path, boundary_type FROM boundary_types"):
+                    boundary_types.setdefault(case_path, []).append(boundary_type)
+                columns = ", ".join(_CASE_COLUMNS.values())
+                metadata = {}
+                for row in self._query(f"SELECT {columns} FROM cases ORDER BY position"):
+                    case = dict(zip(_CASE_COLUMNS, row))
+                    case["required_field"] = json.loads(case["required_field"])
+                    for key in ("singlePhase", "particle_flow", "reacting_flow"):
+                        case[key] = _as_bool(case[key])
+                    case["boundary_type"] = boundary_types.get(case["case_path"], [])
+                    metadata[case["case_path"]] = case
+                self._metadata = metadata
+            return self._metadata
+
+    def cases(self):
+        return CaseMapping(self)
+
+    def file_paths(self, case_path):
+        return [row[0] for row in self._query("SELECT file_path FROM files WHERE case_path = ? ORDER BY file_path", (case_path,))]
+
+    def file_entries(self):
+        """(case path, file path, blob hash, content length in characters) of every file, without reading contents into Python"""
+        return self._query("SELECT case_path, file_path, blob, length(content) FROM files JOIN blobs ON blobs.sha256 = files.blob")
+
+    def file_content(self, case_path, file_path):
+        rows = self._query(
+            "SELECT content FROM files JOIN blobs ON blobs.sha256 = files.blob WHERE case_path = ? AND file_path = ?",
+            (case_path, file_path)
+        )
+        return rows[0][0] if rows else None
+
+    def blob_content(self, blob):
+        rows = self._query("SELECT content FROM blobs WHERE sha256 = ?", (blob,))
+        return rows[0][0] if rows else None
+
+    def keywords(self):
+        """config.global_OF_keywords, straight from the metadata columns"""
+        def distinct(sql):
+            return sorted(row[0] for row in self._query(sql) if row[0] is not None)
+        return {
+            "solver": distinct("SELECT DISTINCT solver FROM cases"),
+            "turbulence_type": distinct("SELECT DISTINCT turbulence_type FROM cases"),
+            "turbulence_model": distinct("SELECT DISTINCT turbulence_model FROM cases"),
+            "boundary_type": distinct("SELECT DISTINCT boundary_type FROM boundary_types")
+        }
+
+_store_instance = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """
+    Process-wide store, (re)built from the tutorial database first if that changed since the store was written
+
+    The check is one stat call and one query, so it is cheap to call at the start of every case run.
+    """
+    global _store_instance
+    with _store_lock:
+        path = source_path()
+        if path is None:
+            raise FileNotFoundError(f"No tutorial case database at {config.OF_cases_jsonl_path}, run preprocess_OF_tutorial.py first")
+        signature = source_signature(path)
+        store = _store_instance
+        if store is None or store.path != config.OF_case_store_path or store.signature() != signature:
+            # A fresh connection also sees a store rebuilt by another process
+            store = OFCaseStore(config.OF_case_store_path)
+        if store.signature() != signature:
+            print(f"Building the tutorial case store {config.OF_case_store_path} from {path}")
+            OFCaseStore.build(config.OF_case_store_path, source_cases(path), signature)
+            store = OFCaseStore(config.OF_case_store_path)
+        _store_instance = store
+        return store
@@ -1,119 +1,206 @@
 import pdfplumber
-import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from openai import OpenAI
 from pdfplumber.utils import within_bbox
 import re
-import tiktoken
+import asyncio
 from datetime import datetime
-import qa_modules, config, os
+import time
+import qa_modules, llm_clients, llm_async, config, os, pdf_index_cache, embedder_registry, document_ingest, vector_index, lexical_index
+
+def strip_overlap(previous, chunk, min_overlap=20):
+    """chunk without the longest prefix it shares with the end of previous (its neighbour in the document)"""
+    for size in range(min(len(previous), len(chunk), 2 * document_ingest.CHUNK_OVERLAP), min_overlap - 1, -1):
+        if previous.endswith(chunk[:size]):
+            return chunk[size:].lstrip()
+    return chunk
 
 class CFDCaseExtractor:
-    def __init__(self, model_name='sentence-transformers/all-mpnet-base-v2'):
-        self.embedder = SentenceTransformer(model_name)
-        self.client = OpenAI(
+    def __init__(self, model_name=embedder_registry.DEFAULT_EMBEDDER_MODEL):
+        self.model_name = model_name
+        self._embedder = None
+        self.client = llm_clients.get_openai_client(
             api_key=os.environ.get("DEEPSEEK_R1_KEY"), 
             base_url=os.environ.get("DEEPSEEK_R1_BASE_URL")
         )
         self.gpt_model = os.environ.get("DEEPSEEK_R1_MODEL_NAME")
         self.index = None
+        self.lexical = None  # lexical_index.LexicalIndex of the chunks, for hybrid retrieval
+        self.document = None  # document_ingest.IngestedDocument of the processed PDF
         self.chunks = []
+        self.chunk_metadata = []  # {"chunk_id", "page", "chars", "tokens"} per chunk
+        self.chunk_tokens = []
         self.token_usage = []  # New token usage statistics storage
-        self.encoder = tiktoken.encoding_for_model("gpt-4")
+        self.retrieval_stats = {"questions": 0, "retrieved_chunks": 0, "shared_chunks": 0}
+        self.encoder = qa_modules.get_encoding("gpt-4")
+
+    @property
+    def embedder(self):
+        """Shared SentenceTransformer from embedder_registry, only fetched once chunks or questions are encoded"""
+        if self._embedder is None:
+            self._embedder = embedder_registry.get_embedder(self.model_name)
+        return self._embedder
+
+    def index_settings(self):
+        """Settings that change the embeddings of the document chunks or their index"""
+        return {"embedder": self.model_name, "index": vector_index.VectorIndex().settings()}
 
     def process_pdf(self, file_path):
-        """Optimized PDF processing workflow (fixed bbox error)"""
-        with pdfplumber.open(file_path) as pdf:
-            text_blocks = []
-            for i, page in enumerate(pdf.pages):
-                # Define valid text area (in points)
-                bbox = (
-                    50,  # left margin
-                    50,  # top margin (skip header)
-                    page.width - 50,  # right margin
-                    page.height - 50  # bottom margin (skip footer)
-                )
-                
-                # Create filter function (key fix)
-                crop_filter = lambda obj: (
-                    obj["x0"] >= bbox[0] and
-                    obj["top"] >= bbox[1] and
-                    obj["x1"] <= bbox[2] and
-                    obj["bottom"] <= bbox[3]
-                )
-                
-                # Apply area filtering
-                cropped_page = page.filter(crop_filter)
-                
-                # Optimize text extraction parameters
-                text = cropped_page.extract_text(
-                    layout=True,
-                    x_tolerance=3,
-                    y_tolerance=2,
-                    keep_blank_chars=False,
-                    extra_attrs=["size", "fontname"]
-                )
-                
-                # Text cleaning
-                cleaned_text = self.clean_text(text, page_number=i+1)
-                if cleaned_text:
-                    text_blocks.append(cleaned_text)
-        
-        # 4. Intelligent chunking strategy
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=600,
-            chunk_overlap=100,
-            separators=[
-                r"\n\s*[A-Z][A-Z\s]+\s*:\s*\n",  # Match headings like "METHODOLOGY:"
-                r"\n\s*\d+\.\s*[A-Z]",          # Match section numbers like "3. RESULTS"
-                "\n\n"
-            ]
-        )
-        self.chunks = splitter.split_text("\n".join(text_blocks))
-        
-        # Filter empty chunks and short text
-        self.chunks = [chunk for chunk in self.chunks 
-                    if len(chunk.strip()) > 50]
-        
-        # Create FAISS index
+        """Take the chunks of the ingested PDF and load their FAISS index from the PDF index cache, or build and store it"""
+        self.document = document_ingest.ingest(file_path)
+        self.chunks = self.document.chunks
+        self.chunk_metadata = self.document.chunk_metadata
+        self.chunk_tokens = [metadata["tokens"] for metadata in self.chunk_metadata]
+        if config.pdf_retrieval_mode == "hybrid":
+            self.lexical = lexical_index.LexicalIndex(self.chunks)
+
+        start = time.perf_counter()
+        cache = pdf_index_cache.get_cache()
+        key = cache.make_key(self.document.key, self.index_settings())
+        if config.pdf_index_cache_enabled:
+            self.index = cache.load_index(key, expected_size=len(self.chunks))
+            if self.index is not None:
+                print(f"PDF index cache hit for {os.path.basename(file_path)}: {self.index.ntotal} vectors ({self.index.backend}) loaded in {time.perf_counter() - start:.3f} s")
+                return
+
+        self._build_index()
+        if config.pdf_index_cache_enabled:
+            cache.save_index(key, self.index)
+        print(f"PDF index ({self.index.backend}) for {os.path.basename(file_path)} built in {time.perf_counter() - start:.3f} s")
+
+    def _build_index(self):
+        """Create the vector index of the chunks with the backend of config.pdf_index_backend"""
         embeddings = self.embedder.encode(self.chunks, 
                                         convert_to_numpy=True,
                                         show_progress_bar=False)
         embeddings = np.array(embeddings).astype('float32')
         
-        self.index = faiss.IndexFlatL2(embeddings.shape[1])
-        self.index.add(embeddings)
-        
+        self.index = vector_index.VectorIndex().build(embeddings)
 
     def clean_text(self, text, page_number):
-        """Multi-stage text cleaning"""
-        # Stage 1: Merge broken words
-        text = re.sub(r'(?<=\w)-\n(?=\w)', '', text)  # Connect words split by line breaks
-        
-        # Stage 2: Handle numbers and units
-        text = re.sub(r'\n(?=\d+\s*[A-Za-z]{1,3}\b)', ' ', text)  # Fix unit line breaks
-        
-        # Stage 3: Remove isolated page numbers
-        text = re.sub(r'^\s*\d+\s*$', '', text, flags=re.MULTILINE)
-        
-        # Stage 4: Compress whitespace
-        text = re.sub(r'\n{3,}', '\n\n', text)  # Compress multiple line breaks to two
-        text = re.sub(r'[ \t]{2,}', ' ', text)   # Compress multiple spaces to one
-        
-        # Stage 5: Filter small text segments (possibly chart annotations)
-        lines = [line.strip() for line in text.split('\n') if len(line.strip()) > 3]
-        
-        # Add page metadata
-        return f"Page {page_number}:\n" + "\n".join(lines) if lines else ""
+        return document_ingest.clean_text(text, page_number)
 
     def _count_tokens(self, text):
         """Use Tiktoken for precise token counting"""
         return len(self.encoder.encode(text))
 
-    def query_case_setup(self, question, top_k=3, context = False):
+    def query_case_setup(self, question, top_k=None, context = False):
         """Enhanced query method with token statistics"""
+        return llm_async.run_sync(self.query_case_setup_async(question, top_k=top_k, context=context))
+
+    def query_many(self, questions, top_k=None, context = False):
+        """Answers of several independent questions, see query_many_async"""
+        return llm_async.run_sync(self.query_many_async(questions, top_k=top_k, context=context))
+
+    def _retrieve(self, question, top_k=None):
+        """Semantic retrieval of the chunks closer than config.pdf_chunk_d to the question"""
+        return self.retrieve_many([question], top_k)[0]
+
+    def retrieve_many(self, questions, top_k=None):
+        """
+        Chunk contexts of several questions from one batched encode and one index search
+
+        Returns one list of chunk texts per question, best first, packed into
+        config.pdf_context_token_budget (see _select_chunks). In "vector" pdf_retrieval_mode the
+        candidates are first limited to the chunks closer than config.pdf_chunk_d, and only those
+        are packed. A chunk whose document neighbour is in the same context has the text it shares
+        with it (the chunk overlap) removed.
+        In "hybrid" pdf_retrieval_mode the vector hits are fused with the BM25 and numeric-parameter
+        hits by reciprocal rank, so a chunk stating e.g. "Re = 6×10^6" is found even when its
+        embedding is farther than config.pdf_chunk_d.
+        """
+        return [chunks for chunks, _ in self._retrieve_contexts(questions, top_k)]
+
+    def _retrieve_contexts(self, questions, top_k):
+        """(chunk texts, token count) of the packed context of every question"""
+        hybrid = config.pdf_retrieval_mode == "hybrid" and self.lexical is not None
+        candidates = max(top_k or 0, config.pdf_retrieval_candidates)
+        query_embeds = self.embedder.encode(list(questions), convert_to_numpy=True, show_progress_bar=False)
+        distances, indices = self.index.search(query_embeds, candidates)
+        contexts = []
+        for question, row_distances, row_indices in zip(questions, distances, indices):
+            chunk_ids = [int(i) for i, d in zip(row_indices, row_distances) if i >= 0 and d < config.pdf_chunk_d]
+            if hybrid:
+                chunk_ids = lexical_index.reciprocal_rank_fusion([chunk_ids] + self.lexical.rankings(question, candidates))
+            contexts.append(self._select_chunks(chunk_ids, top_k))
+
+        retrieved = sum(len(chunk_ids) for chunk_ids in contexts)
+        unique = len(set(chunk_id for chunk_ids in contexts for chunk_id in chunk_ids))
+        self.retrieval_stats["questions"] += len(contexts)
+        self.retrieval_stats["retrieved_chunks"] += retrieved
+        self.retrieval_stats["shared_chunks"] += retrieved - unique
+        return [self._context_chunks(chunk_ids) for chunk_ids in contexts]
+
+    def _select_chunks(self, ranked_ids, top_k=None):
+        """
+        Greedily take the ranked chunks that still fit into config.pdf_context_token_budget
+
+        A chunk too large for the remaining budget is skipped and a smaller, lower-ranked one may
+        take its place. top_k additionally caps the number of chunks.
+        """
+        selected = []
+        used = 0
+        for chunk_id in ranked_ids:
+            if top_k is not None and len(selected) >= top_k:
+                break
+            tokens = self.chunk_tokens[chunk_id]
+            if used + tokens > config.pdf_context_token_budget:
+                continue
+            selected.append(chunk_id)
+            used += tokens
+        return selected
+
+    def _context_chunks(self, chunk_ids):
+        chunks = []
+        context_tokens = 0
+        for chunk_id in chunk_ids:
+            chunk = self.chunks[chunk_id]
+            tokens = self.chunk_tokens[chunk_id]
+            if chunk_id - 1 in chunk_ids:
+                stripped = strip_overlap(self.chunks[chunk_id - 1], chunk)
+                if stripped != chunk:
+                    chunk = stripped
+                    tokens = self._count_tokens(chunk)
+            chunks.append(chunk)
+            context_tokens += tokens
+        return chunks, context_tokens
+
+    async def query_case_setup_async(self, question, top_k=None, context = False):
+        """Async variant of query_case_setup, independent questions can be awaited concurrently"""
+        return (await self.query_many_async([question], top_k=top_k, context=context))[0]
+
+    async def query_many_async(self, questions, top_k=None, context = False):
+        """
+        Answers of several independent questions, in question order
+
+        The questions are retrieved in one batch, then their LLM calls run concurrently. Use it only
+        for questions that do not embed each other's answers.
+        """
+        try:
+            if self.index is None:
+                raise ValueError("Please process PDF document using process_pdf first")
+
+            # Semantic retrieval phase, off the event loop since encoding is CPU-bound
+            contexts = await asyncio.to_thread(self._retrieve_contexts, questions, top_k)
+        except Exception as e:
+            for question in questions:
+                self.token_usage.append({
+                    "timestamp": datetime.now().isoformat(),
+                    "question": question,
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "total_tokens": 0,
+                    "status": "failed",
+                    "error": str(e)
+                })
+            return [f"Processing error: {str(e)}"] * len(questions)
+
+        return await asyncio.gather(*(
+            self._answer_async(question, relevant_chunks, context, context_tokens)
+            for question, (relevant_chunks, context_tokens) in zip(questions, contexts)
+        ))
+
+    async def _answer_async(self, question, relevant_chunks, context, context_tokens):
+        """Ask R1 the question over its retrieved chunks"""
         try:
             # Initialize request record
             request_entry = {
@@ -126,16 +213,7 @@ class CFDCaseExtractor:
                 "error": None
             }
 
-            if not self.index:
-                raise ValueError("Please process PDF document using process_pdf first")
-
-            # Semantic retrieval phase
-            query_embed = self.embedder.encode([question])
-            distances, indices = self.index.search(query_embed, top_k)
-            relevant_chunks = [self.chunks[i] for i, d in zip(indices[0], distances[0]) if d < config.pdf_chunk_d]
-
-            # Record context token consumption
-            context_tokens = sum(self._count_tokens(chunk) for chunk in relevant_chunks)
+            # Record context token consumption, counted once per chunk at indexing time
             request_entry["context_tokens"] = context_tokens  # New context token statistics
 
             if not relevant_chunks:
@@ -156,7 +234,7 @@ class CFDCaseExtractor:
             else:
                 qa = qa_modules.QA_NoContext_deepseek_R1()
 
-            R1_response = qa.ask(prompt)
+            R1_response = await qa.ask_async(prompt)
 
             return R1_response
 
@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+import config
+import vector_index
+
+class PDFIndexCache:
+    """
+    On-disk store of ingested PDF documents and the FAISS indexes of their chunks
+
+    Documents are saved as <cache_dir>/documents/<key>.json, where the key is the sha256 of the
+    PDF content plus the extraction and chunker settings (see document_ingest.py). Indexes are
+    saved as <cache_dir>/indexes/<key>.faiss, keyed by the document key plus the embedder
+    and index backend settings (see vector_index.py), with the backend settings in <key>.faiss.json.
+    A changed PDF or setting gives a new key, so stale entries are never read back.
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def file_digest(file_path):
+        sha = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        return sha.hexdigest()
+
+    @staticmethod
+    def make_key(digest, settings):
+        payload = json.dumps({"digest": digest, "settings": settings}, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _document_path(self, key):
+        return os.path.join(self.cache_dir, "documents", f"{key}.json")
+
+    def _index_path(self, key):
+        return os.path.join(self.cache_dir, "indexes", f"{key}.faiss")
+
+    @staticmethod
+    def _tmp_path(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def load_document(self, key):
+        """Return the stored document dict, or None if it is missing or unreadable"""
+        try:
+            with open(self._document_path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)["document"]
+        except (OSError, json.JSONDecodeError, KeyError):
+            return None
+
+    def save_document(self, key, document):
+        document_path = self._document_path(key)
+        # Write to a temporary file first so a crash never leaves a truncated entry
+        tmp_path = self._tmp_path(document_path)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"key": key, "created": time.time(), "document": document}, f, ensure_ascii=False)
+        os.replace(tmp_path, document_path)
+
+    def load_index(self, key, expected_size=None):
+        """Return the stored VectorIndex, or None if it is missing, unreadable or not of expected_size vectors"""
+        index_path = self._index_path(key)
+        if not os.path.isfile(index_path):
+            return None
+        try:
+            index = vector_index.VectorIndex.load(index_path)
+        except (OSError, RuntimeError, ValueError, KeyError, json.JSONDecodeError):
+            return None
+        if expected_size is not None and index.ntotal != expected_size:
+            return None
+        return index
+
+    def save_index(self, key, index):
+        index.save(self._index_path(key))
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+_cache_instance = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Process-wide cache built from the current config on first use"""
+    global _cache_instance
+    with _cache_lock:
+        if _cache_instance is None or _cache_instance.cache_dir != config.PDF_INDEX_CACHE_PATH:
+            _cache_instance = PDFIndexCache(config.PDF_INDEX_CACHE_PATH)
+        return _cache_instance
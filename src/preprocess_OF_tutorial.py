@@ -1,7 +1,13 @@
 import os
 import json
+import time
+import hashlib
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import requests
 import config
+import of_case_store
 import re
 
 # sub-folders in the OpenFOAM tutorial
@@ -11,144 +17,146 @@ solver_features = ['basic', 'compressible', 'heatTransfer', 'lagrangian',
 # Specify subdirectories to collect
 target_subdirs = {'0', '0.orig', 'system', 'constant'}
 
-# Dictionary to store results
-cases_dict_collection = {}
-
-# LLM call
-
-# Remove cases with overly long configuration files
-def describe_cases(input_file, output_file):
-    with open(input_file, 'r', encoding='utf-8') as infile:
-        data = json.load(infile)
-        
-    # Define a recursive function to traverse nested dictionary structure
-    def recursive_process(data):
-        if isinstance(data, dict):
-            for key, value in data.items():
-                # Check if 'case_path' and 'configuration_files' exist
-                if 'case_path' in value and 'configuration_files' in value:
-                    case_path = value['case_path']
-                    # Convert 'configuration_files' dictionary to string
-                    config_str = json.dumps(value['configuration_files'], ensure_ascii=False)
-
-                    # print("Processing case = ",case_path)
-                    
-                    # Skip cases that are too long
-                    if(len(config_str) > 2e5):
-                        # print(f"Removing {case_path} since its too long. len(config_str) = {len(config_str)}")
-                        continue
-                    
-                    # Append processed data to output file
-                    with open(output_file, 'a', encoding='utf-8') as outfile:
-                        json.dump({key: value}, outfile, ensure_ascii=False, indent=4)
-                        outfile.write('\n')
-                else:
-                    # Recursively process nested parts
-                    recursive_process(value)
-        elif isinstance(data, list):
-            for item in data:
-                recursive_process(item)
-
-    recursive_process(data)
-
+# Cases whose configuration files exceed this many characters (as json) are not used as references
+MAX_CONFIG_CHARS = 2e5
+# Scan pools are spawned, not forked, as the calling process may already run threads (see document_ingest)
+_POOL_CONTEXT = multiprocessing.get_context("spawn")
+# Bump when the collected files or derive_case_metadata change, so every case is re-derived
+TUTORIAL_INDEX_VERSION = 2
 
 # Collect case description files from openfoam/tutorial directory
-def case_config_collector():
-    for feature in solver_features:
-        feature_dir = os.path.join(config.of_tutorial_dir, feature)
+def solver_dirs(tutorial_dir):
+    """(feature, solver, solver directory) of every *Foam directory of the solver_features"""
+    # dict.fromkeys drops the repeated feature names of solver_features, keeping their order
+    for feature in dict.fromkeys(solver_features):
+        feature_dir = os.path.join(tutorial_dir, feature)
         if not os.path.isdir(feature_dir):
             continue  # Skip if feature directory doesn't exist
         for solver in os.listdir(feature_dir):
             solver_dir = os.path.join(feature_dir, solver)
             if os.path.isdir(solver_dir) and solver.endswith('Foam'):
-                for root_path, dirs, files in os.walk(solver_dir):
-                    if 'system' in dirs:
-                        system_dir = os.path.join(root_path, 'system')
-                        required_files = {'controlDict', 'fvSchemes', 'fvSolution'}
-                        if os.path.isdir(system_dir):
-                            system_files = set(os.listdir(system_dir))
-                            if required_files.issubset(system_files):
-                                # Get relative path of the case
-                                case_relative_path = os.path.relpath(root_path, config.of_tutorial_dir)
-                                # Initialize storage structure
-                                cases_dict_collection.setdefault(feature, {}).setdefault(solver, {})[case_relative_path] = {
-                                    'case_path': case_relative_path,
-                                    'configuration_files': {}
-                                }
-                                # Collect configuration files and their contents from specified subdirectories
-                                config_files = {}
-                                for subdir in target_subdirs:
-                                    subdir_path = os.path.join(root_path, subdir)
-                                    if os.path.isdir(subdir_path):
-                                        for dirpath, dirnames, filenames in os.walk(subdir_path):
-                                            # If current directory is constant, skip polyMesh subdirectory
-                                            if os.path.basename(subdir_path) == 'constant':
-                                                if 'polyMesh' in dirnames:
-                                                    dirnames.remove('polyMesh')  # Remove 'constant/polyMesh' from dirnames to prevent os.walk from traversing it
-                                            if os.path.basename(subdir_path) == '0':
-                                                if 'include' in dirnames:
-                                                    dirnames.remove('include')  # Remove '0/include' from dirnames to prevent os.walk from traversing it
-                                            for filename in filenames:
-                                                if "blockMeshDict" in filename:
-                                                    continue
-                                                if "changeDictionaryDict" in filename:
-                                                    continue
-                                                file_full_path = os.path.join(dirpath, filename)
-                                                # Get file path relative to case directory
-                                                file_relative_path = os.path.relpath(file_full_path, root_path)
-                                                # Read file content
-                                                try:
-                                                    with open(file_full_path, 'r', encoding='utf-8', errors='ignore') as f:
-                                                        # Read file and remove header information
-                                                        lines = f.readlines()
-                                                        content_started = False
-                                                        processed_lines = []
-                                                        for line in lines:
-                                                            if not content_started and 'FoamFile' in line:
-                                                                content_started = True
-                                                            if content_started:
-                                                                processed_lines.append(line)
-                                                        # Merge processed content into string
-                                                        file_content = ''.join(processed_lines)
-                                                except Exception as e:
-                                                    print(f"Cannot read file {file_full_path}, error: {e}")
-                                                    file_content = ""
-                                                # Add file path and content to configuration files dictionary
-                                                config_files[file_relative_path] = file_content
-                                # Update configuration files list
-                                cases_dict_collection[feature][solver][case_relative_path]['configuration_files'] = config_files
-
-def merge_json_objects(file_path, output_path):
-    # Read file content
-    with open(file_path, 'r', encoding='utf-8') as file:
-        content = file.read()
-    
-    # Split multiple JSON objects
-    json_strings = content.split('}\n{')
-    
-    # Create merged dictionary
-    merged_dict = {}
-    
-    for i, json_str in enumerate(json_strings):
-        # Add missing brackets for split parts
-        if i > 0:
-            json_str = '{' + json_str
-        if i < len(json_strings) - 1:
-            json_str = json_str + '}'
-            
-        try:
-            # Parse JSON
-            data = json.loads(json_str)
-            # Merge into main dictionary
-            merged_dict.update(data)
-        except json.JSONDecodeError as e:
-            print(f"Error parsing {i+1}th JSON object: {str(e)}")
-    
-    # Write merged data to new file
-    with open(output_path, 'w', encoding='utf-8') as file:
-        json.dump(merged_dict, file, indent=4)
-    
-    return merged_dict
+                yield feature, solver, solver_dir
+
+def find_case_dirs(solver_dir):
+    """Every case under solver_dir: a directory whose system/ holds controlDict, fvSchemes and fvSolution"""
+    for root_path, dirs, files in os.walk(solver_dir):
+        if 'system' in dirs:
+            system_dir = os.path.join(root_path, 'system')
+            required_files = {'controlDict', 'fvSchemes', 'fvSolution'}
+            if os.path.isdir(system_dir):
+                system_files = set(os.listdir(system_dir))
+                if required_files.issubset(system_files):
+                    yield root_path
+
+def case_file_paths(case_dir):
+    """(path relative to the case, full path) of the configuration files collected from a case"""
+    paths = []
+    for subdir in sorted(target_subdirs):
+        subdir_path = os.path.join(case_dir, subdir)
+        if os.path.isdir(subdir_path):
+            for dirpath, dirnames, filenames in os.walk(subdir_path):
+                # If current directory is constant, skip polyMesh subdirectory
+                if subdir == 'constant':
+                    if 'polyMesh' in dirnames:
+                        dirnames.remove('polyMesh')  # Remove 'constant/polyMesh' from dirnames to prevent os.walk from traversing it
+                if subdir == '0':
+                    if 'include' in dirnames:
+                        dirnames.remove('include')  # Remove '0/include' from dirnames to prevent os.walk from traversing it
+                for filename in filenames:
+                    if "blockMeshDict" in filename:
+                        continue
+                    if "changeDictionaryDict" in filename:
+                        continue
+                    file_full_path = os.path.join(dirpath, filename)
+                    # Get file path relative to case directory
+                    paths.append((os.path.relpath(file_full_path, case_dir), file_full_path))
+    return paths
+
+def read_case_file(file_full_path):
+    """File content from the line holding the FoamFile header on, "" if the file cannot be read"""
+    try:
+        with open(file_full_path, 'r', encoding='utf-8', errors='ignore') as f:
+            content = f.read()
+    except Exception as e:
+        print(f"Cannot read file {file_full_path}, error: {e}")
+        return ""
+    # Remove the banner above the header in one slice instead of line by line
+    header = content.find('FoamFile')
+    if header == -1:
+        return ""
+    return content[content.rfind('\n', 0, header) + 1:]
+
+def read_case(case_dir):
+    """{relative path: content} of the configuration files of a case"""
+    return {file_relative_path: read_case_file(file_full_path) for file_relative_path, file_full_path in case_file_paths(case_dir)}
+
+def scan_solver_dir(feature, solver, solver_dir, tutorial_dir, previous_entries):
+    """
+    Process pool worker: manifest entries of the cases under one solver directory, the paths of
+    the cases whose files differ from previous_entries and the time spent
+    """
+    start = time.perf_counter()
+    entries = {}
+    changed = []
+    for case_dir in find_case_dirs(solver_dir):
+        # Get relative path of the case
+        case_path = os.path.relpath(case_dir, tutorial_dir)
+        previous = previous_entries.get(case_path)
+        previous_files = previous["files"] if previous else None
+        entry = dict(previous) if previous else {"indexed": False}
+        entry.update(feature=feature, solver=solver, files=case_fingerprint(case_dir, previous_files))
+        if not same_content(entry["files"], previous_files):
+            changed.append(case_path)
+        entries[case_path] = entry
+    return entries, changed, time.perf_counter() - start
+
+def _scan_workers(num_tasks):
+    workers = config.of_tutorial_scan_workers or os.cpu_count() or 1
+    return max(1, min(workers, num_tasks))
+
+def case_config_collector(tutorial_dir, previous_entries=None):
+    """
+    Scan every solver directory of the tutorials with scan_solver_dir and merge the results
+
+    Solver directories are scanned by a process pool of config.of_tutorial_scan_workers processes
+    (one process scans in-process). Returns the manifest entries, the changed case paths (both in
+    tutorial order) and the scan time per feature directory.
+    """
+    start = time.perf_counter()
+    previous_entries = previous_entries or {}
+    previous_by_solver = {}
+    for case_path, entry in previous_entries.items():
+        previous_by_solver.setdefault((entry["feature"], entry["solver"]), {})[case_path] = entry
+
+    tasks = [
+        (feature, solver, solver_dir, tutorial_dir, previous_by_solver.get((feature, solver), {}))
+        for feature, solver, solver_dir in solver_dirs(tutorial_dir)
+    ]
+    workers = _scan_workers(len(tasks))
+    if workers == 1:
+        results = [scan_solver_dir(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_POOL_CONTEXT) as executor:
+            futures = [executor.submit(scan_solver_dir, *task) for task in tasks]
+            # Merged in submission order, so the case order does not depend on the worker count
+            results = [future.result() for future in futures]
+
+    entries = {}
+    changed = []
+    feature_timings = {}
+    for task, (solver_entries, solver_changed, seconds) in zip(tasks, results):
+        entries.update(solver_entries)
+        changed.extend(solver_changed)
+        timing = feature_timings.setdefault(task[0], {"solver_dirs": 0, "cases": 0, "changed": 0, "seconds": 0.0})
+        timing["solver_dirs"] += 1
+        timing["cases"] += len(solver_entries)
+        timing["changed"] += len(solver_changed)
+        timing["seconds"] += seconds
+
+    print(f"Scanned {len(tasks)} solver directories with {workers} worker(s) in {time.perf_counter() - start:.3f} s")
+    for feature, timing in feature_timings.items():
+        print(f"    {feature:<16}{timing['solver_dirs']:>4} solvers{timing['cases']:>6} cases{timing['changed']:>6} changed{timing['seconds']:>9.3f} s")
+    return entries, changed, feature_timings
 
 multiphase_flow_solvers = [
     "cavitatingFoam","compressibleInterFoam","compressibleMultiphaseInterFoam",
@@ -173,10 +181,11 @@ reacting_flow_solvers = [
     "XiEngineFoam", "rhoReactingFoam"
 ]
 
-solver_set = set()
-turbulence_type_set = set()
-turbulence_model_set = set()
-boundary_type_set = set()
+boundary_field_pattern = re.compile(
+    r'boundaryField\s*{((?:[^{}]*{[^{}]*}[^{}]*)*)}',
+    re.DOTALL
+)
+type_pattern = re.compile(r'type\s+([^;]+);', re.DOTALL)
 
 def extract_turbulence_model(file_content):
     content = file_content.split('\n')
@@ -187,207 +196,401 @@ def extract_turbulence_model(file_content):
             break  # Exit loop once we've found the model
     return model
 
-def add_case_path_keys(data):
-    for case_data in data.values():
-        config_files = case_data["configuration_files"]
-
-        # print(f"updating case: {case_data['case_path']}")
-
-        # Step 1: Process 0.orig/* keys and rename to 0/*
-        keys_to_modify = []
-        for key in list(config_files.keys()):
-            if key.startswith("0.orig/"):
-                new_key = key.replace("0.orig/", "0/", 1)
-                # Remove .orig suffix in filename if present
-                parts = new_key.split('/')
-                if len(parts) > 1 and parts[-1].endswith('.orig'):
-                    parts[-1] = parts[-1][:-5]  # Remove .orig extension
-                    new_key = '/'.join(parts)
-                keys_to_modify.append((key, new_key))
-        
-        # Perform key replacement
-        for old_key, new_key in keys_to_modify:
-            if old_key in config_files:
-                config_files[new_key] = config_files.pop(old_key)
-        
-        # Step 2: Collect all 0/* keys for required_field
-        required_fields = [k for k in config_files if k.startswith("0/")]
-        case_data["required_field"] = required_fields
-        
-        # Extract solver (application)
-        control_dict = config_files.get("system/controlDict", "")
-        solver_match = re.search(r"application\s+(\w+);", control_dict)
-        solver = solver_match.group(1) if solver_match else None
-        case_data["solver"] = solver
-
-        solver_set.add(solver)
-        
-        # Determine singlePhase
-        case_data["singlePhase"] = True
-        if solver in multiphase_flow_solvers:
-            case_data["singlePhase"] = False
-        
-        # Determine particle flow
-        case_data["particle_flow"] = False
-        if case_data["particle_flow"] == False:
-            if solver in particle_flow_solvers:
-                case_data["particle_flow"] = True
-            if any('Cloud' in s for s in list(config_files.keys())):
-                case_data["particle_flow"] = True
-
-        # Determine reacting flow
-        case_data["reacting_flow"] = False
-        if case_data["reacting_flow"] == False:
-            if solver in reacting_flow_solvers:
-                case_data["reacting_flow"] = True
-            if "constant/combustionProperties" in list(config_files.keys()):
-                case_data["reacting_flow"] = True
-            if "constant/reactions" in list(config_files.keys()):
-                case_data["reacting_flow"] = True
-
-        # Extract turbulence_type (RAS, LES, laminar ...)
-        # Extract turbulence_model (kEpsilon ...)
-
-        turbulence_type = None
-        turbulence_model = None
-        for file_path in config_files:
-            parts = file_path.split("/")
-            if len(parts) > 1 and parts[0] == "constant" and parts[-1] == "turbulenceProperties":
-                content = config_files[file_path]
-                type_match = re.search(r"simulationType\s+(\w+);", content)
-                if type_match:
-                    turbulence_type = type_match.group(1)
-                    if turbulence_type == "LES":
-                        type_match = re.search(r"LESModel\s+(\w+);", content)
-                        if type_match:
-                            turbulence_model = type_match.group(1)
-                    elif turbulence_type == "RAS":
-                        type_match = re.search(r"RASModel\s+(\w+);", content)
-                        if type_match:
-                            turbulence_model = type_match.group(1)
-                    elif turbulence_type == "laminar":
-                        turbulence_model = None
-                    break
-
-        case_data["turbulence_type"] = turbulence_type
-        case_data["turbulence_model"] = turbulence_model
-        
-
-        turbulence_type_set.add(turbulence_type)
-        turbulence_model_set.add(turbulence_model)
-
-        # Extract boundary types from case
-        case_boundary_type_set = set()
-        for file_path in config_files:
-            parts = file_path.split("/")
-            if len(parts) > 1 and (parts[0] == "0" or parts[0] == "0.org"):
-                content = config_files[file_path]
-
-                # Step 1: Match content of {} block after boundaryField
-                boundary_field_pattern = re.compile(
-                    r'boundaryField\s*{((?:[^{}]*{[^{}]*}[^{}]*)*)}', 
-                    re.DOTALL
-                )
-                boundary_match = boundary_field_pattern.search(content)
-                if boundary_match:
-                    boundary_content = boundary_match.group(1)
-                    
-                    # Step 2: Match all values after type
-                    type_pattern = re.compile(r'type\s+([^;]+);', re.DOTALL)
-                    type_matches = type_pattern.findall(boundary_content)
-
-                    if type_matches:
-                        # Remove leading and trailing whitespace and output results
-                        type_values = [m.strip() for m in type_matches]
-                        case_boundary_type_set.update(type_values)
-
-        case_data["boundary_type"] = list(case_boundary_type_set)
-        boundary_type_set.update(case_boundary_type_set)
-
-    return data
-
-
-def main():
-
-    # Collect all case files from tutorial into a json file
-    case_config_collector()
-    all_case_collector = f'{config.Database_OFv24_PATH}/openfoam_cases.json'
-    with open(all_case_collector, 'w', encoding='utf-8') as f:
-        json.dump(cases_dict_collection, f, indent=4, ensure_ascii=False)
-
-    discrete_tmp_json = f'{config.Database_OFv24_PATH}/discrete_case_config_with_descriptions.json'
-
-    describe_cases(all_case_collector, output_file=discrete_tmp_json)
-
-    output_file = f'{config.Database_OFv24_PATH}/merged_OF_cases.json'
-
-    merge_json_objects(discrete_tmp_json, output_file)
-
-    # os.remove(all_case_collector)
-    # os.remove(discrete_tmp_json)
-
-    # Read input JSON
-    with open(output_file, "r") as f:
-        data = json.load(f)
-        print("Total case number = ", len(data))
-
-    # Process data
-    updated_data = add_case_path_keys(data)
-
-    new_solver_set = {item for item in solver_set if item is not None}
-    new_turbulence_type_set = {item for item in turbulence_type_set if item is not None}
-    new_turbulence_model_set = {item for item in turbulence_model_set if item is not None}
-    new_boundary_type_set = {item for item in boundary_type_set if item is not None}
-
-    config.global_OF_keywords = {
-        "solver": list(new_solver_set),
-        "turbulence_type": list(new_turbulence_type_set),
-        "turbulence_model": list(new_turbulence_model_set),
-        "boundary_type": list(new_boundary_type_set)
+def boundary_types(config_files):
+    """Boundary types set in the boundaryField of the 0/ field files of a case"""
+    # Extract boundary types from case
+    case_boundary_type_set = set()
+    for file_path in config_files:
+        parts = file_path.split("/")
+        if len(parts) > 1 and (parts[0] == "0" or parts[0] == "0.org"):
+            content = config_files[file_path]
+
+            # Step 1: Match content of {} block after boundaryField
+            boundary_match = boundary_field_pattern.search(content)
+            if boundary_match:
+                boundary_content = boundary_match.group(1)
+
+                # Step 2: Match all values after type
+                type_matches = type_pattern.findall(boundary_content)
+
+                if type_matches:
+                    # Remove leading and trailing whitespace and output results
+                    type_values = [m.strip() for m in type_matches]
+                    case_boundary_type_set.update(type_values)
+
+    # Sorted, so the database does not depend on the string hash seed of the (spawned) worker
+    return sorted(case_boundary_type_set)
+
+def derive_case_metadata(case_data):
+    """
+    Rename 0.orig files to 0/ and add the required_field, solver, flow type, turbulence and
+    boundary_type keys of one collected case, in place
+    """
+    config_files = case_data["configuration_files"]
+
+    # print(f"updating case: {case_data['case_path']}")
+
+    # Step 1: Process 0.orig/* keys and rename to 0/*
+    keys_to_modify = []
+    for key in list(config_files.keys()):
+        if key.startswith("0.orig/"):
+            new_key = key.replace("0.orig/", "0/", 1)
+            # Remove .orig suffix in filename if present
+            parts = new_key.split('/')
+            if len(parts) > 1 and parts[-1].endswith('.orig'):
+                parts[-1] = parts[-1][:-5]  # Remove .orig extension
+                new_key = '/'.join(parts)
+            keys_to_modify.append((key, new_key))
+    
+    # Perform key replacement
+    for old_key, new_key in keys_to_modify:
+        if old_key in config_files:
+            config_files[new_key] = config_files.pop(old_key)
+    
+    # Step 2: Collect all 0/* keys for required_field
+    required_fields = [k for k in config_files if k.startswith("0/")]
+    case_data["required_field"] = required_fields
+    
+    # Extract solver (application)
+    control_dict = config_files.get("system/controlDict", "")
+    solver_match = re.search(r"application\s+(\w+);", control_dict)
+    solver = solver_match.group(1) if solver_match else None
+    case_data["solver"] = solver
+
+    # Determine singlePhase
+    case_data["singlePhase"] = True
+    if solver in multiphase_flow_solvers:
+        case_data["singlePhase"] = False
+    
+    # Determine particle flow
+    case_data["particle_flow"] = False
+    if case_data["particle_flow"] == False:
+        if solver in particle_flow_solvers:
+            case_data["particle_flow"] = True
+        if any('Cloud' in s for s in list(config_files.keys())):
+            case_data["particle_flow"] = True
+
+    # Determine reacting flow
+    case_data["reacting_flow"] = False
+    if case_data["reacting_flow"] == False:
+        if solver in reacting_flow_solvers:
+            case_data["reacting_flow"] = True
+        if "constant/combustionProperties" in list(config_files.keys()):
+            case_data["reacting_flow"] = True
+        if "constant/reactions" in list(config_files.keys()):
+            case_data["reacting_flow"] = True
+
+    # Extract turbulence_type (RAS, LES, laminar ...)
+    # Extract turbulence_model (kEpsilon ...)
+
+    turbulence_type = None
+    turbulence_model = None
+    for file_path in config_files:
+        parts = file_path.split("/")
+        if len(parts) > 1 and parts[0] == "constant" and parts[-1] == "turbulenceProperties":
+            content = config_files[file_path]
+            type_match = re.search(r"simulationType\s+(\w+);", content)
+            if type_match:
+                turbulence_type = type_match.group(1)
+                if turbulence_type == "LES":
+                    type_match = re.search(r"LESModel\s+(\w+);", content)
+                    if type_match:
+                        turbulence_model = type_match.group(1)
+                elif turbulence_type == "RAS":
+                    type_match = re.search(r"RASModel\s+(\w+);", content)
+                    if type_match:
+                        turbulence_model = type_match.group(1)
+                elif turbulence_type == "laminar":
+                    turbulence_model = None
+                break
+
+    case_data["turbulence_type"] = turbulence_type
+    case_data["turbulence_model"] = turbulence_model
+
+    case_data["boundary_type"] = boundary_types(config_files)
+
+    return case_data
+
+def file_sha256(file_path):
+    with open(file_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def case_fingerprint(case_dir, previous_files=None):
+    """
+    {relative path: [mtime_ns, size, sha256]} of the configuration files of a case
+
+    A file whose mtime and size match its previous_files entry keeps the recorded sha256 without
+    being read, so an unchanged tutorial tree is checked with stat calls only.
+    """
+    previous_files = previous_files or {}
+    files = {}
+    for file_relative_path, file_full_path in case_file_paths(case_dir):
+        try:
+            stat = os.stat(file_full_path)
+        except OSError:
+            continue
+        previous = previous_files.get(file_relative_path)
+        if previous and previous[0] == stat.st_mtime_ns and previous[1] == stat.st_size:
+            files[file_relative_path] = previous
+        else:
+            files[file_relative_path] = [stat.st_mtime_ns, stat.st_size, file_sha256(file_full_path)]
+    return files
+
+def same_content(files, previous_files):
+    """True if both fingerprints list the same files with the same sha256"""
+    if previous_files is None or files.keys() != previous_files.keys():
+        return False
+    return all(files[path][2] == previous_files[path][2] for path in files)
+
+def manifest_settings(tutorial_dir):
+    """Everything besides the case files that changes the processed cases, a mismatch re-derives all cases"""
+    return {
+        "version": TUTORIAL_INDEX_VERSION,
+        "tutorial_dir": os.path.abspath(tutorial_dir),
+        "max_config_chars": MAX_CONFIG_CHARS
     }
 
-    ofv24_keywords_file = f'{config.Database_OFv24_PATH}/ofv24_keywords.json'
-
-    with open(ofv24_keywords_file, 'w', encoding='utf-8') as file:
-        json.dump(config.global_OF_keywords, file, indent=4)
-
-    processed_merged_OF_cases = f'{config.Database_OFv24_PATH}/processed_merged_OF_cases.json'
-
-    # Output results
-    with open(processed_merged_OF_cases, "w") as f:
-        json.dump(updated_data, f, indent=4)
-
-    config.global_OF_cases = updated_data
-    config.flag_tutorial_preprocessed = True
-
-def read_in_processed_merged_OF_cases():
-    # If not running preprocess, read case data from previously run processed_merged_OF_cases.json into config.global_OF_cases
-    proprocess_case_json_file = f"{config.Database_OFv24_PATH}/processed_merged_OF_cases.json"
-    with open(proprocess_case_json_file, 'r', encoding='utf-8') as file:
-        # Read JSON file content into a dictionary
-        config.global_OF_cases = json.load(file)
-    # Update config.global_OF_keywords
+def load_manifest():
+    try:
+        with open(config.OF_tutorial_manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def write_json(path, data, indent=None):
+    # Write to a temporary file first so an interrupted run never leaves a truncated file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=indent)
+    os.replace(tmp_path, path)
+
+# Streaming pipeline of the changed cases: collect -> filter by size -> derive metadata -> write
+def collect_cases(tasks):
+    """Collected case of every (case path, case directory) task"""
+    for case_path, case_dir in tasks:
+        yield case_path, {'case_path': case_path, 'configuration_files': read_case(case_dir)}
+
+def filter_by_size(cases):
+    """Pass cases too long to be used as a reference on as None"""
+    for case_path, case_data in cases:
+        if len(json.dumps(case_data['configuration_files'], ensure_ascii=False)) > MAX_CONFIG_CHARS:
+            case_data = None
+        yield case_path, case_data
+
+def derive_metadata(cases):
+    for case_path, case_data in cases:
+        yield case_path, derive_case_metadata(case_data) if case_data is not None else None
+
+def encode_case(case_data):
+    return (json.dumps(case_data, ensure_ascii=False) + "\n").encode("utf-8")
+
+def case_keywords(case_data):
+    """Keywords of one case, kept in the manifest so config.global_OF_keywords never needs the case files"""
+    return {key: case_data[key] for key in ("solver", "turbulence_type", "turbulence_model", "boundary_type")}
+
+def process_cases(tasks):
+    """Process pool worker: (case path, JSONL line, keywords) of each task, line and keywords None for skipped cases"""
+    return [
+        (case_path, encode_case(case_data), case_keywords(case_data)) if case_data is not None else (case_path, None, None)
+        for case_path, case_data in derive_metadata(filter_by_size(collect_cases(tasks)))
+    ]
+
+def processed_cases(tutorial_dir, entries, changed):
+    """process_cases of the changed cases in tutorial order, one batch per solver directory over the scan process pool"""
+    batches = {}
+    for case_path in changed:
+        entry = entries[case_path]
+        batches.setdefault((entry["feature"], entry["solver"]), []).append((case_path, os.path.join(tutorial_dir, case_path)))
+    batches = list(batches.values())
+    workers = _scan_workers(len(batches))
+    if workers == 1:
+        for batch in batches:
+            yield from process_cases(batch)
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_POOL_CONTEXT) as executor:
+        # map yields the batches in order as they complete, the parent only holds finished batches
+        for result in executor.map(process_cases, batches):
+            yield from result
+
+def read_case_line(file, entry):
+    """Bytes of the JSONL line recorded in a manifest entry, None if the file does not hold it"""
+    offset, length = entry["line"]
+    file.seek(offset)
+    line = file.read(length)
+    return line if len(line) == length and line.endswith(b"\n") else None
+
+def write_cases(entries, changed, processed, jsonl_path):
+    """
+    Write stage: one JSONL line per indexed case in tutorial order, in a single pass
+
+    Lines of changed cases come from the processed stream, unchanged cases are copied byte for byte
+    from the previous file at the offset recorded in their manifest entry. Every entry is updated
+    with the offset and length of its new line.
+    """
+    changed = set(changed)
+    tmp_path = f"{jsonl_path}.{os.getpid()}.tmp"
+    previous_file = open(jsonl_path, 'rb') if os.path.isfile(jsonl_path) else None
+    try:
+        with open(tmp_path, 'wb') as out:
+            for case_path, entry in entries.items():
+                line = None
+                if case_path in changed:
+                    processed_path, line, keywords = next(processed)
+                    assert processed_path == case_path, f"{processed_path} processed in place of {case_path}"
+                    entry["indexed"] = line is not None
+                    entry["keywords"] = keywords
+                elif entry["indexed"]:
+                    line = read_case_line(previous_file, entry)
+                    if line is None:
+                        # Forget the fingerprint, so the case is derived again by the next run
+                        print(f"Cannot copy {case_path} from {jsonl_path}, it is re-derived on the next run")
+                        entry["indexed"] = False
+                        entry["files"] = {}
+                if line is None:
+                    entry.pop("line", None)
+                    continue
+                entry["line"] = [out.tell(), len(line)]
+                out.write(line)
+    finally:
+        if previous_file is not None:
+            previous_file.close()
+    os.replace(tmp_path, jsonl_path)
+
+def iter_processed_cases(jsonl_path=None):
+    """(case path, case) of every indexed tutorial case, read one line at a time"""
+    with open(jsonl_path or config.OF_cases_jsonl_path, 'r', encoding='utf-8') as lines:
+        for line in lines:
+            case_data = json.loads(line)
+            yield case_data['case_path'], case_data
+
+def export_processed_json(jsonl_path=None, json_path=None):
+    """Stream the JSONL database into processed_merged_OF_cases.json ({case path: case}, indent 4) one case at a time"""
+    json_path = json_path or config.OF_data_path
+    tmp_path = f"{json_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as out:
+        out.write("{")
+        separator = "\n"
+        for case_path, case_data in iter_processed_cases(jsonl_path):
+            out.write(separator + "    " + json.dumps(case_path) + ": " + json.dumps(case_data, indent=4).replace("\n", "\n    "))
+            separator = ",\n"
+        out.write("}" if separator == "\n" else "\n}")
+    os.replace(tmp_path, json_path)
+    print(f"Exported the OpenFOAM tutorial cases to {json_path}")
+
+def update_tutorial_index(tutorial_dir=None, rebuild=False):
+    """
+    Bring the JSONL tutorial case database (config.OF_cases_jsonl_path) up to date with the OpenFOAM tutorials
+
+    The manifest (config.OF_tutorial_manifest_path) records the fingerprint of the configuration
+    files of every case and the position of its line. Only new cases and cases whose files changed
+    go through the collect -> filter -> derive pipeline, the others are copied from the previous
+    database. processed_merged_OF_cases.json is exported as well if config.OF_cases_json_export is set.
+    Returns True if the database was rewritten.
+    """
+    start = time.perf_counter()
+    tutorial_dir = tutorial_dir or config.of_tutorial_dir
+    jsonl_path = config.OF_cases_jsonl_path
+    settings = manifest_settings(tutorial_dir)
+
+    manifest = None if rebuild else load_manifest()
+    if manifest is None or manifest.get("settings") != settings or not os.path.isfile(jsonl_path):
+        manifest = {"settings": settings, "cases": {}}
+    previous_entries = manifest["cases"]
+
+    entries, changed, _ = case_config_collector(tutorial_dir, previous_entries)
+    # Indexed cases without a recorded line cannot be copied and are processed again
+    changed = set(changed)
+    changed.update(case_path for case_path, entry in entries.items() if entry["indexed"] and ("line" not in entry or "keywords" not in entry))
+    changed = [case_path for case_path in entries if case_path in changed]
+    removed = previous_entries.keys() - entries.keys()
+
+    if not changed and not removed:
+        if entries != previous_entries:
+            # Touched but unchanged files: record their new mtimes so they are not hashed again
+            write_json(config.OF_tutorial_manifest_path, {"settings": settings, "cases": entries})
+        if config.OF_cases_json_export and not os.path.isfile(config.OF_data_path):
+            export_processed_json()
+        print(f"OpenFOAM tutorial index up to date: {len(entries)} cases checked in {time.perf_counter() - start:.3f} s")
+        print_dedupe_stats(entries)
+        return False
+
+    write_cases(entries, changed, processed_cases(tutorial_dir, entries, changed), jsonl_path)
+    indexed = [entry for entry in entries.values() if entry["indexed"]]
+    write_json(f'{config.Database_OFv24_PATH}/ofv24_keywords.json', collect_keywords(entry["keywords"] for entry in indexed), indent=4)
+    # The manifest goes last, so an interrupted run processes the changed cases again next time
+    write_json(config.OF_tutorial_manifest_path, {"settings": settings, "cases": entries})
+    if config.OF_cases_json_export:
+        export_processed_json()
+    print(f"OpenFOAM tutorial index updated in {time.perf_counter() - start:.3f} s: "
+          f"{len(changed)} changed, {len(removed)} removed, total case number = {len(indexed)}")
+    print_dedupe_stats(entries)
+    return True
+
+def dedupe_stats(entries):
+    """Case files of the indexed cases against their distinct contents, from the manifest fingerprints"""
+    files = 0
+    total_bytes = 0
+    unique_bytes = 0
+    seen = set()
+    for entry in entries.values():
+        if not entry["indexed"]:
+            continue
+        for _, size, sha256 in entry["files"].values():
+            files += 1
+            total_bytes += size
+            if sha256 not in seen:
+                seen.add(sha256)
+                unique_bytes += size
+    return {"files": files, "unique_files": len(seen), "bytes": total_bytes, "unique_bytes": unique_bytes}
+
+def print_dedupe_stats(entries):
+    stats = dedupe_stats(entries)
+    duplicates = stats["files"] - stats["unique_files"]
+    print(f"    {stats['files']} case files, {stats['unique_files']} distinct ({duplicates} duplicates), "
+          f"{stats['unique_bytes'] / 1e6:.1f} of {stats['bytes'] / 1e6:.1f} MB after deduplication")
+
+def collect_keywords(cases):
+    """config.global_OF_keywords of an iterable of processed cases (or their case_keywords)"""
     solver_set = set()
     turbulence_type_set = set()
     turbulence_model_set = set()
     boundary_type_set = set()
 
-    for key,value in config.global_OF_cases.items():
+    for value in cases:
         solver_set.add(value["solver"])
         turbulence_type_set.add(value["turbulence_type"])
         turbulence_model_set.add(value["turbulence_model"])
         boundary_type_set.update(value["boundary_type"])
 
-    new_solver_set = {item for item in solver_set if item is not None}
-    new_turbulence_type_set = {item for item in turbulence_type_set if item is not None}
-    new_turbulence_model_set = {item for item in turbulence_model_set if item is not None}
-    new_boundary_type_set = {item for item in boundary_type_set if item is not None}
-
-    config.global_OF_keywords = {
-        "solver": list(new_solver_set),
-        "turbulence_type": list(new_turbulence_type_set),
-        "turbulence_model": list(new_turbulence_model_set),
-        "boundary_type": list(new_boundary_type_set)
+    return {
+        "solver": sorted(item for item in solver_set if item is not None),
+        "turbulence_type": sorted(item for item in turbulence_type_set if item is not None),
+        "turbulence_model": sorted(item for item in turbulence_model_set if item is not None),
+        "boundary_type": sorted(item for item in boundary_type_set if item is not None)
     }
 
-    a = 1
\ No newline at end of file
+def main(rebuild=False):
+    # Re-read and re-derive only the tutorial cases that changed since the last run
+    update_tutorial_index(rebuild=rebuild)
+    read_in_processed_merged_OF_cases()
+    config.flag_tutorial_preprocessed = True
+
+def read_in_processed_merged_OF_cases():
+    # If not running preprocess, open the previously built tutorial database as config.global_OF_cases;
+    # case metadata is read on first use and file contents only when they are indexed
+    store = of_case_store.get_store()
+    config.global_OF_cases = store.cases()
+    # Update config.global_OF_keywords
+    config.global_OF_keywords = store.keywords()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index the OpenFOAM tutorial cases into the tutorial case database")
+    parser.add_argument("--tutorial-dir", help="defaults to config.of_tutorial_dir")
+    parser.add_argument("--rebuild", action="store_true", help="ignore the manifest and re-derive every case")
+    parser.add_argument("--export-json", action="store_true", help="also write processed_merged_OF_cases.json")
+    args = parser.parse_args()
+    if args.tutorial_dir:
+        config.of_tutorial_dir = args.tutorial_dir
+    if args.export_json:
+        config.OF_cases_json_export = True
+    main(rebuild=args.rebuild)
@@ -0,0 +1,201 @@
+import re
+
+import config
+import qa_modules
+
+# Token counts only steer the budget, so one tokenizer is used for every model
+TOKENIZER_MODEL = "gpt-4"
+
+_NONUNIFORM_RE = re.compile(r'nonuniform\s+List<(\w+)>\s*(\d+)\s*\(')
+_NUMBER = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+_NUMERIC_LINE_RE = re.compile(rf'^\s*\(?\s*{_NUMBER}(?:\s+{_NUMBER})*\s*\)?\s*;?\s*$')
+_IDENTIFIER_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]{2,}')
+
+def count_tokens(text):
+    return qa_modules.estimate_tokens(text, TOKENIZER_MODEL)
+
+def _matching_paren(text, start):
+    """Index of the parenthesis closing the one at text[start], or -1"""
+    depth = 0
+    for i in range(start, len(text)):
+        if text[i] == '(':
+            depth += 1
+        elif text[i] == ')':
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+def elide_nonuniform_lists(content, max_values=None):
+    """Replace the body of every nonuniform List<...> with more than max_values entries by a placeholder"""
+    if max_values is None:
+        max_values = config.prompt_elide_list_values
+    parts = []
+    position = 0
+    for match in _NONUNIFORM_RE.finditer(content):
+        if match.start() < position:
+            continue
+        value_type, size = match.group(1), int(match.group(2))
+        if size <= max_values:
+            continue
+        open_paren = match.end() - 1
+        close_paren = _matching_paren(content, open_paren)
+        if close_paren == -1:
+            break
+        parts.append(content[position:open_paren])
+        parts.append(f"( /* {size} {value_type} values elided */ )")
+        position = close_paren + 1
+    parts.append(content[position:])
+    return "".join(parts)
+
+def elide_numeric_blocks(content, max_lines=None):
+    """Shorten every run of more than max_lines purely numeric lines to its first and last lines"""
+    if max_lines is None:
+        max_lines = config.prompt_elide_numeric_lines
+    lines = content.split("\n")
+    result = []
+    run = []
+
+    def close_run():
+        if len(run) > max_lines:
+            result.extend(run[:3])
+            result.append(f"// ... {len(run) - 4} numeric lines elided ...")
+            result.append(run[-1])
+        else:
+            result.extend(run)
+        run.clear()
+
+    for line in lines:
+        if _NUMERIC_LINE_RE.match(line):
+            run.append(line)
+        else:
+            close_run()
+            result.append(line)
+    close_run()
+    return "\n".join(result)
+
+def compact_file_content(content):
+    return elide_numeric_blocks(elide_nonuniform_lists(content))
+
+def truncate_middle(text, token_budget):
+    """Keep the head and tail of text within token_budget, the OpenFOAM error message is usually at either end"""
+    encoding = qa_modules.get_encoding(TOKENIZER_MODEL)
+    tokens = encoding.encode(text)
+    if len(tokens) <= token_budget:
+        return text
+    keep = max(token_budget - 16, 2)
+    head = encoding.decode(tokens[:keep // 2])
+    tail = encoding.decode(tokens[len(tokens) - keep // 2:])
+    return f"{head}\n... [{len(tokens) - 2 * (keep // 2)} tokens truncated] ...\n{tail}"
+
+def rank_files(files, query):
+    """
+    Sort case file names by relevance to query (usually the running error)
+
+    A file named by path in the query ranks first, then one whose name is mentioned
+    (e.g. the field p), then by the number of identifiers it shares with the query.
+    """
+    query_identifiers = set(_IDENTIFIER_RE.findall(query))
+    scores = {}
+    for name, content in files.items():
+        posix_name = name.replace("\\", "/")
+        base_name = posix_name.rsplit("/", 1)[-1]
+        score = 0
+        if re.search(rf'(?<![\w.]){re.escape(posix_name)}(?!\w)', query):
+            score += 100
+        if re.search(rf'(?<![\w/]){re.escape(base_name)}(?!\w)', query):
+            score += 20
+        score += len(query_identifiers & set(_IDENTIFIER_RE.findall(content)))
+        scores[name] = score
+    return sorted(files, key=lambda name: (-scores[name], len(files[name]), name))
+
+class PromptBudget:
+    """
+    Fit case files and runtime errors of one repair prompt into a token budget and report the savings
+
+    Only use it for prompts whose answer is advice or a new file: a compacted file must never be
+    written back over the original.
+    """
+    def __init__(self, call_site, token_budget=None):
+        self.call_site = call_site
+        self.token_budget = config.repair_prompt_token_budget if token_budget is None else token_budget
+        self.original_tokens = 0
+        self.prompt_tokens = 0
+        self.files_elided = []
+        self.files_truncated = []
+        self.files_omitted = []
+
+    def _account(self, original, kept):
+        original_tokens = count_tokens(original)
+        kept_tokens = original_tokens if kept is original else count_tokens(kept)
+        self.original_tokens += original_tokens
+        self.prompt_tokens += kept_tokens
+        return kept_tokens
+
+    def running_error(self, running_error):
+        running_error = str(running_error)
+        bounded = truncate_middle(running_error, config.running_error_token_budget)
+        self._account(running_error, bounded)
+        return bounded
+
+    def case_files(self, files, query):
+        """
+        Return files with numeric data elided, filled by relevance to query up to the token budget
+
+        The result keeps the original file order so consecutive prompts share their prefix.
+        """
+        compacted = {name: compact_file_content(content) for name, content in files.items()}
+        budgeted = {}
+        used = 0
+        for name in rank_files(compacted, query):
+            content = compacted[name]
+            tokens = count_tokens(content)
+            if content != files[name]:
+                self.files_elided.append(name)
+            if used + tokens > self.token_budget:
+                remaining = self.token_budget - used
+                if remaining >= config.prompt_min_file_tokens:
+                    content = truncate_middle(content, remaining)
+                    tokens = count_tokens(content)
+                    self.files_truncated.append(name)
+                else:
+                    content = f"<omitted: {tokens} tokens, less relevant to the error>"
+                    tokens = 0
+                    self.files_omitted.append(name)
+            used += tokens
+            budgeted[name] = content
+        for name in files:
+            self._account(files[name], budgeted[name])
+        return {name: budgeted[name] for name in files}
+
+    def report(self):
+        saved = self.original_tokens - self.prompt_tokens
+        qa_modules.GlobalLogManager.record_prompt_budget(self.call_site, self.original_tokens, self.prompt_tokens)
+        if saved > 0:
+            print(f"Prompt budget {self.call_site}: {self.prompt_tokens} of {self.original_tokens} tokens kept, "
+                  f"{saved} saved (elided: {len(self.files_elided)}, truncated: {len(self.files_truncated)}, "
+                  f"omitted: {len(self.files_omitted)})")
+        return {
+            "call_site": self.call_site,
+            "original_tokens": self.original_tokens,
+            "prompt_tokens": self.prompt_tokens,
+            "saved_tokens": saved,
+            "files_elided": self.files_elided,
+            "files_truncated": self.files_truncated,
+            "files_omitted": self.files_omitted
+        }
+
+def fit_case_files(call_site, files, query, running_errors=()):
+    """PromptBudget of call_site over files (ranked against query) and running_errors, reported once"""
+    budget = PromptBudget(call_site)
+    files = budget.case_files(files, query)
+    running_errors = [budget.running_error(running_error) for running_error in running_errors]
+    budget.report()
+    return files, running_errors
+
+def fit_running_errors(call_site, running_errors):
+    return fit_case_files(call_site, {}, "", running_errors)[1]
+
+def fit_running_error(call_site, running_error):
+    """running_error bounded to config.running_error_token_budget, the savings reported under call_site"""
+    return fit_running_errors(call_site, [running_error])[0]
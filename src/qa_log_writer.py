@@ -0,0 +1,100 @@
+import os
+import json
+import time
+import atexit
+import threading
+
+import config
+
+class JsonlLogWriter:
+    """
+    Append-only, buffered and thread-safe JSON Lines writer
+
+    Entries are serialized once and appended, so logging n calls costs O(n) I/O instead of
+    re-serializing the whole log on every call. The buffer is written out every
+    config.qa_log_flush_every entries or config.qa_log_flush_interval seconds, and the file
+    is fsynced at most every config.qa_log_fsync_interval seconds. With truncate, an existing
+    file is emptied first instead of appended to.
+    """
+    def __init__(self, path, truncate=False):
+        self.path = path
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._file = open(path, 'w' if truncate else 'a', encoding='utf-8')
+        self._last_flush = time.monotonic()
+        self._last_fsync = self._last_flush
+        _open_writers.add(self)
+
+    def append(self, entry):
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                raise ValueError(f"Log writer for {self.path} is closed")
+            self._buffer.append(line)
+            now = time.monotonic()
+            if (len(self._buffer) >= config.qa_log_flush_every
+                    or now - self._last_flush >= config.qa_log_flush_interval):
+                self._flush_locked(fsync=now - self._last_fsync >= config.qa_log_fsync_interval)
+
+    def _flush_locked(self, fsync):
+        if self._buffer:
+            self._file.write("\n".join(self._buffer) + "\n")
+            self._buffer.clear()
+        self._file.flush()
+        now = time.monotonic()
+        self._last_flush = now
+        if fsync:
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+
+    def flush(self, fsync=True):
+        with self._lock:
+            if self._file is not None:
+                self._flush_locked(fsync)
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            self._flush_locked(fsync=True)
+            self._file.close()
+            self._file = None
+        _open_writers.discard(self)
+
+_open_writers = set()
+
+@atexit.register
+def _close_open_writers():
+    for writer in list(_open_writers):
+        writer.close()
+
+def read_jsonl(path):
+    """Yield the entries of a JSON Lines log, skipping a truncated last line left by a crash"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping unreadable log line in {path}")
+
+def export_json(jsonl_path, json_path):
+    """
+    Compact a JSON Lines log into the JSON array format of all_qa_logs.json
+
+    The output is identical to json.dump(entries, f, ensure_ascii=False, indent=2) but the
+    entries are streamed, so the whole log never has to be held in memory.
+    """
+    tmp_path = f"{json_path}.tmp"
+    count = 0
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write("[")
+        for entry in read_jsonl(jsonl_path):
+            entry_str = json.dumps(entry, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+            f.write(("," if count else "") + "\n  " + entry_str)
+            count += 1
+        f.write("\n]" if count else "]")
+    os.replace(tmp_path, json_path)
+    return count
@@ -1,22 +1,89 @@
-from openai import OpenAI
 import os
+import re
+import sys
+import copy
+import functools
+import atexit
+import asyncio
+import threading
 import config
 from datetime import datetime
 import tiktoken
 import json
+import llm_cache
+import llm_clients
+import llm_async
+import qa_log_writer
+import llm_policy
+import embedder_registry
 
-def estimate_tokens(text: str, model_name: str) -> int:
-    """Use tiktoken to estimate token count"""
+@functools.lru_cache(maxsize=None)
+def get_encoding(model_name: str):
+    """Cached tiktoken encoder per model name, resolved once instead of on every call"""
     try:
-        encoding = tiktoken.encoding_for_model(model_name)
+        return tiktoken.encoding_for_model(model_name)
     except KeyError:
         # If model not recognized, default to cl100k_base (GPT-4 encoding)
-        encoding = tiktoken.get_encoding("cl100k_base")
-    return len(encoding.encode(text))
+        return tiktoken.get_encoding("cl100k_base")
+
+def estimate_tokens(text: str, model_name: str) -> int:
+    """Use tiktoken to estimate token count, only a fallback when the provider reports no usage"""
+    return len(get_encoding(model_name).encode(text))
+
+def _usage_value(usage, *path):
+    """Read a possibly missing (nested) usage field, also from provider-specific extras"""
+    value = usage
+    for name in path:
+        if value is None:
+            return None
+        if isinstance(value, dict):
+            value = value.get(name)
+            continue
+        attribute = getattr(value, name, None)
+        value = attribute if attribute is not None else (getattr(value, "model_extra", None) or {}).get(name)
+    return value
+
+def parse_usage(usage):
+    """
+    Token counts reported by the provider
+
+    DeepSeek reports prompt cache hits as prompt_cache_hit_tokens, OpenAI-compatible servers
+    as prompt_tokens_details.cached_tokens.
+    """
+    cache_hit_tokens = _usage_value(usage, "prompt_cache_hit_tokens")
+    if cache_hit_tokens is None:
+        cache_hit_tokens = _usage_value(usage, "prompt_tokens_details", "cached_tokens")
+    return {
+        "prompt_tokens": _usage_value(usage, "prompt_tokens"),
+        "completion_tokens": _usage_value(usage, "completion_tokens"),
+        "reasoning_tokens": _usage_value(usage, "completion_tokens_details", "reasoning_tokens"),
+        "prompt_cache_hit_tokens": cache_hit_tokens or 0
+    }
 
 class GlobalLogManager:
     _instance = None
     logs = []
+    cache_stats = {"hits": 0, "misses": 0}
+    prompt_budget_stats = {}  # call site -> token savings of prompt_budget.PromptBudget
+    model_stats = {
+        "deepseek-v3": {
+            "total_calls": 0,
+            "total_prompt_tokens": 0,
+            "total_prompt_cache_hit_tokens": 0,
+            "total_response_tokens": 0
+        },
+        "deepseek-r1": {
+            "total_calls": 0,
+            "total_prompt_tokens": 0,
+            "total_prompt_cache_hit_tokens": 0,
+            "total_response_tokens": 0,
+            "total_reasoning_tokens": 0,
+            "estimated_usage_calls": 0
+        }
+    }
+    _lock = threading.RLock()
+    _case_writer = None
+    _started_case_logs = set()  # case log paths opened by this process, appended to when reopened
     
     def __new__(cls):
         if cls._instance is None:
@@ -24,53 +91,105 @@ class GlobalLogManager:
         return cls._instance
     
     @classmethod
-    def _save_case_log(cls):
+    def _save_case_log(cls, log_entry):
         if config.case_log_write:
-            config.ensure_directory_exists(config.OUTPUT_PATH)
-            log_file_path = f'{config.OUTPUT_PATH}/all_qa_logs.json'
-            with open(log_file_path, 'w', encoding='utf-8') as f:
-                json.dump(cls.logs, f, ensure_ascii=False, indent=2)
+            log_file_path = f'{config.OUTPUT_PATH}/all_qa_logs.jsonl'
+            if cls._case_writer is None or cls._case_writer.path != log_file_path:
+                # A new case started, finish the JSON export of the previous one
+                cls.export_case_log()
+                config.ensure_directory_exists(config.OUTPUT_PATH)
+                # A case log left by an earlier run of the same case name is overwritten, like the former all_qa_logs.json
+                truncate = log_file_path not in cls._started_case_logs
+                cls._started_case_logs.add(log_file_path)
+                cls._case_writer = qa_log_writer.JsonlLogWriter(log_file_path, truncate=truncate)
+            cls._case_writer.append(log_entry)
+
+    @classmethod
+    def export_case_log(cls):
+        """Close the case JSONL log and compact it into all_qa_logs.json for tools expecting the JSON format"""
+        with cls._lock:
+            writer = cls._case_writer
+            cls._case_writer = None
+        if writer is None:
+            return None
+        writer.close()
+        json_path = writer.path[:-len(".jsonl")] + ".json"
+        qa_log_writer.export_json(writer.path, json_path)
+        return json_path
 
     @classmethod
     def add_log(cls, log_entry):
-        cls.logs.append(log_entry)
-        cls._save_case_log()
+        with cls._lock:
+            cls.logs.append(log_entry)
+            cls._update_statistics(log_entry)
+            cls._save_case_log(log_entry)
     
+    @classmethod
+    def record_cache_event(cls, hit):
+        with cls._lock:
+            if hit:
+                cls.cache_stats["hits"] += 1
+            else:
+                cls.cache_stats["misses"] += 1
+
+    @classmethod
+    def record_prompt_budget(cls, call_site, original_tokens, prompt_tokens):
+        with cls._lock:
+            site_stats = cls.prompt_budget_stats.setdefault(
+                call_site, {"calls": 0, "original_tokens": 0, "prompt_tokens": 0, "saved_tokens": 0})
+            site_stats["calls"] += 1
+            site_stats["original_tokens"] += original_tokens
+            site_stats["prompt_tokens"] += prompt_tokens
+            site_stats["saved_tokens"] += original_tokens - prompt_tokens
+
+    @classmethod
+    def _update_statistics(cls, log):
+        # Replayed responses cost no tokens, they are counted under "llm_cache"
+        if log.get("cache_hit"):
+            return
+        model_type = log["model_type"]
+        if model_type == "deepseek-v3":
+            cls.model_stats[model_type]["total_calls"] += 1
+            cls.model_stats[model_type]["total_prompt_tokens"] += log["prompt_tokens"]
+            cls.model_stats[model_type]["total_prompt_cache_hit_tokens"] += log.get("prompt_cache_hit_tokens", 0)
+            cls.model_stats[model_type]["total_response_tokens"] += log["response_tokens"]
+        elif model_type == "deepseek-r1":
+            cls.model_stats[model_type]["total_calls"] += 1
+            cls.model_stats[model_type]["total_prompt_tokens"] += log["prompt_tokens"]
+            cls.model_stats[model_type]["total_prompt_cache_hit_tokens"] += log.get("prompt_cache_hit_tokens", 0)
+            cls.model_stats[model_type]["total_response_tokens"] += log["response_tokens"]
+            cls.model_stats[model_type]["total_reasoning_tokens"] += log["reasoning_tokens"]
+            if log.get("usage_source") == "estimate":
+                cls.model_stats[model_type]["estimated_usage_calls"] += 1
+
     @classmethod
     def _generate_statistics(cls):
-        stats = {
-            "deepseek-v3": {
-                "total_calls": 0,
-                "total_prompt_tokens": 0,
-                "total_response_tokens": 0
-            },
-            "deepseek-r1": {
-                "total_calls": 0,
-                "total_prompt_tokens": 0,
-                "total_response_tokens": 0,
-                "total_reasoning_tokens": 0
-            }
+        with cls._lock:
+            stats = copy.deepcopy(cls.model_stats)
+            cache_stats = dict(cls.cache_stats)
+            prompt_budget_stats = copy.deepcopy(cls.prompt_budget_stats)
+
+        lookups = cache_stats["hits"] + cache_stats["misses"]
+        stats["llm_cache"] = {
+            "mode": llm_cache.cache_mode(),
+            "hits": cache_stats["hits"],
+            "misses": cache_stats["misses"],
+            "hit_rate": cache_stats["hits"] / lookups if lookups else 0.0
         }
-        
-        for log in cls.logs:
-            model_type = log["model_type"]
-            if model_type == "deepseek-v3":
-                stats[model_type]["total_calls"] += 1
-                stats[model_type]["total_prompt_tokens"] += log["prompt_tokens"]
-                stats[model_type]["total_response_tokens"] += log["response_tokens"]
-            elif model_type == "deepseek-r1":
-                stats[model_type]["total_calls"] += 1
-                stats[model_type]["total_prompt_tokens"] += log["prompt_tokens"]
-                stats[model_type]["total_response_tokens"] += log["response_tokens"]
-                stats[model_type]["total_reasoning_tokens"] += log["reasoning_tokens"]
+        stats["http_connections"] = llm_clients.client_registry_stats()
+        stats["call_latency"] = llm_policy.latency_tracker.summary()
+        stats["prompt_budget"] = prompt_budget_stats
+        stats["embedders"] = embedder_registry.registry_stats()
         
         return stats
     
     @classmethod
     def save_logs(cls, log_file="all_qa_logs.json", stats_file=None):
         # Save original logs
+        with cls._lock:
+            logs = list(cls.logs)
         with open(log_file, 'w', encoding='utf-8') as f:
-            json.dump(cls.logs, f, ensure_ascii=False, indent=2)
+            json.dump(logs, f, ensure_ascii=False, indent=2)
         
         # Generate and save statistics
         stats = cls._generate_statistics()
@@ -82,82 +201,296 @@ class GlobalLogManager:
         
         return log_file, stats_file
 
+# Keep all_qa_logs.json in sync even if a run is interrupted before the case finishes
+atexit.register(GlobalLogManager.export_case_log)
+
+async def cached_response(model_name, temperature, messages, fetch, params=None):
+    """Serve a response from the on-disk cache, or await fetch() and record its result"""
+    mode = llm_cache.cache_mode()
+    if mode == "off":
+        return dict(await fetch(), cache_hit=False)
+
+    cache = llm_cache.get_cache()
+    key = cache.make_key(model_name, temperature, messages, params)
+    cached = cache.get(key)
+    GlobalLogManager.record_cache_event(cached is not None)
+    if cached is not None:
+        return dict(cached, cache_hit=True)
+
+    if mode == "replay":
+        raise llm_cache.LLMCacheMiss(f"No cached {model_name} response for key {key} (llm_cache_mode = replay)")
+
+    result = await fetch()
+    cache.put(key, model_name, temperature, result)
+    return dict(result, cache_hit=False)
+
+def _caller_site():
+    """Name the code that constructs a QA object, e.g. file_corrector.detect_dimension_error"""
+    frame = sys._getframe(1)
+    caller = frame
+    while frame is not None:
+        if frame.f_code.co_filename != __file__ and not frame.f_code.co_name.startswith("<"):
+            caller = frame
+            break
+        caller = frame
+        frame = frame.f_back
+    module_name = os.path.splitext(os.path.basename(caller.f_code.co_filename))[0]
+    return f"{module_name}.{caller.f_code.co_name}"
+
+def call_with_policy(call_site, model_name, make_call):
+    """Run make_call under the deadline/retry/hedging policy of model_name, tracked per call site"""
+    return llm_policy.call_with_policy(
+        f"{call_site} [{model_name}]",
+        make_call,
+        llm_policy.CallPolicy.for_model(model_name)
+    )
+
 class BaseQA_deepseek_V3:
-    def __init__(self):
-        self.qa_interface = self._setup_qa_interface()
+    def __init__(self, call_site=None):
+        self.call_site = call_site or _caller_site()
+        self.aqa_interface = self._setup_qa_interface()
         self._initialized = True
 
     def _setup_qa_interface(self):
-        def get_deepseekV3_response(messages):
-            client = OpenAI(
+        async def fetch_deepseekV3_response(messages):
+            client = llm_clients.get_async_openai_client(
                 api_key=os.environ.get("DEEPSEEK_V3_KEY"), 
                 base_url=os.environ.get("DEEPSEEK_V3_BASE_URL")
             )
+            model_name = os.environ.get("DEEPSEEK_V3_MODEL_NAME")
 
-            chat_completion = client.chat.completions.create(
-                messages=messages,
-                model=os.environ.get("DEEPSEEK_V3_MODEL_NAME"),
-                temperature=config.V3_temperature,
-                stream=False
-            )
+            async with llm_async.limit(model_name):
+                chat_completion = await client.chat.completions.create(
+                    messages=messages,
+                    model=model_name,
+                    temperature=config.V3_temperature,
+                    stream=False
+                )
             
+            usage = parse_usage(chat_completion.usage)
+
             return {
                 "content": chat_completion.choices[0].message.content,
-                "prompt_tokens": chat_completion.usage.prompt_tokens,
-                "completion_tokens": chat_completion.usage.completion_tokens
+                "prompt_tokens": usage["prompt_tokens"],
+                "completion_tokens": usage["completion_tokens"],
+                "prompt_cache_hit_tokens": usage["prompt_cache_hit_tokens"]
             }
 
-        return get_deepseekV3_response
-
-    def ask(self, question: str):
-        raise NotImplementedError
+        async def get_deepseekV3_response(messages):
+            model_name = os.environ.get("DEEPSEEK_V3_MODEL_NAME")
+            return await cached_response(
+                model_name,
+                config.V3_temperature,
+                messages,
+                lambda: call_with_policy(self.call_site, model_name, lambda: fetch_deepseekV3_response(messages))
+            )
 
-    def close(self):
-        pass
+        return get_deepseekV3_response
 
-class QA_Context_deepseek_V3(BaseQA_deepseek_V3):
-    def __init__(self):
-        super().__init__()
-        self.conversation_history: list[dict[str, str]] = []
+    def qa_interface(self, messages):
+        return llm_async.run_sync(self.aqa_interface(messages))
 
-    def ask(self, question: str):
-        self.conversation_history.append({"role": "user", "content": question})
-        result = self.qa_interface(self.conversation_history.copy())
-        
-        self.conversation_history.append({"role": "assistant", "content": result["content"]})
-        
+    def _add_log(self, question, result):
         GlobalLogManager.add_log({
             "model_type": "deepseek-v3",
+            "call_site": self.call_site,
             "user_prompt": question,
             "assistant_response": result["content"],
             "prompt_tokens": result["prompt_tokens"],
+            "prompt_cache_hit_tokens": result.get("prompt_cache_hit_tokens", 0),
             "response_tokens": result["completion_tokens"],
+            "cache_hit": result["cache_hit"],
             "timestamp": datetime.now().isoformat()
         })
-        
-        return result["content"]
 
-class QA_NoContext_deepseek_V3(BaseQA_deepseek_V3):
     def ask(self, question: str):
+        return llm_async.run_sync(self.ask_async(question))
+
+    async def ask_async(self, question: str):
+        """Single-turn question without conversation history, overridden by the context and classify variants"""
         messages = [{"role": "user", "content": question}]
-        result = self.qa_interface(messages)
+        result = await self.aqa_interface(messages)
+        
+        self._add_log(question, result)
+        
+        return result["content"]
+
+    def close(self):
+        pass
+
+class QA_Context_deepseek_V3(BaseQA_deepseek_V3):
+    def __init__(self, call_site=None):
+        super().__init__(call_site or _caller_site())
+        self.conversation_history: list[dict[str, str]] = []
+        self._history_lock = llm_async.LoopLocal(asyncio.Lock)
+
+    async def ask_async(self, question: str):
+        # Turns of one conversation must stay in order even when asked concurrently
+        async with self._history_lock.get():
+            self.conversation_history.append({"role": "user", "content": question})
+            result = await self.aqa_interface(self.conversation_history.copy())
+            
+            self.conversation_history.append({"role": "assistant", "content": result["content"]})
         
+        self._add_log(question, result)
+        
+        return result["content"]
+
+class QA_NoContext_deepseek_V3(BaseQA_deepseek_V3):
+    """Single-turn questions, the ask_async of the base class"""
+
+_ANSWER_LEAD_CHARS = " \t\r\n`'\"*"
+
+def parse_classification(text, choices=None, pattern=None, final=False):
+    """
+    The answer of a (partially streamed) classification response, None while it is not determinable
+
+    With choices, the answer is the choice the response starts with (case-insensitive), determinable
+    once no longer choice can still match. With a regex pattern (of a single token, without
+    whitespace), it is the match at the start of the response, determinable once whitespace follows
+    it, as e.g. the "." of "constant/g.orig" may still be followed by more of the token. If the
+    final response does not start with the answer, its last occurrence in the response is used.
+    """
+    stripped = text.lstrip(_ANSWER_LEAD_CHARS)
+    if choices:
+        lowered = stripped.lower()
+        for choice in sorted(choices, key=len, reverse=True):
+            choice_lower = choice.lower()
+            if not lowered.startswith(choice_lower):
+                continue
+            rest = lowered[len(choice_lower):]
+            if rest and (rest[0].isalnum() or rest[0] == "_"):
+                continue  # A longer word, e.g. "nothing" for "no"
+            longer_choice_possible = any(
+                other.lower().startswith(choice_lower) and len(other) > len(choice) for other in choices)
+            if rest or final or not longer_choice_possible:
+                return choice
+            return None
+        if final:
+            alternatives = "|".join(re.escape(choice) for choice in choices)
+            matches = re.findall(rf'(?<!\w)({alternatives})(?!\w)', text, re.IGNORECASE)
+            if matches:
+                return next(choice for choice in choices if choice.lower() == matches[-1].lower())
+        return None
+
+    match = re.match(pattern, stripped)
+    if match and (final or re.search(r'\s', stripped[match.end():])):
+        return match.group(0)
+    if final:
+        matches = list(re.finditer(pattern, text))
+        return matches[-1].group(0) if matches else None
+    return None
+
+class QA_Classify_deepseek_V3(BaseQA_deepseek_V3):
+    """
+    Classification calls with a constrained answer set
+
+    The response is streamed and parsed after every chunk. As soon as the answer is determinable the
+    stream is closed, so a call takes about the time to the first answer token instead of a full
+    completion. Prompts should ask for the bare answer, without the config.general_prompts preamble.
+    """
+    async def _fetch_classification(self, messages, choices, pattern):
+        client = llm_clients.get_async_openai_client(
+            api_key=os.environ.get("DEEPSEEK_V3_KEY"),
+            base_url=os.environ.get("DEEPSEEK_V3_BASE_URL")
+        )
+        model_name = os.environ.get("DEEPSEEK_V3_MODEL_NAME")
+
+        content = []
+        answer = None
+        usage = None
+        early_stop = False
+
+        async with llm_async.limit(model_name):
+            stream = await client.chat.completions.create(
+                messages=messages,
+                model=model_name,
+                temperature=config.classify_temperature,
+                max_tokens=config.classify_max_tokens,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            try:
+                async for chunk in stream:
+                    if chunk.usage is not None:
+                        usage = parse_usage(chunk.usage)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        content.append(chunk.choices[0].delta.content)
+                        answer = parse_classification("".join(content), choices, pattern)
+                        if answer is not None:
+                            early_stop = True
+                            break
+            finally:
+                # Drops the rest of the response, the connection is not reused after an early stop
+                await stream.close()
+
+        content_str = "".join(content)
+        if answer is None:
+            answer = parse_classification(content_str, choices, pattern, final=True)
+
+        if usage is None or usage["prompt_tokens"] is None:
+            usage = {
+                "prompt_tokens": estimate_tokens(json.dumps(messages, ensure_ascii=False), model_name),
+                "completion_tokens": estimate_tokens(content_str, model_name),
+                "prompt_cache_hit_tokens": 0
+            }
+            usage_source = "estimate"
+        else:
+            usage_source = "provider"
+
+        return {
+            "content": content_str,
+            "answer": answer,
+            "early_stop": early_stop,
+            "prompt_tokens": usage["prompt_tokens"],
+            "completion_tokens": usage["completion_tokens"],
+            "prompt_cache_hit_tokens": usage["prompt_cache_hit_tokens"],
+            "usage_source": usage_source
+        }
+
+    def _add_log(self, question, result):
         GlobalLogManager.add_log({
             "model_type": "deepseek-v3",
+            "call_site": self.call_site,
             "user_prompt": question,
             "assistant_response": result["content"],
+            "classification_answer": result["answer"],
+            "early_stop": result["early_stop"],
             "prompt_tokens": result["prompt_tokens"],
+            "prompt_cache_hit_tokens": result.get("prompt_cache_hit_tokens", 0),
             "response_tokens": result["completion_tokens"],
+            "usage_source": result["usage_source"],
+            "cache_hit": result["cache_hit"],
             "timestamp": datetime.now().isoformat()
         })
-        
-        return result["content"]
+
+    def ask(self, question: str, choices=None, pattern=None):
+        return llm_async.run_sync(self.ask_async(question, choices, pattern))
+
+    async def ask_async(self, question: str, choices=None, pattern=None):
+        """Return the answer, one of choices or a match of pattern, or None if the response has none"""
+        if not choices and not pattern:
+            raise ValueError("A classification call needs choices or a pattern")
+        messages = [{"role": "user", "content": question}]
+        model_name = os.environ.get("DEEPSEEK_V3_MODEL_NAME")
+        result = await cached_response(
+            model_name,
+            config.classify_temperature,
+            messages,
+            lambda: call_with_policy(
+                self.call_site, model_name, lambda: self._fetch_classification(messages, choices, pattern)),
+            params={"classify": {"choices": list(choices or []), "pattern": pattern}}
+        )
+
+        self._add_log(question, result)
+
+        return result["answer"]
 
 class BaseQA_deepseek_R1:
-    def __init__(self):
-        self.qa_interface = self._setup_qa_interface()
+    def __init__(self, call_site=None):
+        self.call_site = call_site or _caller_site()
+        self.aqa_interface = self._setup_qa_interface()
         self._initialized = True
-        self.encoding = tiktoken.get_encoding("cl100k_base")
 
     def _setup_qa_interface(self):
         # def get_response(messages):
@@ -180,103 +513,133 @@ class BaseQA_deepseek_R1:
         #         "completion_tokens": chat_completion.usage.completion_tokens
         #     }
 
-        def get_response(messages):
-            client = OpenAI(
+        async def fetch_response(messages):
+            client = llm_clients.get_async_openai_client(
                 api_key=os.environ.get("DEEPSEEK_V3_KEY"),
                 base_url=os.environ.get("DEEPSEEK_V3_BASE_URL")
             )
 
             # Get model name for token estimation
             model_name = os.environ.get("DEEPSEEK_R1_MODEL_NAME")
-            
-            # ===== Stream request to get content =====
-            stream = client.chat.completions.create(
-                messages=messages,
-                model=model_name,
-                temperature=config.R1_temperature,
-                stream=True
-            )
 
             full_content = []
             reasoning_contents = []
+            usage = None
             
-            for chunk in stream:
-                if chunk.choices:
-                    delta = chunk.choices[0].delta
-                    if delta.content:
-                        full_content.append(delta.content)
-                    if hasattr(delta, 'model_extra') and 'reasoning_content' in delta.model_extra:
-                        reasoning_contents.append(str(delta.model_extra['reasoning_content']))
-
-            # ===== Estimate token usage =====
-            # Estimate prompt tokens (serialize messages to string)
-            prompt_str = json.dumps(messages, ensure_ascii=False)
-            prompt_tokens = estimate_tokens(prompt_str, model_name)
-            
-            # Estimate completion tokens (actual returned content)
+            async with llm_async.limit(model_name):
+                # ===== Stream request to get content =====
+                # include_usage makes the provider append a final chunk with the exact token usage
+                stream = await client.chat.completions.create(
+                    messages=messages,
+                    model=model_name,
+                    temperature=config.R1_temperature,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                )
+
+                async for chunk in stream:
+                    if chunk.usage is not None:
+                        usage = parse_usage(chunk.usage)
+                    if chunk.choices:
+                        delta = chunk.choices[0].delta
+                        if delta.content:
+                            full_content.append(delta.content)
+                        if hasattr(delta, 'model_extra') and 'reasoning_content' in delta.model_extra:
+                            reasoning_contents.append(str(delta.model_extra['reasoning_content']))
+
             completion_str = "".join(full_content)
-            completion_tokens = estimate_tokens(completion_str, model_name)
+            reasoning_str = "".join(reasoning_contents)
+
+            if usage is None or usage["prompt_tokens"] is None:
+                # ===== Estimate token usage, only if the server did not report it =====
+                prompt_str = json.dumps(messages, ensure_ascii=False)
+                usage = {
+                    "prompt_tokens": estimate_tokens(prompt_str, model_name),
+                    "completion_tokens": estimate_tokens(completion_str, model_name),
+                    "reasoning_tokens": estimate_tokens(reasoning_str, model_name),
+                    "prompt_cache_hit_tokens": 0
+                }
+                usage_source = "estimate"
+            else:
+                usage_source = "provider"
 
             return {
-                "reasoning_content": "".join(reasoning_contents),
+                "reasoning_content": reasoning_str,
                 "answer": completion_str,
-                "prompt_tokens": prompt_tokens,
-                "completion_tokens": completion_tokens
+                "prompt_tokens": usage["prompt_tokens"],
+                "completion_tokens": usage["completion_tokens"],
+                "reasoning_tokens": usage["reasoning_tokens"],
+                "prompt_cache_hit_tokens": usage["prompt_cache_hit_tokens"],
+                "usage_source": usage_source
             }
 
+        async def get_response(messages):
+            model_name = os.environ.get("DEEPSEEK_R1_MODEL_NAME")
+            return await cached_response(
+                model_name,
+                config.R1_temperature,
+                messages,
+                lambda: call_with_policy(self.call_site, model_name, lambda: fetch_response(messages))
+            )
 
         return get_response
 
-    def ask(self, question: str):
-        raise NotImplementedError
-
-    def close(self):
-        pass
+    def qa_interface(self, messages):
+        return llm_async.run_sync(self.aqa_interface(messages))
 
-class QA_Context_deepseek_R1(BaseQA_deepseek_R1):
-    def __init__(self):
-        super().__init__()
-        self.conversation_history: list[dict[str, str]] = []
-
-    def ask(self, question: str):
-        self.conversation_history.append({"role": "user", "content": question})
-        result = self.qa_interface(self.conversation_history.copy())
-        
-        self.conversation_history.append({"role": "assistant", "content": result["answer"]})
-        
-        reasoning_tokens = len(self.encoding.encode(result["reasoning_content"]))
+    def _add_log(self, question, result):
+        reasoning_tokens = result.get("reasoning_tokens")
+        if reasoning_tokens is None:
+            # Responses cached before usage was recorded, or providers without reasoning_tokens
+            reasoning_tokens = estimate_tokens(result["reasoning_content"], os.environ.get("DEEPSEEK_R1_MODEL_NAME"))
         
         GlobalLogManager.add_log({
             "model_type": "deepseek-r1",
+            "call_site": self.call_site,
             "user_prompt": question,
             "assistant_response": result["answer"],
             "reasoning_content": result["reasoning_content"],
             "prompt_tokens": result["prompt_tokens"],
+            "prompt_cache_hit_tokens": result.get("prompt_cache_hit_tokens", 0),
             "response_tokens": result["completion_tokens"],
             "reasoning_tokens": reasoning_tokens,
+            "usage_source": result.get("usage_source", "estimate"),
+            "cache_hit": result["cache_hit"],
             "timestamp": datetime.now().isoformat()
         })
-        
-        return result["answer"]
 
-class QA_NoContext_deepseek_R1(BaseQA_deepseek_R1):
     def ask(self, question: str):
+        return llm_async.run_sync(self.ask_async(question))
+
+    async def ask_async(self, question: str):
+        """Single-turn question without conversation history, overridden by the context and classify variants"""
         messages = [{"role": "user", "content": question}]
-        result = self.qa_interface(messages)
+        result = await self.aqa_interface(messages)
         
-        reasoning_tokens = len(self.encoding.encode(result["reasoning_content"]))
+        self._add_log(question, result)
         
-        GlobalLogManager.add_log({
-            "model_type": "deepseek-r1",
-            "user_prompt": question,
-            "assistant_response": result["answer"],
-            "reasoning_content": result["reasoning_content"],
-            "prompt_tokens": result["prompt_tokens"],
-            "response_tokens": result["completion_tokens"],
-            "reasoning_tokens": reasoning_tokens,
-            "timestamp": datetime.now().isoformat()
-        })
+        return result["answer"]
+
+    def close(self):
+        pass
+
+class QA_Context_deepseek_R1(BaseQA_deepseek_R1):
+    def __init__(self, call_site=None):
+        super().__init__(call_site or _caller_site())
+        self.conversation_history: list[dict[str, str]] = []
+        self._history_lock = llm_async.LoopLocal(asyncio.Lock)
+
+    async def ask_async(self, question: str):
+        # Turns of one conversation must stay in order even when asked concurrently
+        async with self._history_lock.get():
+            self.conversation_history.append({"role": "user", "content": question})
+            result = await self.aqa_interface(self.conversation_history.copy())
+            
+            self.conversation_history.append({"role": "assistant", "content": result["answer"]})
+        
+        self._add_log(question, result)
         
         return result["answer"]
-    
 
+class QA_NoContext_deepseek_R1(BaseQA_deepseek_R1):
+    """Single-turn questions, the ask_async of the base class"""
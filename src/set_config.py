@@ -1,5 +1,36 @@
 import config, json, os, subprocess
 
+OPTIONAL_CONFIG_KEYS = [
+    # llm_cache.py
+    "llm_cache_mode", "llm_cache_max_size_mb", "llm_cache_max_age_days",
+    # pdf_index_cache.py
+    "pdf_index_cache_enabled", "pdf_extract_workers", "pdf_extract_min_pages_per_worker",
+    # vector_index.py
+    "pdf_index_backend", "pdf_index_params",
+    # lexical_index.py
+    "pdf_retrieval_mode", "pdf_retrieval_candidates", "pdf_context_token_budget", "hybrid_rrf_k", "bm25_k1", "bm25_b",
+    # llm_clients.py
+    "http_pool_max_connections", "http_pool_max_keepalive", "http_keepalive_expiry",
+    "http_connect_timeout", "http_read_timeout",
+    # llm_async.py
+    "llm_max_concurrency", "llm_default_model_concurrency", "llm_model_concurrency",
+    # llm_policy.py
+    "llm_call_deadline", "llm_model_call_deadline", "llm_max_retries", "llm_backoff_base", "llm_backoff_max",
+    "llm_hedge_enabled", "llm_hedge_percentile", "llm_hedge_min_samples", "llm_hedge_min_delay", "llm_latency_window",
+    # main_run_chatcfd.py / file_corrector.py
+    "repair_mode", "triage_max_attempts",
+    # preprocess_OF_tutorial.py
+    "of_tutorial_scan_workers", "OF_cases_json_export",
+    # of_case_similarity.py
+    "reference_case_searching_round",
+    # qa_modules.py
+    "classify_temperature", "classify_max_tokens",
+    # prompt_budget.py
+    "repair_prompt_token_budget", "running_error_token_budget", "prompt_elide_numeric_lines", "prompt_elide_list_values", "prompt_min_file_tokens",
+    # qa_log_writer.py
+    "qa_log_flush_every", "qa_log_flush_interval", "qa_log_fsync_interval",
+]
+
 def read_in_config():
     config_data = []
     with open(f'{config.Base_PATH}/inputs/chatcfd_config.json', 'r', encoding='utf-8') as file:
@@ -21,6 +52,11 @@ def read_in_config():
     config.max_running_test_round = config_data["max_running_test_round"]
     config.pdf_chunk_d = config_data["pdf_chunk_d"]
 
+    # Optional settings keep their config.py defaults when absent from the json file
+    for key in OPTIONAL_CONFIG_KEYS:
+        if key in config_data:
+            setattr(config, key, config_data[key])
+
 def load_openfoam_environment():
     """Load OpenFOAM environment variables into the current Python process at once"""
     try:
@@ -0,0 +1,145 @@
+import os
+import json
+import math
+import threading
+
+import faiss
+import numpy as np
+
+import config
+
+INDEX_BACKENDS = ("flat_l2", "flat_ip", "hnsw", "ivfpq")
+
+# Build and search parameters per backend, overridden by config.pdf_index_params
+DEFAULT_INDEX_PARAMS = {
+    "flat_l2": {},
+    "flat_ip": {},
+    "hnsw": {"M": 32, "ef_construction": 200, "ef_search": 64},
+    # nlist 0 picks about 4 * sqrt(n) lists
+    "ivfpq": {"nlist": 0, "m": 64, "nbits": 8, "nprobe": 32, "min_train_points_per_list": 39}
+}
+
+def index_params(backend, params=None):
+    merged = dict(DEFAULT_INDEX_PARAMS[backend])
+    merged.update(params or {})
+    return merged
+
+def _as_float32(vectors):
+    return np.ascontiguousarray(np.asarray(vectors, dtype='float32'))
+
+class VectorIndex:
+    """
+    FAISS index of one of INDEX_BACKENDS whose search always returns squared L2 distances
+
+    flat_ip indexes L2-normalised vectors and converts inner products to ||a-b||^2 = 2 - 2 a.b,
+    so config.pdf_chunk_d applies to every backend (the default embedder already normalises).
+    ivfpq needs min_train_points_per_list * nlist and 2**nbits training vectors; a smaller corpus
+    falls back to flat_l2, which is exact and small at that size anyway.
+    """
+    def __init__(self, backend=None, params=None):
+        backend = backend or config.pdf_index_backend
+        if backend not in INDEX_BACKENDS:
+            raise ValueError(f"Unknown index backend '{backend}', choose one of {INDEX_BACKENDS}")
+        if params is None and backend == config.pdf_index_backend:
+            params = config.pdf_index_params
+        self.requested_backend = backend
+        self.backend = backend
+        self.params = index_params(backend, params)
+        self.index = None
+        self._lock = threading.Lock()  # faiss search parameters are per index, not per call
+
+    def settings(self):
+        """Backend and parameters that change the built index, part of the PDF index cache key"""
+        return {"backend": self.requested_backend, "params": self.params}
+
+    @property
+    def ntotal(self):
+        return 0 if self.index is None else self.index.ntotal
+
+    def __len__(self):
+        return self.ntotal
+
+    def _ivfpq_lists(self, n):
+        nlist = self.params["nlist"] or int(4 * math.sqrt(n))
+        return max(1, min(nlist, n // self.params["min_train_points_per_list"]))
+
+    def _pq_subquantizers(self, dim):
+        """Largest number of PQ sub-quantizers not above params["m"] that divides dim"""
+        m = min(self.params["m"], dim)
+        while dim % m:
+            m -= 1
+        return m
+
+    def _create(self, dim, n):
+        if self.backend == "ivfpq":
+            nlist = self._ivfpq_lists(n)
+            if n < max(2 ** self.params["nbits"], nlist * self.params["min_train_points_per_list"]):
+                print(f"{n} vectors are too few to train ivfpq, using flat_l2")
+                self.backend = "flat_l2"
+            else:
+                quantizer = faiss.IndexFlatL2(dim)
+                return faiss.IndexIVFPQ(quantizer, dim, nlist, self._pq_subquantizers(dim), self.params["nbits"])
+        if self.backend == "hnsw":
+            index = faiss.IndexHNSWFlat(dim, self.params["M"])
+            index.hnsw.efConstruction = self.params["ef_construction"]
+            return index
+        if self.backend == "flat_ip":
+            return faiss.IndexFlatIP(dim)
+        return faiss.IndexFlatL2(dim)
+
+    def _prepare(self, vectors):
+        vectors = _as_float32(vectors)
+        if self.backend == "flat_ip":
+            vectors = vectors.copy()
+            faiss.normalize_L2(vectors)
+        return vectors
+
+    def build(self, embeddings):
+        """Create, train if needed and fill the index"""
+        embeddings = _as_float32(embeddings)
+        self.backend = self.requested_backend
+        self.index = self._create(embeddings.shape[1], embeddings.shape[0])
+        vectors = self._prepare(embeddings)
+        if not self.index.is_trained:
+            self.index.train(vectors)
+        self.index.add(vectors)
+        return self
+
+    def add(self, embeddings):
+        """Add vectors to a built (and so trained) index without retraining"""
+        if self.index is None:
+            return self.build(embeddings)
+        self.index.add(self._prepare(embeddings))
+        return self
+
+    def search(self, queries, top_k):
+        """(distances, indices) like faiss, distances as squared L2 and missing neighbours as index -1"""
+        queries = self._prepare(queries)
+        with self._lock:
+            if self.backend == "hnsw":
+                self.index.hnsw.efSearch = max(self.params["ef_search"], top_k)
+            elif self.backend == "ivfpq":
+                self.index.nprobe = self.params["nprobe"]
+            distances, indices = self.index.search(queries, top_k)
+        if self.backend == "flat_ip":
+            distances = 2.0 - 2.0 * distances
+        return distances, indices
+
+    def save(self, path):
+        """Write the index (including its training) to path and its settings to path.json"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        faiss.write_index(self.index, path + tmp_suffix)
+        with open(path + ".json" + tmp_suffix, 'w', encoding='utf-8') as f:
+            json.dump({"requested_backend": self.requested_backend, "backend": self.backend, "params": self.params}, f)
+        os.replace(path + ".json" + tmp_suffix, path + ".json")
+        os.replace(path + tmp_suffix, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path + ".json", 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        vector_index = cls(meta["requested_backend"], meta["params"])
+        vector_index.backend = meta["backend"]
+        vector_index.index = faiss.read_index(path)
+        return vector_index
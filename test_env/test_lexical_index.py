@@ -0,0 +1,53 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import pytest
+
+import lexical_index
+
+# Flow conditions with the unit written directly after the number
+GLUED_UNITS = [
+    ("U = 10m/s", [("U", 10.0, "m/s")]),
+    ("T = 300K", [("T", 300.0, "K")]),
+    ("inlet velocity of 34.5m/s", [("U", 34.5, "m/s")]),
+    ("chord c=0.5m", [("c", 0.5, "m")]),
+    ("p = 0Pa", [("p", 0.0, "Pa")]),
+    ("p = 5kPa", [("p", 5.0, "kPa")]),
+    ("alpha = 10°", [("alpha", 10.0, "°")]),
+]
+
+@pytest.mark.parametrize("text, expected", GLUED_UNITS)
+def test_glued_unit_parameters(text, expected):
+    assert lexical_index.extract_parameters(text) == expected
+
+def test_last_parameter_of_a_list_with_glued_unit():
+    found = lexical_index.extract_parameters("p = 101325 Pa, T=288.15K")
+    assert sorted(found) == [("T", 288.15, "K"), ("p", 101325.0, "Pa")]
+
+@pytest.mark.parametrize("text, token", [("U = 10m/s", "#10"), ("T = 300K", "#300"), ("p = 101325Pa", "#1.013e+05")])
+def test_glued_unit_number_tokens(text, token):
+    assert token in lexical_index.tokenize(text)
+
+def test_number_at_end_of_sentence():
+    assert lexical_index.extract_parameters("Ma = 0.15.") == [("Ma", 0.15, "")]
+
+def test_no_partial_numbers():
+    assert lexical_index.extract_parameters("T = 1.2.3") == []
+    assert "#3" not in lexical_index.tokenize("a 3D mesh")
+
+@pytest.mark.parametrize("text, expected", [
+    ("Re = 6,000,000", [("Re", 6e6, "")]),
+    ("Re = 6,000,000.", [("Re", 6e6, "")]),
+    ("U = 1,234.5m/s", [("U", 1234.5, "m/s")]),
+])
+def test_thousands_separators(text, expected):
+    assert lexical_index.extract_parameters(text) == expected
+
+def test_thousands_separator_matches_scientific_query():
+    index = lexical_index.NumericParameterIndex(["The airfoil is run at Re = 6,000,000 with a chord of 1 m.", "Re = 3e6 is used for validation."])
+    assert index.search("Re 6e6", 2)[0] == 0
+    assert lexical_index.number_token(6e6) in lexical_index.tokenize("Re = 6,000,000")
+
+def test_comma_separated_values_stay_separate():
+    assert lexical_index.tokenize("(1,2,3)") == ["#1", "#2", "#3"]